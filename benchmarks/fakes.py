@@ -0,0 +1,331 @@
+"""
+Local stand-ins for the Oomnitza API and the SaaS used by the load harness.
+
+Run as the separate process, so the fake services do not share the CPU and the event loop with the connector:
+
+    $ python benchmarks/fakes.py '{"records": 1000, "saas_latency": 0.05}'
+
+prints `{"oomnitza": <port>, "saas": <port>}` once both servers are listening
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import json  # noqa: E402
+import random  # noqa: E402
+import re  # noqa: E402
+import socket  # noqa: E402
+import sys  # noqa: E402
+import time  # noqa: E402
+from urllib.parse import parse_qs  # noqa: E402
+
+import gevent  # noqa: E402
+from gevent import pywsgi  # noqa: E402
+
+DEFAULTS = {
+    # the data served by the SaaS
+    'records': 1000,
+    'page_size': 100,
+    'software_per_record': 10,
+    # the SaaS behavior
+    'saas_latency': 0.02,
+    'saas_jitter': 0.01,
+    'saas_error_rate': 0.,
+    'saas_throttle_rate': 0.,
+    'saas_retry_after': 1,
+    # the lifetime of the session token issued by /login, the managed connectors use the session-based authorization
+    # if it is set, `0` means the token never expires and the login response has no `expires_in`
+    'saas_session_ttl': None,
+    # the Oomnitza behavior
+    'upload_latency': 0.02,
+    'upload_jitter': 0.01,
+    # the managed connectors returned by the /check_managed, see `managed_config`
+    'managed_connectors': 0,
+    'managed_details': True,
+    'managed_software': True,
+    'managed_settings': {},
+}
+
+
+class WSGIServer(pywsgi.WSGIServer):
+    """
+    The response headers and body are written separately, with Nagle's algorithm on the client would wait
+    for the delayed ACK (~40ms) before every next request of the keep-alive connection
+    """
+
+    def handle(self, sock, address):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return super().handle(sock, address)
+
+
+def _json_response(start_response, data, status='200 OK', headers=()):
+    body = json.dumps(data).encode('utf-8')
+    start_response(status, [('Content-Type', 'application/json'), ('Content-Length', str(len(body))), *headers])
+    return [body]
+
+
+def _read_body(environ):
+    length = int(environ.get('CONTENT_LENGTH') or 0)
+    return environ['wsgi.input'].read(length) if length else b''
+
+
+def _delay(latency: float, jitter: float):
+    if latency or jitter:
+        gevent.sleep(max(latency + random.uniform(-jitter, jitter), 0))
+
+
+class FakeOomnitza:
+    """
+    The endpoints of the Oomnitza API called by `connectors/oomnitza.py`
+    """
+
+    def __init__(self, options):
+        self.options = options
+        self.managed_configs = list(options['managed_configs'])
+        self.portions = {}
+        self.uploads = 0
+        self.uploaded_records = 0
+        self.upload_bytes = 0
+        self.finalized = []
+
+    def __call__(self, environ, start_response):
+        method = environ['REQUEST_METHOD']
+        path = environ['PATH_INFO']
+        query = parse_qs(environ.get('QUERY_STRING', ''))
+
+        if path == '/__stats':
+            return _json_response(start_response, {
+                'uploads': self.uploads,
+                'uploaded_records': self.uploaded_records,
+                'upload_bytes': self.upload_bytes,
+                'finalized': self.finalized,
+            })
+
+        if path == '/api/v2/mappings':
+            return _json_response(start_response, MANAGED_MAPPINGS if 'connector_id' in query else {})
+
+        if path == '/api/v3/bulk/check_managed' and method == 'POST':
+            # the configs are given only once, every next check finds nothing to run
+            configs, self.managed_configs = self.managed_configs, []
+            return _json_response(start_response, configs)
+
+        if path == '/api/v3/bulk' and method == 'POST':
+            body = _read_body(environ)
+            self.upload_bytes += len(body)
+            if environ.get('HTTP_CONTENT_ENCODING') == 'gzip':
+                import zlib
+                body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+            payload = json.loads(body)
+            _delay(self.options['upload_latency'], self.options['upload_jitter'])
+            self.uploads += 1
+            if not payload.get('error'):
+                self.uploaded_records += len(payload.get('records', []))
+            return _json_response(start_response, {})
+
+        match = re.fullmatch(r'/api/v3/bulk/([^/]+)/finalize', path)
+        if match:
+            self.finalized.append(match.group(1))
+            return _json_response(start_response, {})
+
+        if re.fullmatch(r'/api/v3/bulk/[^/]+/add_ready_portion', path):
+            return _json_response(start_response, {})
+
+        if re.fullmatch(r'/api/v3/bulk/[^/]+', path):
+            return _json_response(start_response, {'canceled': False})
+
+        if re.fullmatch(r'/api/v3/auth/[^/]+/secret', path):
+            return _json_response(start_response, {'headers': {'Authorization': 'Bearer harness'}, 'params': {}})
+
+        if path.startswith('/api/v3/auth/oomnitza_tokens/'):
+            return _json_response(start_response, {'token': 'harness'})
+
+        if path == '/api/v3/settings/global_variables':
+            return _json_response(start_response, [])
+
+        return _json_response(start_response, {'error': f'{method} {path} is not emulated'}, status='404 Not Found')
+
+
+class FakeSaaS:
+    """
+    Paginated SaaS API with the list, detail and software endpoints:
+
+        /list?page=N            - the page of the items for the managed connector: {"items": [...], "next": N + 1 | null}
+        /detail/<id>            - the details of the item
+        /software/<id>          - the software installed on the device
+        /api/dcim/devices/      - the same items in the shape of the Netbox API, for the `upload` mode
+        /login                  - the session token: {"token": "...", "expires_in": <saas_session_ttl>}
+
+    With the `saas_session_ttl` set, every other endpoint requires the valid token in the `Authorization: Bearer` header
+    and responds with 401 once it has expired.
+    """
+
+    def __init__(self, options):
+        self.options = options
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.logins = 0
+        self.unauthorized = 0
+        # the issued session tokens and their expiration time
+        self.tokens = {}
+
+    def _authorized(self, environ) -> bool:
+        if self.options['saas_session_ttl'] is None:
+            return True
+        token = environ.get('HTTP_AUTHORIZATION', '').partition('Bearer ')[2]
+        expires_at = self.tokens.get(token)
+        return expires_at is not None and (expires_at is False or time.monotonic() < expires_at)
+
+    def _item(self, i: int) -> dict:
+        return {
+            'id': i,
+            'serial': f'SN{i:08d}',
+            'name': f'device-{i}',
+            'model': 'MacBook Pro',
+            'user': {'email': f'user{i}@example.com'},
+        }
+
+    def _page(self, page: int):
+        page_size = self.options['page_size']
+        start = (page - 1) * page_size
+        stop = min(start + page_size, self.options['records'])
+        has_next = stop < self.options['records']
+        return [self._item(i) for i in range(start, stop)], has_next
+
+    def __call__(self, environ, start_response):
+        path = environ['PATH_INFO']
+        query = parse_qs(environ.get('QUERY_STRING', ''))
+
+        if path == '/__stats':
+            return _json_response(start_response, {
+                'requests': self.requests, 'errors': self.errors, 'throttled': self.throttled,
+                'logins': self.logins, 'unauthorized': self.unauthorized,
+            })
+
+        self.requests += 1
+        _delay(self.options['saas_latency'], self.options['saas_jitter'])
+
+        if random.random() < self.options['saas_throttle_rate']:
+            self.throttled += 1
+            return _json_response(start_response, {'error': 'slow down'}, status='429 Too Many Requests',
+                                  headers=[('Retry-After', str(self.options['saas_retry_after']))])
+
+        if random.random() < self.options['saas_error_rate']:
+            self.errors += 1
+            return _json_response(start_response, {'error': 'internal'}, status='500 Internal Server Error')
+
+        if path == '/login':
+            self.logins += 1
+            ttl = self.options['saas_session_ttl'] or 0
+            token = f'session-{self.logins}'
+            self.tokens[token] = time.monotonic() + ttl if ttl else False
+            return _json_response(start_response, {'token': token, **({'expires_in': ttl} if ttl else {})})
+
+        if not self._authorized(environ):
+            self.unauthorized += 1
+            return _json_response(start_response, {'error': 'the session has expired'}, status='401 Unauthorized')
+
+        page = int(query.get('page', ['1'])[0])
+
+        if path == '/list':
+            items, has_next = self._page(page)
+            return _json_response(start_response, {'items': items, 'next': page + 1 if has_next else None})
+
+        if path == '/api/dcim/devices/':
+            items, has_next = self._page(page)
+            next_url = f"http://{environ['HTTP_HOST']}{path}?page={page + 1}" if has_next else None
+            return _json_response(start_response, {'results': items, 'next': next_url})
+
+        match = re.fullmatch(r'/detail/(\d+)', path)
+        if match:
+            item = self._item(int(match.group(1)))
+            item['hardware'] = {'memory_mb': 16384, 'disks': [{'size_gb': 512}]}
+            return _json_response(start_response, item)
+
+        match = re.fullmatch(r'/software/(\d+)', path)
+        if match:
+            return _json_response(start_response, [
+                {'name': f'app-{j}', 'version': f'{j}.0'} for j in range(self.options['software_per_record'])
+            ])
+
+        return _json_response(start_response, {'error': f'{path} is not emulated'}, status='404 Not Found')
+
+
+def managed_config(connector_id: str, saas_url: str, details: bool = True, software: bool = True, settings: dict = None,
+                   session_auth: bool = False) -> dict:
+    """
+    The configuration of the managed connector as it is returned by Oomnitza, reading the items from the fake SaaS
+    """
+    def behavior(url: str, **extra) -> dict:
+        return {'url': url, 'http_method': 'GET', 'headers': [], 'params': [], **extra}
+
+    saas_authorization = {'headers': {'Authorization': 'Bearer harness'}, 'params': {}}
+    if session_auth:
+        saas_authorization = {'type': 'session', 'behavior': behavior(
+            f'{saas_url}/login',
+            http_method='POST',
+            result={'headers': [{'key': 'Authorization', 'value': 'Bearer {{ response.token }}'}], 'params': []},
+        )}
+
+    return {
+        'id': connector_id,
+        'name': f'harness-{connector_id}',
+        'type': 'assets',
+        'sync_field': 'serial',
+        'update_only': 'False',
+        'insert_only': 'False',
+        'inputs': {},
+        'saas_authorization': saas_authorization,
+        'oomnitza_authorization': {'token_id': 1},
+        'list_behavior': behavior(
+            f'{saas_url}/list?page={{{{ iteration + 1 }}}}',
+            result="{{ list_response['items'] }}",
+            pagination={'break_early': "{{ iteration > 0 and not list_response['next'] }}", 'add_if': 'False'},
+        ),
+        'detail_behavior': behavior(f'{saas_url}/detail/{{{{ list_response_item.id }}}}') if details else {},
+        'software_behavior': behavior(
+            f'{saas_url}/software/{{{{ list_response_item.id }}}}',
+            enabled=True,
+            result='{{ software_response }}',
+            name='{{ software_response_item.name }}',
+            version='{{ software_response_item.version }}',
+        ) if software else {},
+        **(settings or {}),
+    }
+
+
+MANAGED_MAPPINGS = {
+    'serial': {'type': 'attribute', 'value': 'serial'},
+    'name': {'type': 'attribute', 'value': '{{ name|upper }}'},
+    'model': {'type': 'attribute', 'value': 'model'},
+    'username': {'type': 'attribute', 'value': "{{ user.email.split('@')[0] }}"},
+}
+
+
+def serve(options: dict):
+    options = {**DEFAULTS, **options}
+    random.seed(options.get('seed', 42))
+
+    saas = WSGIServer(('127.0.0.1', 0), FakeSaaS(options), log=None)
+    saas.start()
+
+    # NOTE: the rate limiters of the connector are per host name, the SaaS throttling must not slow down the uploads
+    saas_url = f'http://localhost:{saas.server_port}'
+    options['managed_configs'] = [
+        managed_config(f'harness-{i}', saas_url, options['managed_details'], options['managed_software'], options['managed_settings'],
+                       session_auth=options['saas_session_ttl'] is not None)
+        for i in range(options['managed_connectors'])
+    ]
+    oomnitza = WSGIServer(('127.0.0.1', 0), FakeOomnitza(options), log=None)
+    oomnitza.start()
+    print(json.dumps({'oomnitza': oomnitza.server_port, 'saas': saas.server_port}), flush=True)
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    serve(json.loads(sys.argv[1]) if len(sys.argv) > 1 else {})
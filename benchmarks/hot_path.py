@@ -0,0 +1,221 @@
+"""
+Microbenchmarks of the record processing hot path, run offline against the synthetic records.
+
+    $ python benchmarks/hot_path.py --save-baseline      # store the results as the baseline of this machine
+    $ python benchmarks/hot_path.py                      # run and compare with the stored baseline
+    $ python benchmarks/hot_path.py --filter convert     # run only the matching benchmarks
+
+For every benchmark reports the records per second (the best of --repeat rounds) and the peak memory
+allocated while processing a single record (tracemalloc). Once the baseline is saved, the run fails with the exit
+code 1 if any benchmark is slower than the baseline by more than --tolerance. The absolute numbers are specific
+to the machine, so the baseline is not kept in the repository, save it on the machine the benchmarks are compared on.
+"""
+import argparse
+import copy
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+from synthetic import LegacyConnector, ManagedConnector, make_connector, make_records  # noqa: E402
+
+from lib import codec  # noqa: E402
+from lib.connector import escape_illegal_keys  # noqa: E402
+from lib.converters import Converter  # noqa: E402
+from lib.filter import DynamicConverter, parse_filter  # noqa: E402
+from utils.data import get_field_value  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hot_path_baseline.json')
+
+# the built-in converters not calling the external services, with the record field and params they are given
+BUILTIN_CONVERTERS = (
+    ('capitalize', 'os', {}),
+    ('concat', 'model', {'values': "model,' ',os"}),
+    ('date_format', 'last_seen', {}),
+    ('first_field', None, {'fields': 'missing,model'}),
+    ('first_from_full', 'user.full_name', {}),
+    ('last_from_full', 'user.full_name', {}),
+    ('ldap_timestamp', 'ldap_last_logon', {}),
+    ('ldap_user_field', None, {}),
+    ('memberOf', 'memberOf', {'Engineering': 'eng', 'default': 'other'}),
+    ('split', 'user.email', {'on': '@', 'index': '1'}),
+    ('split_email', 'user.email', {}),
+    ('timestamp', 'last_seen', {}),
+)
+
+FILTER = """
+  if record['os'] == 'Ubuntu':
+      return False
+  return record['cpu_count'] >= 4 and record['user']['department']['code'] == 'ENG'
+"""
+
+RENDER_TEMPLATES = (
+    "{{ list_response_item.serial_number }}",
+    "{{ list_response_item.user.email.split('@')[0]|upper }}",
+    "{% for app in list_response_item.applications %}{{ app.name }},{% endfor %}",
+)
+
+
+def _converter_benchmark(name: str, source: str, params: dict) -> Callable[[dict], object]:
+    def run(record):
+        value = get_field_value(record, source) if source else None
+        # NOTE: some converters change the params given, so every call gets its own copy as in the sync
+        return Converter.run_converter(name, None, record, value, dict(params))
+    return run
+
+
+def build_benchmarks() -> Dict[str, Callable[[dict], object]]:
+    """
+    The benchmark is a function processing a single synthetic record
+    """
+    benchmarks = {}
+
+    legacy = make_connector(LegacyConnector)
+    benchmarks['convert_record.legacy'] = legacy.convert_record
+
+    managed = make_connector(ManagedConnector)
+    benchmarks['convert_record.managed'] = managed.convert_record
+
+    def render_to_native(record):
+        managed.update_rendering_context(list_response_item=record)
+        return [managed.render_to_native(_) for _ in RENDER_TEMPLATES]
+
+    def render_to_string(record):
+        managed.update_rendering_context(list_response_item=record)
+        return [managed.render_to_string(_) for _ in RENDER_TEMPLATES]
+
+    benchmarks['renderer.render_to_native'] = render_to_native
+    benchmarks['renderer.render_to_string'] = render_to_string
+
+    benchmarks['filter.parse_filter'] = parse_filter(FILTER)
+
+    dynamic_converter = DynamicConverter('benchmark_dynamic', "  return value.upper() if value else value")
+    benchmarks['converter.dynamic'] = lambda record: dynamic_converter(None, record, record['model'], {})
+
+    for name, source, params in BUILTIN_CONVERTERS:
+        benchmarks[f'converter.{name}'] = _converter_benchmark(name, source, params)
+
+    benchmarks['escape_illegal_keys'] = escape_illegal_keys
+    benchmarks['get_field_value'] = lambda record: (
+        get_field_value(record, 'serial_number'),
+        get_field_value(record, 'user.department.name'),
+        get_field_value(record, 'hardware.disks.1.size_gb'),
+        get_field_value(record, 'user.missing.field'),
+    )
+
+    # the payload is collected for the whole batch, so the records are passed to it in the batches of 100
+    converted = [legacy.convert_record(_) for _ in make_records(100, seed=7)]
+    benchmarks['collect_payload.json'] = lambda record: codec.dumps_bytes(
+        legacy._collect_payload(converted, None),
+        default=legacy.json_serializer
+    )
+
+    return benchmarks
+
+
+PER_CALL_RECORDS = {'collect_payload.json': 100}
+
+
+def measure_speed(func: Callable[[dict], object], records: List[dict], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for record in records:
+            func(record)
+        best = min(best, time.perf_counter() - started)
+    return len(records) / best if best else float('inf')
+
+
+def measure_allocations(func: Callable[[dict], object], records: List[dict]) -> float:
+    """
+    Average peak of the memory allocated while processing one record, in bytes
+    """
+    total = 0
+    tracemalloc.start()
+    try:
+        for record in records:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            func(record)
+            _, peak = tracemalloc.get_traced_memory()
+            total += peak - before
+    finally:
+        tracemalloc.stop()
+    return total / len(records)
+
+
+def run(benchmarks: Dict[str, Callable], records: List[dict], repeat: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name, func in benchmarks.items():
+        # NOTE: the benchmark must not see the changes made to the records by the previous ones
+        prepared = copy.deepcopy(records)
+        multiplier = PER_CALL_RECORDS.get(name, 1)
+        # warm up the caches: the converters imports, the compiled templates, the mapping plans
+        for record in prepared[:10]:
+            func(record)
+        results[name] = {
+            'records_per_sec': round(measure_speed(func, prepared, repeat) * multiplier, 1),
+            'peak_bytes_per_record': round(measure_allocations(func, prepared[:min(len(prepared), 200)]) / multiplier, 1),
+        }
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> Tuple[List[str], List[str]]:
+    lines, regressions = [], []
+    lines.append(f"{'benchmark':<32} {'records/sec':>14} {'baseline':>14} {'change':>8} {'peak B/rec':>12}")
+    for name, result in results.items():
+        speed = result['records_per_sec']
+        base = baseline.get(name, {}).get('records_per_sec')
+        if base:
+            change = speed / base - 1
+            mark = ''
+            if change < -tolerance:
+                mark = ' REGRESSION'
+                regressions.append(name)
+            lines.append(f"{name:<32} {speed:>14,.0f} {base:>14,.0f} {change:>+8.1%} {result['peak_bytes_per_record']:>12,.0f}{mark}")
+        else:
+            lines.append(f"{name:<32} {speed:>14,.0f} {'-':>14} {'-':>8} {result['peak_bytes_per_record']:>12,.0f}")
+    return lines, regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the record processing hot path")
+    parser.add_argument('--records', type=int, default=2000, help="Number of the synthetic records per round.")
+    parser.add_argument('--repeat', type=int, default=5, help="Number of the rounds, the best one is reported.")
+    parser.add_argument('--filter', type=str, default='', help="Run only the benchmarks containing this string.")
+    parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE, help="Baseline file to compare with.")
+    parser.add_argument('--save-baseline', action='store_true', help="Save the results as the new baseline.")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed slowdown relative to the baseline.")
+    args = parser.parse_args(argv)
+
+    benchmarks = {k: v for k, v in build_benchmarks().items() if args.filter in k}
+    results = run(benchmarks, make_records(args.records), args.repeat)
+
+    baseline = {}
+    if os.path.isfile(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get('results', {})
+
+    lines, regressions = compare(results, baseline, args.tolerance)
+    print('\n'.join(lines))
+    if not baseline and not args.save_baseline:
+        print(f"There is no baseline at {args.baseline} to compare with, save it with --save-baseline")
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'records': args.records, 'results': baseline}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"The baseline has been saved to {args.baseline}")
+        return 0
+
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) are slower than the baseline by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
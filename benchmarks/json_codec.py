@@ -0,0 +1,115 @@
+"""
+Compares the JSON codecs of the connector on the payloads of the real shapes, offline.
+
+    $ python benchmarks/json_codec.py                    # every codec available here
+    $ python benchmarks/json_codec.py --page-size 1000   # the bigger list responses
+
+The shapes:
+    - `bulk_payload.dumps`: the bulk upload of 100 converted records as `BaseConnector.post` serializes it
+    - `bulk_payload.gzip`: the same upload serialized directly into the gzip-compressed body
+    - `list_response.loads`: the page of the managed list response parsed from the raw bytes of the body
+    - `list_response.loads_text`: the same page decoded to the text first, as `response.text` does
+    - `capture_line.dumps`: the line of the data saved by the `--save-data`
+
+For every shape reports the operations per second (the best of --repeat rounds), the throughput of the JSON
+and the speedup relative to the standard `json` codec. Both codecs must produce the same JSON, the run fails otherwise.
+"""
+import argparse
+import datetime
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+from synthetic import LegacyConnector, make_connector, make_records  # noqa: E402
+
+from lib import codec  # noqa: E402
+from lib.compression import gzip_json  # noqa: E402
+
+
+def build_shapes(page_size: int) -> Dict[str, Tuple[Callable[[], object], int]]:
+    """
+    The shape is a function doing a single operation of the codec, the measured one, and the size of its JSON
+    """
+    legacy = make_connector(LegacyConnector)
+    serializer = legacy.json_serializer
+
+    converted = [legacy.convert_record(_) for _ in make_records(100, seed=7)]
+    for i, record in enumerate(converted):
+        # the values the connector serializes with `json_serializer`
+        record['LAST_UPDATED'] = datetime.datetime(2026, 1, 1, 12, 30) + datetime.timedelta(minutes=i)
+        record['PURCHASED'] = datetime.date(2025, 1, 1) + datetime.timedelta(days=i)
+    payload = legacy._collect_payload(converted, None)
+
+    page = {'items': make_records(page_size, seed=11), 'next': 'https://saas.invalid/devices?page=2'}
+    page_bytes = codec.StdlibJSONCodec().dumps_bytes(page)
+    capture_item = {'kind': 'record', 'index': 0, 'data': make_records(1, seed=13)[0]}
+
+    payload_size = len(codec.dumps_bytes(payload, default=serializer))
+    return {
+        'bulk_payload.dumps': (lambda: codec.dumps_bytes(payload, default=serializer), payload_size),
+        'bulk_payload.gzip': (lambda: gzip_json(payload, default=serializer), payload_size),
+        'list_response.loads': (lambda: codec.loads(page_bytes), len(page_bytes)),
+        'list_response.loads_text': (lambda: codec.loads(page_bytes.decode('utf-8')), len(page_bytes)),
+        'capture_line.dumps': (lambda: codec.dumps_bytes(capture_item, default=serializer), len(codec.dumps_bytes(capture_item))),
+    }
+
+
+def measure(func: Callable[[], object], seconds: float, repeat: int) -> float:
+    """
+    Operations per second, the best of the rounds
+    """
+    started = time.perf_counter()
+    func()
+    # NOTE: the round is long enough to measure, but the small payloads are not run for ages
+    per_round = max(1, int(seconds / max(time.perf_counter() - started, 1e-6)))
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(per_round):
+            func()
+        best = min(best, time.perf_counter() - started)
+    return per_round / best if best else float('inf')
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compares the JSON codecs on the payloads of the real shapes")
+    parser.add_argument('--page-size', type=int, default=100, help="Number of the records in the list response page.")
+    parser.add_argument('--repeat', type=int, default=5, help="Number of the rounds, the best one is reported.")
+    parser.add_argument('--seconds', type=float, default=0.2, help="Approximate duration of the round.")
+    parser.add_argument('--codecs', type=str, nargs='+', default=None, choices=codec.JSON_CODECS[1:], help="Codecs to compare.")
+    args = parser.parse_args(argv)
+
+    codecs = args.codecs or [_ for _ in codec.JSON_CODECS[1:] if _ != 'orjson' or codec.orjson is not None]
+    if 'orjson' in codecs and codec.orjson is None:
+        print("The orjson package is not installed")
+        return 1
+
+    # NOTE: the shapes call the codec chosen at the moment, so the same payloads are given to every codec
+    shapes = build_shapes(args.page_size)
+    results: Dict[str, Dict[str, float]] = {}
+    outputs: Dict[str, List[object]] = {}
+    for name in codecs:
+        codec.set_codec(name)
+        outputs[name] = []
+        for shape, (func, _) in shapes.items():
+            outputs[name].append(func())
+            results.setdefault(shape, {})[name] = measure(func, args.seconds, args.repeat)
+
+    first = codecs[0]
+    mismatches = [name for name in codecs[1:] if outputs[name] != outputs[first]]
+
+    print(f"{'shape':<28} {'codec':<8} {'ops/sec':>12} {'MB/sec':>10} {'speedup':>8}")
+    for shape, by_codec in results.items():
+        base = by_codec.get('json')
+        for name, speed in by_codec.items():
+            speedup = f"{speed / base:>7.2f}x" if base else f"{'-':>8}"
+            print(f"{shape:<28} {name:<8} {speed:>12,.0f} {speed * shapes[shape][1] / 2 ** 20:>10,.1f} {speedup}")
+
+    if mismatches:
+        print(f"The codec(s) {', '.join(mismatches)} produce a different JSON than {first}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
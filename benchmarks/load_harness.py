@@ -0,0 +1,205 @@
+"""
+End-to-end load test of the connector against the local stand-ins of Oomnitza and the SaaS (see fakes.py).
+
+    $ python benchmarks/load_harness.py managed --records 5000 --workers 4 --bulk-batch-size 200
+    $ python benchmarks/load_harness.py upload --records 5000 --saas-latency 0.1 --saas-throttle-rate 0.05
+
+The `managed` scenario runs the managed syncs returned by the /check_managed of the fake Oomnitza, as the
+`managed` mode does, the `upload` scenario runs the Netbox connector as the `upload` mode does. Both report
+the throughput, the p50/p99 latency of the uploads to Oomnitza and the peak RSS of the connector process,
+run it with the different --workers and batch sizes to choose the values before the deployment.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import argparse  # noqa: E402
+import json  # noqa: E402
+import logging  # noqa: E402
+import os  # noqa: E402
+import subprocess  # noqa: E402
+import sys  # noqa: E402
+import tempfile  # noqa: E402
+import time  # noqa: E402
+
+import requests  # noqa: E402
+
+from synthetic import ROOT_DIR  # noqa: E402
+
+from connector import get_cmd_line_args_parser  # noqa: E402
+from constants import MODE_CLIENT_INITIATED_UPLOAD, MODE_CLOUD_INITIATED_UPLOAD  # noqa: E402
+from lib import codec, config  # noqa: E402
+from lib.metrics import STAGE_SECONDS  # noqa: E402
+from modes.client_initiated import client_initiated_upload  # noqa: E402
+from modes.cloud_initiated import start_managed_syncs  # noqa: E402
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+FAKES = os.path.join(ROOT_DIR, 'benchmarks', 'fakes.py')
+
+SCENARIOS = ('managed', 'upload')
+
+
+def start_fakes(options: dict):
+    """
+    Start the fake services in the child process and wait until they are listening
+    """
+    process = subprocess.Popen([sys.executable, FAKES, json.dumps(options)], stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line:
+        process.wait()
+        raise RuntimeError(f'The fake services failed to start, exit code {process.returncode}')
+    return process, json.loads(line)
+
+
+def write_ini(path: str, oomnitza_url: str, saas_url: str, tuning: dict):
+    lines = [
+        '[oomnitza]',
+        f'url = {oomnitza_url}',
+        'api_token = harness',
+        '',
+        '[netbox]',
+        'enable = True',
+        f'url = {saas_url}',
+        'auth_token = harness',
+        'use_server_map = False',
+        'sync_field = SERIAL',
+        'mapping.SERIAL = {"source": "serial"}',
+        'mapping.NAME = {"source": "name"}',
+        'mapping.MODEL = {"source": "model"}',
+        'mapping.USERNAME = {"source": "user.email", "converter": "split_email"}',
+    ]
+    lines.extend(f'{key} = {value}' for key, value in tuning.items())
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def run_scenario(args, ini_path: str):
+    cmdline = [MODE_CLOUD_INITIATED_UPLOAD if args.scenario == 'managed' else MODE_CLIENT_INITIATED_UPLOAD]
+    if args.scenario == 'upload':
+        cmdline.append('netbox')
+    cmdline_args = get_cmd_line_args_parser().parse_args(cmdline + ['--ini', ini_path, '--workers', str(args.workers), '--json-codec', args.json_codec])
+    codec.set_codec(cmdline_args.json_codec)
+
+    if args.scenario == 'managed':
+        oomnitza_config = config.parse_base_config_for_cloud_initiated(cmdline_args)
+        threads = start_managed_syncs(oomnitza_config, cmdline_args)
+        for thread in threads:
+            thread.join()
+    else:
+        client_initiated_upload(cmdline_args)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="End-to-end load test against the fake Oomnitza and SaaS")
+    parser.add_argument('scenario', choices=SCENARIOS, help="Run the managed syncs or the `upload` mode connector.")
+    parser.add_argument('--records', type=int, default=2000, help="Number of the records served by the SaaS.")
+    parser.add_argument('--page-size', type=int, default=100, help="Number of the records in the SaaS list page.")
+    parser.add_argument('--connectors', type=int, default=1, help="Number of the managed syncs run at once.")
+    parser.add_argument('--no-details', action='store_true', help="Do not call the detail behavior of the managed sync.")
+    parser.add_argument('--no-software', action='store_true', help="Do not call the software behavior of the managed sync.")
+    parser.add_argument('--workers', type=int, default=2, help="The --workers of the connector.")
+    parser.add_argument('--bulk-batch-size', type=int, default=None, help="The bulk_batch_size setting of the connector.")
+    parser.add_argument('--bulk-batch-max-bytes', type=int, default=None, help="The bulk_batch_max_bytes setting of the connector.")
+    parser.add_argument('--upload-workers', type=int, default=None, help="The upload_workers setting of the connector.")
+    parser.add_argument('--conversion-processes', type=int, default=None, help="The conversion_processes setting of the connector.")
+    parser.add_argument('--detail-concurrency', type=int, default=None, help="The detail_concurrency setting of the managed connector.")
+    parser.add_argument('--list-prefetch-depth', type=int, default=None, help="The list_prefetch_depth setting of the managed connector.")
+    parser.add_argument('--session-auth-ttl', type=float, default=None, help="The session_auth_ttl setting of the managed connector.")
+    parser.add_argument('--json-codec', type=str, default='auto', choices=codec.JSON_CODECS, help="The --json-codec of the connector.")
+    parser.add_argument('--saas-latency', type=float, default=0.02, help="Seconds the SaaS takes to respond.")
+    parser.add_argument('--saas-jitter', type=float, default=0.01, help="Random deviation of the SaaS latency, seconds.")
+    parser.add_argument('--saas-error-rate', type=float, default=0., help="Share of the SaaS responses failed with 500.")
+    parser.add_argument('--saas-throttle-rate', type=float, default=0., help="Share of the SaaS responses throttled with 429.")
+    parser.add_argument('--session-ttl', type=float, default=None,
+                        help="Use the session-based authorization, the lifetime of the SaaS session token in seconds, 0 for the token without the expiration.")
+    parser.add_argument('--upload-latency', type=float, default=0.02, help="Seconds Oomnitza takes to accept the upload.")
+    parser.add_argument('--upload-jitter', type=float, default=0.01, help="Random deviation of the upload latency, seconds.")
+    parser.add_argument('--log-level', type=str, default='WARNING', help="Logging level of the connector.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    tuning = {
+        key: value for key, value in (
+            ('bulk_batch_size', args.bulk_batch_size),
+            ('bulk_batch_max_bytes', args.bulk_batch_max_bytes),
+            ('upload_workers', args.upload_workers),
+            ('conversion_processes', args.conversion_processes),
+            ('detail_concurrency', args.detail_concurrency),
+            ('list_prefetch_depth', args.list_prefetch_depth),
+            ('session_auth_ttl', args.session_auth_ttl),
+        ) if value is not None
+    }
+
+    options = {
+        'records': args.records,
+        'page_size': args.page_size,
+        'saas_latency': args.saas_latency,
+        'saas_jitter': args.saas_jitter,
+        'saas_error_rate': args.saas_error_rate,
+        'saas_throttle_rate': args.saas_throttle_rate,
+        'saas_session_ttl': args.session_ttl,
+        'upload_latency': args.upload_latency,
+        'upload_jitter': args.upload_jitter,
+        'managed_connectors': args.connectors if args.scenario == 'managed' else 0,
+        'managed_details': not args.no_details,
+        'managed_software': not args.no_software,
+        'managed_settings': tuning,
+    }
+    connectors = options['managed_connectors'] or 1
+
+    process, ports = start_fakes(options)
+    try:
+        oomnitza_url = f"http://127.0.0.1:{ports['oomnitza']}"
+        saas_url = f"http://localhost:{ports['saas']}"
+
+        with tempfile.TemporaryDirectory() as directory:
+            ini_path = os.path.join(directory, 'config.ini')
+            write_ini(ini_path, oomnitza_url, saas_url, tuning)
+
+            started = time.perf_counter()
+            run_scenario(args, ini_path)
+            elapsed = time.perf_counter() - started
+
+        oomnitza_stats = requests.get(f'{oomnitza_url}/__stats').json()
+        saas_stats = requests.get(f'{saas_url}/__stats').json()
+    finally:
+        process.terminate()
+        process.wait()
+
+    uploaded = oomnitza_stats['uploaded_records']
+    p50 = STAGE_SECONDS.percentile(50, stage='upload')
+    p99 = STAGE_SECONDS.percentile(99, stage='upload')
+
+    def ms(value):
+        return f'{value * 1000:.1f} ms' if value is not None else '-'
+
+    print(f"scenario            {args.scenario}, {connectors} connector(s), --workers {args.workers}"
+          f"{''.join(f', {k} {v}' for k, v in tuning.items())}")
+    print(f"elapsed             {elapsed:.2f} s")
+    print(f"records uploaded    {uploaded} of {args.records * connectors}")
+    print(f"throughput          {uploaded / elapsed:,.1f} records/s")
+    print(f"uploads             {oomnitza_stats['uploads']}, {oomnitza_stats['upload_bytes'] / 1024:,.0f} KiB")
+    print(f"upload latency      p50 {ms(p50)}, p99 {ms(p99)}")
+    print(f"SaaS requests       {saas_stats['requests']} ({saas_stats['throttled']} throttled, {saas_stats['errors']} failed)")
+    if args.session_ttl is not None:
+        print(f"SaaS logins         {saas_stats['logins']} ({saas_stats['unauthorized']} rejected)")
+    print(f"peak RSS            {peak_rss_mb():,.1f} MiB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,38 @@
+"""
+Measures the cost of signing the requests of the assumed AWS IAM roles with the local AWS Signature Version 4
+signer (lib/aws_sigv4.py). The signer is checked against the AWS test vectors by tests/test_aws_sigv4.py.
+
+    $ python benchmarks/sigv4_signing.py --requests 50000
+"""
+import argparse
+import datetime
+import sys
+import time
+
+from synthetic import ROOT_DIR  # noqa: F401
+
+from lib.aws_sigv4 import sign_request  # noqa: E402
+
+ACCESS_KEY = 'ASIAEXAMPLE'
+SECRET_KEY = 'wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY'
+SESSION_TOKEN = 'role-session-token' * 20
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Measures the cost of the SigV4 signing")
+    parser.add_argument('--requests', type=int, default=20000, help="Number of the requests signed.")
+    args = parser.parse_args(argv)
+
+    # the typical EC2 list call of the role session
+    params = {'Action': 'DescribeInstances', 'Version': '2016-11-15', 'MaxResults': '1000'}
+    started = time.perf_counter()
+    for _ in range(args.requests):
+        api_call_specification = {'http_method': 'GET', 'url': 'https://ec2.us-west-2.amazonaws.com/', 'headers': {}, 'params': dict(params), 'body': None}
+        sign_request(api_call_specification, ACCESS_KEY, SECRET_KEY, session_token=SESSION_TOKEN, now=datetime.datetime.now(datetime.timezone.utc))
+    elapsed = time.perf_counter() - started
+    print(f"{'signing':<36} {args.requests / elapsed:,.0f} requests/s, {elapsed / args.requests * 1e6:.1f} us per request")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
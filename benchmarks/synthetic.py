@@ -0,0 +1,128 @@
+"""
+Synthetic records and offline connectors shared by the benchmarks
+"""
+import os
+import random
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from lib.api_caller import ConfigurableExternalAPICaller  # noqa: E402
+from lib.connector import BaseConnector  # noqa: E402
+
+OS_NAMES = ('macOS', 'Windows', 'Ubuntu')
+MODELS = ('MacBook Pro', 'ThinkPad X1', 'Latitude 7440', 'Surface Laptop')
+
+
+def make_record(i: int, rnd: random.Random) -> dict:
+    """
+    The shape of the typical MDM device: a flat part, the nested sections and a list of the applications
+    """
+    return {
+        'id': i,
+        'serial_number': f'C02X{i:08d}',
+        'device name': f'device-{i}',
+        'os': rnd.choice(OS_NAMES),
+        'model': rnd.choice(MODELS),
+        'cpu_count': rnd.choice((2, 4, 8, 16)),
+        'last_seen': f'2026-0{rnd.randint(1, 9)}-1{rnd.randint(0, 9)} 1{rnd.randint(0, 9)}:30:00',
+        'ldap_last_logon': str(133000000000000000 + i * 10 ** 7),
+        'memberOf': 'CN=Engineering,OU=Groups,DC=example,DC=com',
+        'user': {
+            'full_name': f'Jane Doe{i}',
+            'email': f'jane.doe{i}@example.com',
+            'department': {'name': 'Engineering', 'code': 'ENG'},
+        },
+        'hardware': {
+            'memory_mb': rnd.choice((8192, 16384, 32768)),
+            'disks': [{'name': 'disk0', 'size_gb': 512}, {'name': 'disk1', 'size_gb': 1024}],
+        },
+        'applications': [
+            {'name': f'app-{j}', 'version': f'{j}.{i % 10}', 'path': f'/Applications/app-{j}.app'}
+            for j in range(rnd.randint(5, 15))
+        ],
+    }
+
+
+def make_records(count: int, seed: int = 42) -> list:
+    rnd = random.Random(seed)
+    return [make_record(i, rnd) for i in range(count)]
+
+
+class OfflineOomnitza:
+    """
+    Stands for the Oomnitza connector, nothing is sent anywhere
+    """
+    settings = {'url': 'http://oomnitza.invalid', 'api_token': 'benchmark'}
+
+    def __init__(self):
+        self.uploads = []
+        self.finalized = []
+
+    def upload(self, payload):
+        self.uploads.append(payload)
+
+    def test_upload(self, payload):
+        self.uploads.append(payload)
+
+    def finalize_portion(self, portion):
+        self.finalized.append(portion)
+
+    def get_portion_info(self, correlation_id):
+        return {}
+
+
+class LegacyConnector(BaseConnector):
+    MappingName = 'benchmark'
+    RecordType = 'assets'
+    FieldMappings = {
+        'SERIAL_NUMBER': {'source': 'serial_number', 'required': True},
+        'NAME': {'source': 'device name'},
+        'MODEL': {'source': 'model'},
+        'OS': {'source': 'os', 'converter': 'capitalize'},
+        'USERNAME': {'source': 'user.email', 'converter': 'split_email'},
+        'FIRST_NAME': {'source': 'user.full_name', 'converter': 'first_from_full'},
+        'DEPARTMENT': {'source': 'user.department.name'},
+        'MEMORY': {'source': 'hardware.memory_mb'},
+        'LAST_SEEN': {'source': 'last_seen', 'converter': 'date_format'},
+        'GROUP': {'source': 'memberOf', 'converter': 'memberOf:Engineering=eng|default=other'},
+        'SYNC_FIELD': {'setting': 'sync_field'},
+        'SOURCE': {'hardcoded': 'benchmark'},
+    }
+
+
+class ManagedConnector(ConfigurableExternalAPICaller, BaseConnector):
+    ConnectorID = 'benchmark'
+    MappingName = 'benchmark'
+    RecordType = 'assets'
+
+    def get_managed_mapping_from_oomnitza(self):
+        return {
+            'serial_number': {'type': 'attribute', 'value': 'serial_number'},
+            'name': {'type': 'attribute', 'value': '{{ device_SPACE_name }}'},
+            'model': {'type': 'attribute', 'value': '{{ model|upper }}'},
+            'os': {'type': 'attribute', 'value': "{{ os if os != 'macOS' else 'OS X' }}"},
+            'username': {'type': 'attribute', 'value': "{{ user.email.split('@')[0] }}"},
+            'department': {'type': 'attribute', 'value': 'user.department.name'},
+            'memory': {'type': 'attribute', 'value': '{{ hardware.memory_mb // 1024 }}'},
+            'disks': {'type': 'attribute', 'value': "{{ hardware.disks|map(attribute='size_gb')|sum }}"},
+            'apps': {'type': 'attribute', 'value': '{{ applications|length }}'},
+            'source': {'type': 'value', 'value': 'benchmark'},
+        }
+
+
+def make_connector(connector_class, workers: int = 0, **settings):
+    BaseConnector.OomnitzaConnector = OfflineOomnitza()
+    section = 'managed.benchmark' if connector_class is ManagedConnector else 'benchmark'
+    connector = connector_class(section, {
+        '__workers__': workers,
+        '__testmode__': False,
+        '__name__': section,
+        'use_server_map': 'False',
+        'sync_field': 'serial_number',
+        **settings
+    })
+    connector.OomnitzaConnector = BaseConnector.OomnitzaConnector
+    return connector
@@ -3,14 +3,21 @@ from gevent import monkey
 monkey.patch_all()
 
 import argparse
+import atexit
 import logging
+import signal
 import sys
 
+import gevent
+
 from constants import (MODE_CLIENT_INITIATED_UPLOAD, MODE_CLOUD_INITIATED_UPLOAD,
-                       MODE_GENERATE_INI_TEMPLATE, MODE_VERSION)
-from lib import config, version
+                       MODE_GENERATE_INI_TEMPLATE, MODE_REPLAY, MODE_VERSION)
+from lib import codec, config, version
+from lib.capture import COMPRESSIONS
+from lib.metrics import REGISTRY as METRICS
 from modes.client_initiated import client_initiated_upload
 from modes.cloud_initiated import cloud_initiated_upload
+from modes.replay import REPLAY_SINKS, replay_upload
 from utils.relative_path import relative_app_path
 
 
@@ -22,6 +29,7 @@ def get_cmd_line_args_parser(for_server=False):
     modes = (
         MODE_CLOUD_INITIATED_UPLOAD,
         MODE_CLIENT_INITIATED_UPLOAD,
+        MODE_REPLAY,
         MODE_GENERATE_INI_TEMPLATE,
         MODE_VERSION,
     )
@@ -33,16 +41,24 @@ def get_cmd_line_args_parser(for_server=False):
         parser.add_argument('--port', type=int, default=8000)
     else:
         parser.add_argument("mode", nargs='?', default=MODE_CLOUD_INITIATED_UPLOAD, choices=modes, help="Action to perform.")
-        parser.add_argument("connectors", nargs='*', default=[], help="Connectors to run. Relevant only for the `upload` mode")
-        parser.add_argument('--record-count', type=int, default=None, help="Number of records to pull and process from connection. Relevant only for the `upload` mode")
+        parser.add_argument("connectors", nargs='*', default=[], help="Connectors to run. Relevant only for the `upload` and `replay` modes")
+        parser.add_argument('--record-count', type=int, default=None, help="Number of records to pull and process from connection. Relevant only for the `upload` and `replay` modes")
         parser.add_argument('--workers', type=int, default=2, help="Number of async IO workers used to pull & push records.")
         parser.add_argument('--ignore-cloud-maintenance', action='store_true', help="Adds special behavior for the managed connectors to ignore the cloud maintenance")
+        parser.add_argument('--metrics-file', type=str, default=None, help="Save the metrics in the Prometheus text format to this file at exit.")
+        parser.add_argument('--replay-from', type=str, nargs='+', default=None, help="Files, directories or glob patterns of the data saved by the --save-data. Relevant only for the `replay` mode")
+        parser.add_argument('--replay-sink', type=str, default='local', choices=REPLAY_SINKS, help="Upload the replayed records to Oomnitza or only count them locally. Relevant only for the `replay` mode")
 
     parser.add_argument('--show-mappings', action='store_true', help="Show the mappings which would be used by the connector. Relevant only for the `upload` mode")
     parser.add_argument('--testmode', action='store_true', help="Run connectors in test mode.")
     parser.add_argument('--save-data', action='store_true', help="Saves the data loaded from other system.")
+    parser.add_argument('--save-data-compression', type=str, default='none', choices=COMPRESSIONS, help="Compression of the data saved by the --save-data.")
+    parser.add_argument('--save-data-rotate-mb', type=float, default=256, help="Start the next file of the saved data after this many megabytes, 0 to never rotate.")
     parser.add_argument('--ini', type=str, default=relative_app_path("config.ini"), help="Config file to use.")
     parser.add_argument('--logging-config', type=str, default=relative_app_path('logging.json'), help="Use to override logging config file to use.")
+    parser.add_argument('--profile', action='store_true', help="Profile every connector run and save the profiles to the --profile-dir.")
+    parser.add_argument('--profile-dir', type=str, default=relative_app_path('profiles'), help="Directory to save the profiles to.")
+    parser.add_argument('--json-codec', type=str, default='auto', choices=codec.JSON_CODECS, help="JSON library used for the payloads and the responses, `auto` uses orjson if it is installed.")
 
     return parser
 
@@ -54,6 +70,7 @@ def parse_command_line_args(for_server=False):
     cmdline_args = parser.parse_args()
 
     config.setup_logging(cmdline_args)
+    codec.set_codec(cmdline_args.json_codec)
 
     if for_server:
         # region COMPATIBILITY WITH CONFIG PARSER
@@ -68,11 +85,18 @@ if __name__ == "__main__":
 
     LOG.info("Connector version: %s", version.VERSION)
 
+    if args.metrics_file:
+        atexit.register(METRICS.write_to_file, args.metrics_file)
+        # NOTE: the `managed` mode runs until it is stopped, and SIGTERM kills the process without running the `atexit` handlers,
+        #  so it exits the process the regular way. Only with the metrics file, otherwise there is nothing to save on the way out
+        gevent.signal_handler(signal.SIGTERM, sys.exit, 128 + signal.SIGTERM)
+
     mode_handlers = {
         MODE_VERSION:                   lambda *a: sys.exit(0),  # just exit immediately
         MODE_GENERATE_INI_TEMPLATE:     config.generate_ini_file,
         MODE_CLIENT_INITIATED_UPLOAD:   client_initiated_upload,
         MODE_CLOUD_INITIATED_UPLOAD:    cloud_initiated_upload,
+        MODE_REPLAY:                    replay_upload,
     }
 
     try:
@@ -1,19 +1,40 @@
 import copy
+import functools
+import hashlib
 import importlib
+import itertools
 import json
+import re
+import time
 import traceback
-from typing import Optional, Dict
+from typing import Optional, Dict, Set, Tuple
+
+from gevent.pool import Pool
+from jinja2 import TemplateSyntaxError, meta
+from requests.structures import CaseInsensitiveDict
 
 from constants import TRUE_VALUES
+from lib import aws_sigv4
 from lib.api_caller import ConfigurableExternalAPICaller
 from lib.aws_iam import AWSIAM
+from lib.checkpoints import CheckpointStore, SyncCheckpoint
 from lib.connector import BaseConnector
-from utils.helper_utils import response_to_object
+from utils.helper_utils import StreamedJSON, response_body, response_to_object
 from lib.error import ConfigError
-from lib.httpadapters import init_mtls_ssl_adapter, SSLAdapter
+from lib.fanout import FanOut
+from lib.httpadapters import init_mtls_ssl_adapter, pool_maxsize_for, SSLAdapter
+from lib.prefetch import Prefetcher
+from lib.session_secret import SessionSecretCache
 
 from requests.exceptions import HTTPError
 
+# the `result` of the list behavior being the plain path in the list response, e.g. {{ list_response['data']['items'] }}
+STREAMED_RESULT_RE = re.compile(r'''^\{\{\s*list_response((?:\s*(?:\.\s*[A-Za-z_]\w*|\[\s*(?:'[^'\\]*'|"[^"\\]*"|\d+)\s*\]))*)\s*\}\}$''')
+STREAMED_PATH_PART_RE = re.compile(r'''\.\s*([A-Za-z_]\w*)|\[\s*(?:'([^'\\]*)'|"([^"\\]*)"|(\d+))\s*\]''')
+
+# the size of the chunks the streamed list responses are read by
+STREAM_CHUNK_SIZE = 64 * 1024
+
 
 class Connector(ConfigurableExternalAPICaller, BaseConnector):
     """
@@ -49,9 +70,50 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
             'example': False,
             'default': False
         },
+        'template_cache_size': {
+            'order': 6,
+            'example': 512,
+            'default': 512
+        },
+        'checkpoint_every_pages': {
+            'order': 7,
+            'example': 0,
+            'default': 0
+        },
+        'checkpoint_resume_window': {
+            'order': 8,
+            'example': 21600,
+            'default': 21600
+        },
+        'stream_list_responses': {
+            'order': 9,
+            'example': False,
+            'default': False
+        },
+        'detail_concurrency': {
+            'order': 10,
+            'example': 1,
+            'default': 1
+        },
+        'list_prefetch_depth': {
+            'order': 11,
+            'example': 0,
+            'default': 0
+        },
+        'session_auth_ttl': {
+            'order': 12,
+            'example': 0,
+            'default': 0
+        },
+        'iam_account_concurrency': {
+            'order': 13,
+            'example': 1,
+            'default': 1
+        },
     }
 
     session_auth_behavior = None
+    session_secret = None
     inputs_from_cloud = None
     list_behavior = None
     detail_behavior = None
@@ -62,6 +124,16 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
     ConnectorID = None
 
     MAX_ITERATIONS = 1000
+    # the behaviors are distinguished by these names in the metrics
+    BEHAVIOR_NAMES = ('session_auth', 'exploratory_list', 'pre_list', 'list', 'detail', 'software', 'saas')
+    # the rendering context variables set while the items of the list page are processed
+    ITEM_CONTEXT_NAMES = frozenset(('list_response_item', 'detail_response', 'software_response', 'software_response_item'))
+
+    _checkpoint_store = None
+    _checkpoint_context_names = frozenset()
+    _streamed_list_path = None
+    _list_prefetch_depth = 0
+    _list_canceled = False
 
     def __init__(self, section, settings):
         self.inputs_from_cloud = settings.pop('inputs', {}) or {}
@@ -82,6 +154,7 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
 
         self.settings['update_only'] = update_only
         self.settings['insert_only'] = insert_only
+        self.template_cache.maxsize = int(self.settings['template_cache_size'])
         self.saas_authorization_loader()
         self.oomnitza_authorization_loader()
 
@@ -91,6 +164,12 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
         if self.saas_behavior is not None and self.saas_behavior.get('enabled'):
             self.field_mappings['SAAS'] = {'source': "saas"}
 
+    @classmethod
+    def create_converter(cls, state: dict):
+        converter = super().create_converter(state)
+        converter.init_jinja_environments(int(converter.settings['template_cache_size']))
+        return converter
+
     def saas_authorization_loader(self):
         """
         There can be two options here:
@@ -116,6 +195,7 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
             # special session-based configuration where the credentials can be generated dynamically locally, so we should not expect the ready headers or params here
             self.settings['saas_authorization'] = {}
             self.session_auth_behavior = value['behavior']
+            self.session_secret = SessionSecretCache(self.generate_session_based_secret, logger=self.logger)
 
         elif (isinstance(value.get('headers', {}), dict) and value.get('headers')) or (isinstance(value.get('params', {}), dict) and value.get('params')):
             # on-premise setup with ready-to-use headers and params
@@ -161,13 +241,14 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
         """
         api_call_specification = self.build_call_specs(self.session_auth_behavior)
 
-        response = self.perform_api_request(
-            logger=self.logger,
-            **api_call_specification,
-        )
+        with self.observe_stage('fetch_session_auth'):
+            response = self.perform_api_request(
+                logger=self.logger,
+                **api_call_specification,
+            )
         response_headers = response.headers
 
-        response = response_to_object(response.text)
+        response = response_to_object(response_body(response))
 
         self.update_rendering_context(
             response=response,
@@ -183,25 +264,52 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
             for _ in self.session_auth_behavior["result"].get("params", [])
         }
 
+        ttl = self.get_session_secret_ttl(response)
+
         # NOTE: remove the response from the global rendering context because
         # it was specific for the session auth flow
         self.clear_rendering_context("response", "response_headers")
 
         return {
             "headers": auth_headers,
-            "params": auth_params
+            "params": auth_params,
+            "ttl": ttl
         }
 
+    def get_session_secret_ttl(self, response) -> float:
+        """
+        The number of seconds the session secret is reused for: the `ttl` of the session behavior, rendered with the login `response`,
+        the `expires_in` of the login response or the `session_auth_ttl` setting. 0 means the secret is generated for every request
+        """
+        ttl = self.session_auth_behavior.get('ttl')
+        if isinstance(ttl, str):
+            ttl = self.render_to_native(ttl)
+        if ttl in (None, '') and isinstance(response, dict):
+            ttl = response.get('expires_in')
+        if ttl in (None, ''):
+            ttl = self.settings.get('session_auth_ttl')
+
+        try:
+            return max(float(ttl or 0), 0.)
+        except (TypeError, ValueError):
+            self.logger.warning(f"The lifetime of the session secret {ttl!r} is not a number of seconds, the secret is not reused")
+            return 0.
+
     def attach_saas_authorization(self, api_call_specification, iam_credentials: Optional[dict] = None) -> (dict, dict, Optional[SSLAdapter]):
         """
         There can be two options here:
             - there is credential_id string to be used in case of cloud connector setup
             - there is a JSON containing the ready-to-use headers and params in case of on-premise connector setup
+
+        The requests made with the AWS IAM role session are signed locally right before they are sent, see `perform_authorized_request`
         """
         ssl_adapter = None
 
+        if iam_credentials:
+            return {}, {}, ssl_adapter, {}, {}
+
         if self.session_auth_behavior:
-            secret = self.generate_session_based_secret()
+            secret = self.session_secret.get()
         else:
             secret = self.settings['saas_authorization']
 
@@ -232,6 +340,15 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
             self.logger.exception(f"Unable to convert response to JSON: {response.text}")
         return response.text
 
+    def behavior_name(self, behavior) -> str:
+        """
+        Name of the behavior used in the metrics
+        """
+        for name in self.BEHAVIOR_NAMES:
+            if getattr(self, f'{name}_behavior', None) is behavior:
+                return name
+        return 'other'
+
     def render_add_if_controls(self, api_specification, pagination_controls):
         extra_headers = {_['key']: self.render_to_string(_['value']) for _ in pagination_controls.get('headers', [])}
         extra_params = {_['key']: self.render_to_string(_['value']) for _ in pagination_controls.get('params', [])}
@@ -239,7 +356,43 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
         api_specification['params'].update(**extra_params)
         return api_specification
 
-    def make_api_request(self, behavior, pagination, break_early, add_if, iam_credentials=None):
+    def perform_authorized_request(self, behavior, api_call_specification, auth_headers, auth_params, iam_credentials=None, stream=False):
+        """
+        Perform the request of the behavior with the SaaS authorization already attached to the specification.
+        If the SaaS rejects the reused session secret, the secret is generated again and the request is repeated once.
+        The request made with the AWS IAM role session is signed with its temporary credentials
+        """
+        if iam_credentials:
+            aws_sigv4.sign_request(api_call_specification, **iam_credentials)
+
+        with self.observe_stage(f'fetch_{self.behavior_name(behavior)}'):
+            try:
+                return self.perform_api_request(logger=self.logger, stream=stream, **api_call_specification)
+            except HTTPError as exc:
+                if stream and exc.response is not None:
+                    # NOTE: the body of the failed streamed response is never read, release its connection
+                    exc.response.close()
+                if not (self.session_auth_behavior and exc.response is not None and exc.response.status_code in (401, 403)):
+                    raise
+                if not self.session_secret.invalidate(auth_headers, auth_params):
+                    raise
+
+            self.logger.info("The session secret has been rejected by the SaaS, generating the new one")
+            for key in auth_headers:
+                api_call_specification['headers'].pop(key, None)
+            for key in auth_params:
+                api_call_specification['params'].pop(key, None)
+            secret = self.session_secret.get()
+            api_call_specification['headers'].update(**secret['headers'])
+            api_call_specification['params'].update(**secret['params'])
+            try:
+                return self.perform_api_request(logger=self.logger, stream=stream, **api_call_specification)
+            except HTTPError as exc:
+                if stream and exc.response is not None:
+                    exc.response.close()
+                raise
+
+    def make_api_request(self, behavior, pagination, break_early, add_if, iam_credentials=None, stream_path=None):
         api_call_specification = self.build_call_specs(behavior)
 
         # NOTE: Check if we have to add the pagination extra things
@@ -266,10 +419,261 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
         api_call_specification['params'].update(**auth_params)
         api_call_specification['ssl_adapter'] = ssl_adapter
 
-        response = self.perform_api_request(logger=self.logger, **api_call_specification)
-        return response_to_object(response.text), response.headers, response.links
+        response = self.perform_authorized_request(behavior, api_call_specification, auth_headers, auth_params, iam_credentials=iam_credentials,
+                                                   stream=stream_path is not None)
+
+        if stream_path is not None:
+            # NOTE: the JSON is UTF-8 unless the charset is given explicitly
+            response.encoding = response.encoding or 'utf-8'
+            streamed = StreamedJSON(response.iter_content(STREAM_CHUNK_SIZE, decode_unicode=True), stream_path, on_close=response.close)
+            return streamed, response.headers, response.links
+
+        return response_to_object(response_body(response)), response.headers, response.links
+
+    def get_streamed_list_path(self) -> Optional[list]:
+        """
+        The path of the items array in the list response if the list responses are streamed, see `stream_list_responses`
+        """
+        if self.settings.get('stream_list_responses') not in TRUE_VALUES:
+            return None
+
+        match = STREAMED_RESULT_RE.match(str(self.list_behavior.get('result') or '').strip())
+        if not match:
+            self.logger.warning("The result of the list behavior is not a plain path in the list_response, the list responses are not streamed")
+            return None
+
+        path = []
+        for attribute, single_quoted, double_quoted, index in STREAMED_PATH_PART_RE.findall(match.group(1)):
+            if attribute:
+                # NOTE: Jinja resolves the attributes of the dict before its keys, e.g. `list_response.items` is the method
+                if hasattr(dict, attribute):
+                    self.logger.warning("The result of the list behavior refers to `%s` of the dict, the list responses are not streamed", attribute)
+                    return None
+                path.append(attribute)
+            elif index:
+                path.append(int(index))
+            else:
+                path.append(single_quoted or double_quoted)
+        return path
+
+    def stream_list_results(self, streamed: StreamedJSON, headers, links, result_control):
+        """
+        The items of the list page yielded while the response is being read. The `list_response` is filled while the
+        page is read and keeps everything but the items, the array of the items knows only their number, the first and the last one
+        """
+        items = streamed.items()
+        nothing = object()
+        first_item = next(items, nothing)
+
+        self.update_rendering_context(
+            list_response=streamed.document,
+            list_response_headers=headers,
+            list_response_links=links
+        )
+        if not streamed.found:
+            # there is no array at the path, for example the error message, so the response is processed as usual
+            return self.render_to_native(result_control) if streamed.document else None
+
+        if first_item is nothing:
+            return None
+        return itertools.chain([first_item], items)
+
+    def fetch_list_pages(self, iteration, pagination_dict, break_early_control, add_if_control, result_control,
+                         iam_credentials: dict = None, context=None):
+        """
+        The pages of the list requested one after another ahead of the items being processed, see `list_prefetch_depth`.
+
+        The pagination is rendered in the own rendering scope over the given `context` of the consumer, started with the pagination
+        context of the given iteration, so the context of the page being processed is not changed. Yields the response,
+        its headers and links and the items, stops after the page without the items
+        """
+        with self.rendering_scope(context):
+            self.update_rendering_context(**{
+                name: self.get_arg_from_rendering_context(name) for name in self.pagination_context_names('list')
+            })
+            while iteration < self.MAX_ITERATIONS:
+                list_response, headers, links = self.make_api_request(self.list_behavior, pagination_dict,
+                                                                      break_early_control, add_if_control,
+                                                                      iam_credentials=iam_credentials)
+                results = None
+                if list_response:
+                    self.update_rendering_context(
+                        list_response=list_response,
+                        list_response_headers=headers,
+                        list_response_links=links
+                    )
+                    results = self.render_to_native(result_control)
+
+                yield list_response, headers, links, results
+                if not results:
+                    return
+
+                iteration += 1
+                self.update_rendering_context(
+                    iteration=iteration
+                )
+
+    def get_list_prefetch_depth(self) -> int:
+        """
+        The number of the list pages requested ahead of the page being processed, see `list_prefetch_depth`
+        """
+        depth = int(self.settings.get('list_prefetch_depth') or 0)
+        if depth <= 0:
+            return 0
+
+        if self._streamed_list_path is not None:
+            self.logger.info("The list responses are streamed, the list pages are not prefetched")
+            return 0
+
+        # NOTE: the next page is requested before the items of the current one are processed, so it must not depend on them
+        item_names = self.find_template_variables(('list',)) & self.ITEM_CONTEXT_NAMES
+        if item_names:
+            self.logger.warning("The list behavior refers to %s, the list pages are not prefetched", ', '.join(sorted(item_names)))
+            return 0
+        return depth
+
+    @staticmethod
+    def pagination_context_names(level: str) -> Tuple[str, ...]:
+        """
+        The names of the rendering context variables of the pagination level, the iteration goes first
+        """
+        iteration_name = 'iteration' if level == 'list' else f'{level}_iteration'
+        return iteration_name, f'{level}_response', f'{level}_response_headers', f'{level}_response_links'
 
-    def get_exploratory_list_of_items(self, batch_size=100):
+    def find_template_variables(self, behavior_names: Tuple[str, ...] = BEHAVIOR_NAMES) -> Set[str]:
+        """
+        The names of all the variables used by the templates of the behaviors
+        """
+        names = set()
+
+        def walk(value):
+            if isinstance(value, str):
+                if '{' in value:
+                    try:
+                        names.update(meta.find_undeclared_variables(self.jinja_native_env.parse(value)))
+                    except TemplateSyntaxError:
+                        pass
+            elif isinstance(value, dict):
+                for _ in value.values():
+                    walk(_)
+            elif isinstance(value, (list, tuple)):
+                for _ in value:
+                    walk(_)
+
+        for behavior_name in behavior_names:
+            walk(getattr(self, f'{behavior_name}_behavior', None))
+        return names
+
+    def pagination_fingerprint(self) -> str:
+        """
+        The checkpoint is valid only for the same list behaviors and the same inputs
+        """
+        content = json.dumps(
+            [self.exploratory_list_behavior, self.pre_list_behavior, self.list_behavior, self.get_arg_from_rendering_context('inputs')],
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def start_checkpoints(self) -> Optional[dict]:
+        """
+        Enable the checkpoints of the pagination if configured and return the positions to resume from, if any
+        """
+        self._checkpoint_store = None
+        self._pagination_positions = {}
+        self._pages_since_checkpoint = 0
+
+        checkpoint_every_pages = int(self.settings.get('checkpoint_every_pages') or 0)
+        is_test_run = self.settings['__testmode__'] or self.settings.get('test_run', False) in TRUE_VALUES
+        if checkpoint_every_pages <= 0 or is_test_run:
+            return None
+
+        self._checkpoint_store = CheckpointStore(self.ConnectorID)
+        # NOTE: only the values the templates refer to are needed to render the next request, the whole responses can be huge
+        self._checkpoint_context_names = frozenset(self.find_template_variables())
+
+        saved = self._checkpoint_store.load()
+        if not saved:
+            return None
+
+        state, saved_at = saved
+        resume_window = int(self.settings.get('checkpoint_resume_window') or 0)
+        if state.get('fingerprint') != self.pagination_fingerprint():
+            self.logger.info("The list behaviors or the inputs have changed since the checkpoint, the sync starts over")
+            return None
+        if resume_window and time.time() - saved_at > resume_window:
+            self.logger.info("The checkpoint is older than %s second(s), the sync starts over", resume_window)
+            return None
+
+        self.logger.info("Resuming the sync from the checkpoint saved at %s", time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(saved_at)))
+        return state['positions']
+
+    def capture_pagination_context(self, level: str) -> dict:
+        iteration_name, *response_names = self.pagination_context_names(level)
+        context = {iteration_name: self.get_arg_from_rendering_context(iteration_name)}
+        for name in response_names:
+            if name in self._checkpoint_context_names:
+                value = self.get_arg_from_rendering_context(name)
+                # the headers are the case-insensitive dict of requests
+                context[name] = dict(value) if isinstance(value, CaseInsensitiveDict) else value
+        return context
+
+    def remember_pagination_position(self, level: str, item: int = 0):
+        """
+        Remember the rendering context the current page of the level has been requested with
+        """
+        if self._checkpoint_store is not None:
+            self._pagination_positions[level] = {'context': self.capture_pagination_context(level), 'item': item}
+
+    def remember_pagination_item(self, level: str, item: int):
+        if self._checkpoint_store is not None:
+            self._pagination_positions[level]['item'] = item
+
+    def forget_pagination_position(self, level: str):
+        if self._checkpoint_store is not None:
+            self._pagination_positions.pop(level, None)
+
+    def restore_pagination_position(self, level: str, position: dict) -> int:
+        """
+        Put the saved rendering context of the level back and return its iteration
+        """
+        iteration_name, _, headers_name, _ = self.pagination_context_names(level)
+        context = dict(position['context'])
+        if headers_name in context:
+            context[headers_name] = CaseInsensitiveDict(context[headers_name])
+        self.update_rendering_context(**context)
+        return context[iteration_name]
+
+    def pagination_checkpoint(self):
+        """
+        Count the fully loaded page of the list and yield the checkpoint every `checkpoint_every_pages` pages
+        """
+        if self._checkpoint_store is None:
+            return
+
+        self._pages_since_checkpoint += 1
+        if self._pages_since_checkpoint < int(self.settings['checkpoint_every_pages']):
+            return
+        self._pages_since_checkpoint = 0
+
+        # NOTE: the list iteration is already incremented, so the next run starts from the next page
+        self.remember_pagination_position('list')
+        state = {
+            'fingerprint': self.pagination_fingerprint(),
+            'positions': {level: {'context': dict(position['context']), 'item': position['item']}
+                          for level, position in self._pagination_positions.items()}
+        }
+
+        def commit():
+            self._checkpoint_store.save(state)
+            self.logger.debug("The checkpoint of the sync has been saved")
+
+        yield SyncCheckpoint(commit)
+
+    def clear_checkpoint(self):
+        if self._checkpoint_store is not None:
+            self._checkpoint_store.clear()
+
+    def get_exploratory_list_of_items(self, batch_size=100, resume: Optional[dict] = None):
         exploratory_list_iteration = 0
 
         try:
@@ -286,11 +690,19 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
             add_if_control = pagination_dict.get('add_if')
             result_control = self.exploratory_list_behavior.get('result')
 
+            position = (resume or {}).get('exploratory_list')
+            skip_items = 0
+            if position:
+                exploratory_list_iteration = self.restore_pagination_position('exploratory_list', position)
+                skip_items = position['item']
+
             while exploratory_list_iteration < self.MAX_ITERATIONS:
 
                 if self.is_run_canceled():
+                    self._list_canceled = True
                     break
 
+                self.remember_pagination_position('exploratory_list')
                 exploratory_list_response, headers, links = self.make_api_request(self.exploratory_list_behavior,
                                                                                   pagination_dict,
                                                                                   break_early_control,
@@ -313,17 +725,24 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
                     else:
                         break
 
-                for exploratory_list_response_item in results:
+                for item_index, exploratory_list_response_item in enumerate(results):
+                    if item_index < skip_items:
+                        continue
+                    self.remember_pagination_item('exploratory_list', item_index)
                     self.update_rendering_context(
                         exploratory_list_response_item=exploratory_list_response_item,
                     )
-                    for batch_results in self.get_pre_list_of_items(batch_size, skip_empty_response=True):
+                    # NOTE: the inner levels are resumed only for the item the checkpoint has been saved within
+                    inner_resume, resume = resume, None
+                    for batch_results in self.get_pre_list_of_items(batch_size, skip_empty_response=True, resume=inner_resume):
                         yield batch_results
 
+                skip_items = 0
                 exploratory_list_iteration += 1
                 self.update_rendering_context(
                     exploratory_list_iteration=exploratory_list_iteration
                 )
+            self.forget_pagination_position('exploratory_list')
         except self.ManagedConnectorListGetEmptyInBeginningException as exc:
             raise exc
         except Exception as exc:
@@ -333,7 +752,7 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
             else:
                 raise self.ManagedConnectorListGetInMiddleException(error=str(exc))
 
-    def get_pre_list_of_items(self, batch_size=100, skip_empty_response: bool = False):
+    def get_pre_list_of_items(self, batch_size=100, skip_empty_response: bool = False, resume: Optional[dict] = None):
         pre_list_iteration = 0
 
         try:
@@ -350,11 +769,19 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
             add_if_control = pagination_dict.get('add_if')
             result_control = self.pre_list_behavior.get('result')
 
+            position = (resume or {}).get('pre_list')
+            skip_items = 0
+            if position:
+                pre_list_iteration = self.restore_pagination_position('pre_list', position)
+                skip_items = position['item']
+
             while pre_list_iteration < self.MAX_ITERATIONS:
 
                 if self.is_run_canceled():
+                    self._list_canceled = True
                     break
 
+                self.remember_pagination_position('pre_list')
                 pre_list_response, headers, links = self.make_api_request(self.pre_list_behavior, pagination_dict,
                                                                           break_early_control, add_if_control)
 
@@ -373,17 +800,23 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
                     else:
                         break
 
-                for pre_list_response_item in results:
+                for item_index, pre_list_response_item in enumerate(results):
+                    if item_index < skip_items:
+                        continue
+                    self.remember_pagination_item('pre_list', item_index)
                     self.update_rendering_context(
                         pre_list_response_item=pre_list_response_item,
                     )
-                    for batch_results in self.get_list_of_items(batch_size, skip_empty_response=True):
+                    inner_resume, resume = resume, None
+                    for batch_results in self.get_list_of_items(batch_size, skip_empty_response=True, resume=inner_resume):
                         yield batch_results
 
+                skip_items = 0
                 pre_list_iteration += 1
                 self.update_rendering_context(
                     pre_list_iteration=pre_list_iteration
                 )
+            self.forget_pagination_position('pre_list')
 
         except self.ManagedConnectorListGetEmptyInBeginningException as exc:
             raise exc
@@ -394,8 +827,10 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
             else:
                 raise self.ManagedConnectorListGetInMiddleException(error=str(exc))
 
-    def get_list_of_items(self, batch_size, iam_credentials: dict = None, skip_empty_response: bool = False):
+    def get_list_of_items(self, batch_size, iam_credentials: dict = None, skip_empty_response: bool = False,
+                          resume: Optional[dict] = None):
         iteration = 0
+        pages = None
         try:
             self.update_rendering_context(
                 iteration=iteration,
@@ -410,23 +845,49 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
             add_if_control      = pagination_dict.get('add_if')
             result_control      = self.list_behavior.get('result')
 
+            position = (resume or {}).get('list')
+            if position:
+                iteration = self.restore_pagination_position('list', position)
+
+            if self._list_prefetch_depth:
+                # NOTE: the next pages are requested while the items of the current one are processed
+                pages = Prefetcher(
+                    self.fetch_list_pages(iteration, pagination_dict, break_early_control, add_if_control, result_control,
+                                          iam_credentials=iam_credentials, context=self.current_rendering_context()),
+                    self._list_prefetch_depth,
+                    logger=self.logger
+                )
+
             while iteration < self.MAX_ITERATIONS:
 
                 if self.is_run_canceled():
+                    self._list_canceled = True
                     break
 
-                list_response, headers, links = self.make_api_request(self.list_behavior, pagination_dict,
-                                                                      break_early_control, add_if_control,
-                                                                      iam_credentials=iam_credentials)
-
-                results = None
-                if list_response:
-                    self.update_rendering_context(
-                        list_response=list_response,
-                        list_response_headers=headers,
-                        list_response_links=links
-                    )
-                    results = self.render_to_native(result_control)
+                if pages is not None:
+                    list_response, headers, links, results = next(pages)
+                    if list_response:
+                        self.update_rendering_context(
+                            list_response=list_response,
+                            list_response_headers=headers,
+                            list_response_links=links
+                        )
+                else:
+                    list_response, headers, links = self.make_api_request(self.list_behavior, pagination_dict,
+                                                                          break_early_control, add_if_control,
+                                                                          iam_credentials=iam_credentials,
+                                                                          stream_path=self._streamed_list_path)
+
+                    results = None
+                    if isinstance(list_response, StreamedJSON):
+                        results = self.stream_list_results(list_response, headers, links, result_control)
+                    elif list_response:
+                        self.update_rendering_context(
+                            list_response=list_response,
+                            list_response_headers=headers,
+                            list_response_links=links
+                        )
+                        results = self.render_to_native(result_control)
 
                 if not results:
                     # NOTE: In the case of AWS IAM or pre and exploratory lists, we should proceed with all the chunks ignoring empty ones
@@ -442,6 +903,8 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
                 self.update_rendering_context(
                     iteration=iteration
                 )
+                yield from self.pagination_checkpoint()
+            self.forget_pagination_position('list')
 
         except self.ManagedConnectorListGetEmptyInBeginningException as exc:
             raise exc
@@ -451,6 +914,9 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
                 raise self.ManagedConnectorListGetInBeginningException(error=str(exc))
             else:
                 raise self.ManagedConnectorListGetInMiddleException(error=str(exc))
+        finally:
+            if pages is not None:
+                pages.close()
 
         if iteration >= self.MAX_ITERATIONS:
             self.logger.exception(f'Failed to fetch the list of items '
@@ -458,15 +924,48 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
             raise self.ManagedConnectorListMaxIterationException(error='Reached max iterations')
 
     def process_records_in_batches(self, result, batch_size, iam_credentials=None):
-        batch = []
-        for i, item in enumerate(result):
-            updated_result = self._do_details_and_software_calls(item, iam_credentials=iam_credentials)
-            batch.append(updated_result)
-            if (i + 1) % batch_size == 0:
+        concurrency = self.get_detail_concurrency()
+        pool = None
+        if concurrency > 1:
+            # NOTE: the items are processed by the pool at once, but come back in the order of the page
+            pool = Pool(concurrency)
+            updated_results = pool.imap(
+                functools.partial(self._do_scoped_details_and_software_calls, iam_credentials=iam_credentials,
+                                  context=self.current_rendering_context()),
+                result,
+                maxsize=max(batch_size, concurrency)
+            )
+        else:
+            updated_results = (self._do_details_and_software_calls(item, iam_credentials=iam_credentials) for item in result)
+
+        try:
+            batch = []
+            for i, updated_result in enumerate(updated_results):
+                batch.append(updated_result)
+                if (i + 1) % batch_size == 0:
+                    yield batch
+                    batch = []
+            if batch:  # Yield the last batch if it's not empty
                 yield batch
-                batch = []
-        if batch:  # Yield the last batch if it's not empty
-            yield batch
+        finally:
+            if pool is not None:
+                # NOTE: the greenlet feeding the pool with the items is not in the pool itself
+                updated_results.kill()
+                pool.kill()
+
+    def get_detail_concurrency(self) -> int:
+        """
+        The number of the items of the page fetching their details and software at once, see `detail_concurrency`
+        """
+        concurrency = int(self.settings['detail_concurrency'])
+        software_call = bool(self.software_behavior and self.software_behavior.get('enabled') and self.software_behavior.get('url'))
+        if concurrency > 1 and (self.detail_behavior or software_call):
+            return concurrency
+        return 1
+
+    def get_pool_maxsize(self) -> int:
+        # NOTE: the list call can be made while the details of the previous page are being fetched, in every account loaded at once
+        return max(super().get_pool_maxsize(), pool_maxsize_for(self.get_iam_account_concurrency() * (self.get_detail_concurrency() + 1)))
 
     def get_oomnitza_auth_for_sync(self):
         """
@@ -489,7 +988,7 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
                     list_response_item=list_response_item,
                 )
 
-                detail_response_object = self._call_endpoint_for_sub_behavior(self.detail_behavior)
+                detail_response_object = self._call_endpoint_for_sub_behavior(self.detail_behavior, iam_credentials=iam_credentials)
                 if result_control:
                     self.update_rendering_context(
                         detail_response=detail_response_object
@@ -534,6 +1033,14 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
             raise ConfigError(f'Managed connector #{self.ConnectorID}: local inputs have invalid format. Exiting')
         return inputs_from_local
 
+    def _do_scoped_details_and_software_calls(self, list_response_item, iam_credentials: Optional[dict] = None, context=None):
+        """
+        The details and software of the item fetched in its own rendering scope over the `context` of the page,
+        so the other items can be fetched at once
+        """
+        with self.rendering_scope(context):
+            return self._do_details_and_software_calls(list_response_item, iam_credentials=iam_credentials)
+
     def _do_details_and_software_calls(self, list_response_item, iam_credentials: Optional[dict] = None):
         try:
             item_details = self.get_detail_of_item(list_response_item, iam_credentials=iam_credentials)
@@ -548,17 +1055,19 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
         else:
             return item_details
 
-    def _load_list(self, batch_size, iam_credentials: dict = None, skip_empty_response: bool = False):
+    def _load_list(self, batch_size, iam_credentials: dict = None, skip_empty_response: bool = False,
+                   resume: Optional[dict] = None):
         # NOTE: There are no Exploratory list, Pre List, Details and Software Behaviours for AWS Connectors
         # So special IAM adjustments are not required
         self.logger.debug(f"Loading Managed Records with: exploratory list:{bool(self.exploratory_list_behavior)},"
                           f"pre-list: {bool(self.pre_list_behavior)}, list: {bool(self.list_behavior)}")
         if self.exploratory_list_behavior:
-            yield from self.get_exploratory_list_of_items(batch_size)
+            yield from self.get_exploratory_list_of_items(batch_size, resume=resume)
         elif self.pre_list_behavior:
-            yield from self.get_pre_list_of_items(batch_size)
+            yield from self.get_pre_list_of_items(batch_size, resume=resume)
         else:
-            yield from self.get_list_of_items(batch_size, iam_credentials=iam_credentials, skip_empty_response=skip_empty_response)
+            yield from self.get_list_of_items(batch_size, iam_credentials=iam_credentials, skip_empty_response=skip_empty_response,
+                                              resume=resume)
 
     def _load_basic_connector_list(self, connector_settings: dict):
         api_call_specification = self.build_call_specs(self.list_behavior)
@@ -589,18 +1098,19 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
     def _load_iam_list(self, batch_size):
         iteration = 0
         iam_records = 0
+        accounts = {}
 
         try:
             credential_id = self.settings['saas_authorization']['credential_id']
             iam = AWSIAM(managed_connector=self, credential_id=credential_id)
 
-            # NOTE: AWS Credentials have a short life-time, so we can't pre-generate them
-            for iam_credentials in iam.get_iam_credentials():
-                for page in self._load_list(batch_size, iam_credentials=iam_credentials, skip_empty_response=True):
-                    yield page
+            for role, page in self._load_iam_accounts(iam, batch_size, accounts):
+                yield page
 
-                    iteration += 1
-                    iam_records += len(page)
+                iteration += 1
+                iam_records += len(page)
+                accounts[role]['pages'] += 1
+                accounts[role]['records'] += len(page)
 
         except Exception as exc:
             if isinstance(exc, HTTPError) and exc.response.status_code == 403:
@@ -612,6 +1122,8 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
                 raise self.ManagedConnectorListGetInBeginningException(error=str(exc))
             else:
                 raise self.ManagedConnectorListGetInMiddleException(error=str(exc))
+        finally:
+            self.log_iam_accounts(accounts)
 
         # NOTE: We have such functionality as ManagedConnectorListGetEmptyInBeginningException exception
         # So to properly handle it we should analyze AWS IAM Responses. If we have any records there then we shouldn't
@@ -619,6 +1131,72 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
         skip_empty_response = True if iam_records > 0 else False
         yield from self._load_list(batch_size, skip_empty_response=skip_empty_response)
 
+    def _load_iam_accounts(self, iam: AWSIAM, batch_size, accounts: dict):
+        """
+        The pages of all the AWS accounts as `(role, page)`, up to `iam_account_concurrency` accounts are loaded at once
+        """
+        # NOTE: AWS Credentials have a short life-time, so we can't pre-generate them, the role is assumed right before its account is loaded
+        context = self.current_rendering_context()
+        sources = (
+            (role, functools.partial(self._load_iam_account, iam, role, batch_size, accounts, context))
+            for role in iam.get_iam_roles()
+        )
+
+        concurrency = self.get_iam_account_concurrency()
+        if concurrency <= 1:
+            for role, source in sources:
+                for page in source():
+                    yield role, page
+            return
+
+        pages = FanOut(sources, concurrency, logger=self.logger)
+        try:
+            yield from pages
+        finally:
+            pages.close()
+
+    def _load_iam_account(self, iam: AWSIAM, role: str, batch_size, accounts: dict, context=None):
+        """
+        The pages of the AWS account of the role. The account loaded at once with the others is rendered in its own scope
+        """
+        accounts[role] = {'pages': 0, 'records': 0, 'error': None, 'done': False}
+        try:
+            if self.get_iam_account_concurrency() > 1:
+                with self.rendering_scope(context):
+                    iam_credentials = iam.get_role_credentials(role)
+                    yield from self._load_list(batch_size, iam_credentials=iam_credentials, skip_empty_response=True)
+            else:
+                iam_credentials = iam.get_role_credentials(role)
+                yield from self._load_list(batch_size, iam_credentials=iam_credentials, skip_empty_response=True)
+        except Exception as exc:
+            accounts[role]['error'] = str(exc)
+            raise
+        accounts[role]['done'] = True
+
+    def get_iam_account_concurrency(self) -> int:
+        """
+        The number of the AWS accounts loaded at once, see `iam_account_concurrency`
+        """
+        if not (self.inputs_from_cloud or {}).get('iam_roles', {}).get('value'):
+            return 1
+        return max(int(self.settings['iam_account_concurrency']), 1)
+
+    def log_iam_accounts(self, accounts: dict):
+        if not accounts:
+            return
+        loaded = [role for role, stats in accounts.items() if stats['done']]
+        self.logger.info(f"Loaded {len(loaded)} of {len(accounts)} AWS account(s), "
+                         f"{sum(stats['records'] for stats in accounts.values())} record(s)")
+        for role, stats in accounts.items():
+            if stats['error']:
+                self.logger.error(f"The AWS account of the role {role} has failed after {stats['pages']} page(s) "
+                                  f"and {stats['records']} record(s): {stats['error']}")
+            elif not stats['done']:
+                self.logger.warning(f"The AWS account of the role {role} has been stopped after {stats['pages']} page(s) "
+                                    f"and {stats['records']} record(s)")
+            else:
+                self.logger.debug(f"The AWS account of the role {role}: {stats['pages']} page(s), {stats['records']} record(s)")
+
     def _use_single_mode(self):
         return self._check_iam() or self.BasicConnector
 
@@ -665,14 +1243,28 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
         self.OomnitzaConnector.settings['api_token'] = oomnitza_access_token
         self.OomnitzaConnector.authenticate()
 
+        # NOTE: the state of the previous run of the same connector must not leak into this one
+        self._checkpoint_store = None
+        self._streamed_list_path = None
+        self._list_prefetch_depth = 0
+        self._list_canceled = False
+
         try:
             iam_roles = self.inputs_from_cloud.get('iam_roles', {}).get('value')
             if iam_roles:
+                self._list_prefetch_depth = self.get_list_prefetch_depth()
                 yield from self._load_iam_list(batch_size)
             elif self.BasicConnector:
                 yield from self._load_basic_connector_list({**inputs_from_cloud, **inputs_from_local})
             else:
-                yield from self._load_list(batch_size)
+                # NOTE: the IAM and Basic connectors load the accounts and the pages differently, so they are always loaded from the beginning
+                resume = self.start_checkpoints()
+                self._streamed_list_path = self.get_streamed_list_path()
+                self._list_prefetch_depth = self.get_list_prefetch_depth()
+                yield from self._load_list(batch_size, resume=resume)
+                # NOTE: the canceled run stops in the middle of the list, the next run resumes from its last checkpoint
+                if not self._list_canceled:
+                    self.clear_checkpoint()
 
         except self.ManagedConnectorListGetInBeginningException as e:
             # this is a very beginning of the iteration, we do not have a started portion yet,
@@ -738,8 +1330,8 @@ class Connector(ConfigurableExternalAPICaller, BaseConnector):
         api_call_specification['params'].update(**auth_params)
         api_call_specification['ssl_adapter'] = ssl_adapter
 
-        response = self.perform_api_request(logger=self.logger, **api_call_specification)
-        return response_to_object(response.text)
+        response = self.perform_authorized_request(behavior, api_call_specification, auth_headers, auth_params, iam_credentials=iam_credentials)
+        return response_to_object(response_body(response))
 
     def _build_list_of_software(self, software_response):
         self.update_rendering_context(
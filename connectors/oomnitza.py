@@ -5,11 +5,14 @@ from constants import FATAL_ERROR_FLAG
 from lib.connector import AuthenticationError, BaseConnector
 from lib.error import ConfigError
 from lib.version import VERSION
-from requests import RequestException
+from requests import HTTPError, RequestException
 
 CSRF_HEADER = "X-CSRF-Token"
 CONNECTOR_SOURCE = "X-Connector-Source"
 
+# the statuses which can mean the Oomnitza instance does not accept the compressed request body
+GZIP_REJECTED_STATUSES = (400, 415, 501)
+
 
 class Connector(BaseConnector):
     Settings = {
@@ -17,7 +20,7 @@ class Connector(BaseConnector):
         'api_token': {'order': 2, 'example': "", 'default': ""},
         'username':  {'order': 3, 'example': "oomnitza-sa", 'default': ""},
         'password':  {'order': 4, 'example': "ThePassword", 'default': ""},
-
+        'upload_compression': {'order': 5, 'example': "none", 'default': "none", 'choices': ['none', 'gzip']},
     }
     # no FieldMappings for oomnitza connector
     FieldMappings = {}
@@ -25,6 +28,7 @@ class Connector(BaseConnector):
     def __init__(self, section, settings):
         """Initialize the connector."""
         self._csrf_token = None
+        self._gzip_upload_rejected = False
         super(Connector, self).__init__(section, settings)
         self.authenticate()
 
@@ -94,6 +98,22 @@ class Connector(BaseConnector):
 
     def upload(self, payload):
         url = f"{self.settings['url']}/api/v3/bulk"
+        if self.settings.get('upload_compression') == 'gzip' and not self._gzip_upload_rejected:
+            try:
+                return self.post(url, payload, gzip_json=True)
+            except HTTPError as exc:
+                if exc.response is None or exc.response.status_code not in GZIP_REJECTED_STATUSES:
+                    raise
+
+                # the same payload is accepted without the compression, so the compression is not supported
+                response = self.post(url, payload)
+                self._gzip_upload_rejected = True
+                self.logger.warning(
+                    "The compressed upload has been rejected with the status %s, the data will be sent uncompressed",
+                    exc.response.status_code
+                )
+                return response
+
         response = self.post(url, payload)
         return response
 
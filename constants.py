@@ -10,6 +10,9 @@ MODE_CLIENT_INITIATED_UPLOAD = 'upload'
 # mode which set the connector in the "managed" mode where the connector is managed by the cloud. The default mode starting from 2.2.0
 MODE_CLOUD_INITIATED_UPLOAD = 'managed'
 
+# mode which runs the connector over the data saved by the `--save-data` instead of the data loaded from the remote system.
+MODE_REPLAY = 'replay'
+
 FATAL_ERROR_FLAG = 'Fatal Error'
 
 # Boolean Constants.
@@ -2,6 +2,7 @@ import logging
 from typing import Optional
 
 from lib.httpadapters import SSLAdapter
+from lib.ratelimit import REGISTRY as RATE_LIMITERS, host_of
 from lib.renderer import Renderer
 from requests import Response, HTTPError
 
@@ -18,6 +19,8 @@ class ExternalAPICaller:
         body: Optional[str],
         raise_error: bool,
         ssl_adapter: SSLAdapter = None,
+        rate_limit: Optional[float] = None,
+        stream: bool = False,
     ) -> Response:
 
         # Set default User-Agent if wasn't overridden (+validated) in the webui
@@ -31,6 +34,10 @@ class ExternalAPICaller:
         if ssl_adapter:
             session.mount(url, ssl_adapter)
 
+        if rate_limit:
+            # the ceiling declared by the behavior, the adaptive per-host limiter of the session is applied on top of it
+            RATE_LIMITERS.ceiling(host_of(url), rate_limit).acquire()
+
         logger.info('Issuing %s %s', http_method, url)
         logger.debug('..params=[%s]', params)
 
@@ -39,7 +46,8 @@ class ExternalAPICaller:
             url=url,
             headers=headers,
             params=params,
-            data=body
+            data=body,
+            stream=stream
         )
 
         if raise_error:
@@ -79,4 +87,6 @@ class ConfigurableExternalAPICaller(ExternalAPICaller, Renderer):
 
         call_spec['headers'] = {_['key']: self.render_to_string(_['value']) for _ in http_specs['headers']}
         call_spec['params'] = {_['key']: self.render_to_string(_['value']) for _ in http_specs['params']}
+        if http_specs.get('rate_limit'):
+            call_spec['rate_limit'] = float(http_specs['rate_limit'])
         return call_spec
@@ -2,7 +2,7 @@ import json
 import uuid
 from typing import List, Iterator
 from urllib.parse import unquote
-from utils.helper_utils import response_to_object
+from utils.helper_utils import response_body, response_to_object
 
 
 class AWSIAM:
@@ -34,7 +34,7 @@ class AWSIAM:
             logger=self._managed_connector.logger, 
             **api_call_specification
         )
-        response_object = response_to_object(response.text)
+        response_object = response_to_object(response_body(response))
 
         return response_object
 
@@ -236,10 +236,18 @@ class AWSIAM:
 
         return role
 
-    def get_iam_credentials(self) -> Iterator[dict]:
+    def get_iam_roles(self) -> Iterator[str]:
+        """
+        The ARNs of the roles the user is allowed to assume, one per AWS account
+        """
         policies_list = self._list_user_policies(user=self._user)
         for policy in policies_list:
             resources = self._get_user_resources(user=self._user, policy=policy)
-            for resource in resources:
-                credentials = self._assume_role(user_policy=resource)
-                yield credentials
+            yield from resources
+
+    def get_role_credentials(self, role: str) -> dict:
+        return self._assume_role(user_policy=role)
+
+    def get_iam_credentials(self) -> Iterator[dict]:
+        for role in self.get_iam_roles():
+            yield self.get_role_credentials(role)
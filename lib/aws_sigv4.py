@@ -0,0 +1,140 @@
+import datetime
+import functools
+import hashlib
+import hmac
+import re
+from typing import Optional, Tuple
+from urllib.parse import parse_qsl, quote, urlsplit, urlunsplit
+
+from requests.utils import requote_uri
+
+ALGORITHM = 'AWS4-HMAC-SHA256'
+# the region of the global services (IAM, the global STS endpoint)
+DEFAULT_REGION = 'us-east-1'
+
+# the headers changed on the way or added after the signing, they are never signed
+UNSIGNED_HEADERS = frozenset(('authorization', 'user-agent', 'expect', 'x-amzn-trace-id', 'connection'))
+
+AWS_HOST_RE = re.compile(r'^(?P<prefix>.+?)\.amazonaws\.com(?:\.cn)?$')
+REGION_RE = re.compile(r'^[a-z]{2}(?:-gov|-iso[a-z]*)?-[a-z]+-\d+$')
+
+
+def service_and_region(host: str) -> Tuple[str, str]:
+    """
+    The service and the region of the AWS endpoint, e.g. `ec2.eu-west-1.amazonaws.com` -> ('ec2', 'eu-west-1')
+    """
+    match = AWS_HOST_RE.match(host.lower())
+    if not match:
+        raise ValueError(f'{host} is not the AWS endpoint, the service and the region of the request are unknown')
+
+    parts = match.group('prefix').split('.')
+    if len(parts) > 1 and REGION_RE.match(parts[-1]):
+        return parts[-2], parts[-1]
+    if len(parts) > 1 and parts[-1] == 'global':
+        return parts[-2], DEFAULT_REGION
+    # NOTE: the global endpoints, e.g. `sts.amazonaws.com`, `iam.amazonaws.com`
+    return parts[-1], DEFAULT_REGION
+
+
+@functools.lru_cache(maxsize=64)
+def signing_key(secret_key: str, date: str, region: str, service: str) -> bytes:
+    """
+    The key derived for the day, region and service. The same for all the requests of the role session during the day
+    """
+    key = _hmac(f'AWS4{secret_key}'.encode('utf-8'), date)
+    key = _hmac(key, region)
+    key = _hmac(key, service)
+    return _hmac(key, 'aws4_request')
+
+
+def _hmac(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode('utf-8'), hashlib.sha256).digest()
+
+
+def _quote(value: str) -> str:
+    return quote(value, safe='-_.~')
+
+
+def canonical_query_string(query: str, params: dict) -> str:
+    pairs = parse_qsl(query, keep_blank_values=True)
+    for key, value in (params or {}).items():
+        values = value if isinstance(value, (list, tuple)) else [value]
+        pairs.extend((str(key), '' if _ is None else str(_)) for _ in values)
+    return '&'.join(f'{key}={value}' for key, value in sorted((_quote(k), _quote(v)) for k, v in pairs))
+
+
+def canonical_uri(path: str, double_encode: bool = True) -> str:
+    # NOTE: the path is signed as it is sent, in the percent-encoded form, and encoded once again by all the services but S3
+    path = requote_uri(path or '/')
+    return quote(path, safe='/~') if double_encode else path
+
+
+def _payload_hash(body) -> str:
+    if body is None:
+        body = b''
+    elif isinstance(body, str):
+        body = body.encode('utf-8')
+    return hashlib.sha256(body).hexdigest()
+
+
+def sign_request(
+    api_call_specification: dict,
+    access_key: str,
+    secret_key: str,
+    session_token: Optional[str] = None,
+    region: Optional[str] = None,
+    service: Optional[str] = None,
+    now: Optional[datetime.datetime] = None,
+    double_encode_path: bool = True,
+    **kwargs
+) -> dict:
+    """
+    Sign the request with the AWS Signature Version 4 in place.
+
+    The params are moved to the query string of the url in the canonical form, so the request is sent exactly as it is signed,
+    the `X-Amz-Date`, `X-Amz-Security-Token` and `Authorization` headers are added. The region and the service are taken
+    from the host of the url unless given
+    """
+    url = urlsplit(api_call_specification['url'])
+    host = url.hostname or ''
+    if url.port and url.port != {'https': 443, 'http': 80}.get(url.scheme):
+        host = f'{host}:{url.port}'
+    if not (region and service):
+        host_service, host_region = service_and_region(url.hostname or '')
+        service = service or host_service
+        region = region or host_region
+
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+    date = amz_date[:8]
+
+    query = canonical_query_string(url.query, api_call_specification.get('params'))
+    headers = {
+        key: value for key, value in api_call_specification['headers'].items()
+        if key.lower() not in ('authorization', 'x-amz-date', 'x-amz-security-token', 'host')
+    }
+    headers['X-Amz-Date'] = amz_date
+    if session_token:
+        headers['X-Amz-Security-Token'] = session_token
+
+    signed = {key.lower(): ' '.join(str(value).split()) for key, value in headers.items() if key.lower() not in UNSIGNED_HEADERS}
+    signed['host'] = host
+    signed_headers = ';'.join(sorted(signed))
+
+    canonical_request = '\n'.join((
+        api_call_specification['http_method'].upper(),
+        canonical_uri(url.path, double_encode=double_encode_path),
+        query,
+        ''.join(f'{key}:{signed[key]}\n' for key in sorted(signed)),
+        signed_headers,
+        _payload_hash(api_call_specification.get('body')),
+    ))
+    scope = f'{date}/{region}/{service}/aws4_request'
+    string_to_sign = '\n'.join((ALGORITHM, amz_date, scope, hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()))
+    signature = hmac.new(signing_key(secret_key, date, region, service), string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    headers['Authorization'] = f'{ALGORITHM} Credential={access_key}/{scope}, SignedHeaders={signed_headers}, Signature={signature}'
+    api_call_specification['headers'] = headers
+    api_call_specification['params'] = {}
+    api_call_specification['url'] = urlunsplit((url.scheme, url.netloc, requote_uri(url.path or '/'), query, ''))
+    return api_call_specification
@@ -0,0 +1,88 @@
+import logging
+from typing import Any, Callable, List, Optional
+
+import gevent
+
+from lib import codec
+
+LOG = logging.getLogger("lib/batcher")
+
+
+class BulkBatcher:
+    """
+    Collects the converted records into the batches for the bulk upload.
+
+    The batch is flushed on whichever comes first:
+        - the number of records reaches `max_records`
+        - the serialized size of the records reaches `max_bytes`
+        - the first record of the batch has been waiting for `linger_seconds`
+
+    The batcher owns its buffer exclusively, the records are added from many sender greenlets and every
+    flush takes the whole buffer at once, so the record cannot be lost or sent twice
+    """
+
+    def __init__(
+        self,
+        flush_handler: Callable[[List[Any]], Any],
+        max_records: int = 100,
+        max_bytes: int = 0,
+        linger_seconds: float = 0,
+        serializer: Optional[Callable] = None,
+        logger=None
+    ):
+        self.flush_handler = flush_handler
+        self.max_records = max(int(max_records), 1)
+        self.max_bytes = int(max_bytes)
+        self.linger_seconds = float(linger_seconds)
+        self.serializer = serializer
+        self.logger = logger or LOG
+
+        self.flushed_batches = 0
+
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._generation = 0
+        self._linger_timer = None
+
+    def _record_size(self, record) -> int:
+        return len(codec.dumps_bytes(record, default=self.serializer))
+
+    def add(self, record):
+        if self.max_bytes:
+            self._buffer_bytes += self._record_size(record)
+        self._buffer.append(record)
+
+        if len(self._buffer) == 1 and self.linger_seconds:
+            self._linger_timer = gevent.spawn_later(self.linger_seconds, self._on_linger, self._generation)
+
+        if len(self._buffer) >= self.max_records or (self.max_bytes and self._buffer_bytes >= self.max_bytes):
+            self.flush()
+
+    def flush(self):
+        """
+        Take everything buffered so far and pass it to the upload
+        """
+        if not self._buffer:
+            return
+
+        # NOTE: there is no switch between these lines, so the buffer is taken atomically
+        batch, self._buffer, self._buffer_bytes = self._buffer, [], 0
+        self._generation += 1
+        if self._linger_timer is not None:
+            self._linger_timer.kill(block=False)
+            self._linger_timer = None
+
+        self.flushed_batches += 1
+        self.flush_handler(batch)
+
+    def close(self):
+        """
+        Flush the rest of the records
+        """
+        self.flush()
+
+    def _on_linger(self, generation):
+        if generation == self._generation and self._buffer:
+            self.logger.debug("Flushing %s record(s) after %s second(s) of waiting", len(self._buffer), self.linger_seconds)
+            self._linger_timer = None
+            self.flush()
@@ -0,0 +1,76 @@
+import logging
+import time
+from typing import Callable, Optional
+
+import gevent
+
+LOG = logging.getLogger("lib/cancellation")
+
+
+class CancellationWatcher:
+    """
+    Background greenlet periodically checking if the run has been canceled in Oomnitza.
+
+    The hot loops just read the in-memory flag instead of issuing the HTTP call for every page or batch.
+    If the check fails, the interval is doubled up to `max_interval` and restored after the next successful check.
+
+    Oomnitza does not tell when the run has been canceled, so the cancellation is known to have happened between
+    the last check finding the run still going (`running_at`) and the check finding it canceled (`detected_at`)
+    """
+
+    def __init__(self, check: Callable[[], bool], interval: float = 10, max_interval: float = 300, logger=None):
+        self.check = check
+        self.interval = float(interval)
+        self.max_interval = max(float(max_interval), self.interval)
+        self.logger = logger or LOG
+
+        self.running_at: Optional[float] = None
+        self.detected_at: Optional[float] = None
+        self.observed_at: Optional[float] = None
+        self._greenlet = None
+
+    def start(self):
+        self.running_at = time.monotonic()
+        self._greenlet = gevent.spawn(self._watch)
+        return self
+
+    def stop(self):
+        if self._greenlet is not None:
+            self._greenlet.kill(block=False)
+            self._greenlet = None
+
+    def is_canceled(self) -> bool:
+        if self.detected_at is None:
+            return False
+
+        if self.observed_at is None:
+            self.observed_at = time.monotonic()
+            self.logger.info(
+                "The run has stopped %.2f second(s) after the cancellation has been detected, "
+                "and at most %.2f second(s) after the run has been canceled in Oomnitza",
+                self.observed_at - self.detected_at,
+                self.observed_at - self.running_at
+            )
+        return True
+
+    def _watch(self):
+        delay = self.interval
+        while True:
+            # NOTE: the run has been seen going no later than the check has started
+            checked_at = time.monotonic()
+            try:
+                canceled = self.check()
+            except Exception as exc:
+                delay = min(delay * 2, self.max_interval)
+                self.logger.warning("Failed to check if the run has been canceled: %s. Next check in %s second(s)", exc, delay)
+            else:
+                delay = self.interval
+                if canceled:
+                    self.detected_at = time.monotonic()
+                    self.logger.info(
+                        "The run has been canceled in Oomnitza within the last %.2f second(s)", self.detected_at - self.running_at
+                    )
+                    return
+                self.running_at = checked_at
+
+            gevent.sleep(delay)
@@ -0,0 +1,184 @@
+import glob
+import gzip
+import io
+import logging
+import os
+import re
+import time
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from lib import codec
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+LOG = logging.getLogger("lib/capture")
+
+COMPRESSIONS = ('none', 'gzip', 'zstd')
+
+EXTENSIONS = {'none': '.ndjson', 'gzip': '.ndjson.gz', 'zstd': '.ndjson.zst'}
+
+# NOTE: the capture must not slow down the sync, the fastest levels are still several times smaller than the plain JSON
+GZIP_COMPRESSLEVEL = 1
+ZSTD_COMPRESSLEVEL = 3
+
+# the lines are collected in memory and written by the chunks of this size
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+
+def _safe_file_name(value) -> str:
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', str(value))
+
+
+class CaptureWriter:
+    """
+    Append-only NDJSON writer of the data of the single run. Every line is the JSON object
+
+        {"kind": "record", "index": <page index>, "data": <raw record loaded from the source>}
+        {"kind": "record", "index": <page index>, "error": <explicit error of the record>, "data": <raw record>}
+        {"kind": "payload", "data": <payload sent to Oomnitza>}
+
+    The file is rotated to the next part once `rotate_bytes` of the uncompressed data has been written into it,
+    the parts are named `<name>-<portion>-<timestamp>.<part>.ndjson[.gz|.zst]`.
+
+    NOTE: the writes have no gevent switch inside, so the workers of the pipeline can share the writer without the lock
+    """
+
+    def __init__(self, directory: str, name: str, portion: Optional[str] = None, compression: str = 'none',
+                 rotate_bytes: int = 0, serializer: Optional[Callable] = None, buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 logger: Optional[logging.Logger] = None):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f'Unknown compression {compression!r}, expected one of {COMPRESSIONS}')
+        self.logger = logger or LOG
+        if compression == 'zstd' and zstandard is None:
+            self.logger.warning("The zstandard package is not installed, the data will be saved gzip-compressed")
+            compression = 'gzip'
+
+        self.directory = directory
+        self.compression = compression
+        self.rotate_bytes = rotate_bytes
+        self.serializer = serializer
+        self.buffer_size = buffer_size
+        self.base_name = '-'.join(_safe_file_name(_) for _ in (name, portion or 'run', time.strftime('%Y%m%dT%H%M%S')))
+
+        self.paths = []
+        self.lines_written = 0
+        self._part = 0
+        self._raw = None
+        self._stream = None
+        self._buffer = []
+        self._buffered = 0
+        self._part_bytes = 0
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._part += 1
+        path = os.path.join(self.directory, f'{self.base_name}.{self._part:04d}{EXTENSIONS[self.compression]}')
+        self._raw = open(path, 'wb')
+        if self.compression == 'gzip':
+            self._stream = gzip.GzipFile(fileobj=self._raw, mode='wb', compresslevel=GZIP_COMPRESSLEVEL)
+        elif self.compression == 'zstd':
+            self._stream = zstandard.ZstdCompressor(level=ZSTD_COMPRESSLEVEL).stream_writer(self._raw, closefd=False)
+        else:
+            self._stream = self._raw
+        self._part_bytes = 0
+        self.paths.append(path)
+        self.logger.info("Saving the data to %s", path)
+
+    def _flush_buffer(self):
+        if self._buffer:
+            if self._stream is None:
+                self._open()
+            self._stream.write(b''.join(self._buffer))
+            self._buffer = []
+            self._buffered = 0
+
+    def _close_part(self):
+        self._flush_buffer()
+        if self._stream is not None:
+            if self._stream is not self._raw:
+                self._stream.close()
+            self._raw.close()
+        self._stream = self._raw = None
+
+    def write(self, kind: str, data, **extra):
+        line = codec.dumps_bytes({'kind': kind, **extra, 'data': data}, default=self.serializer) + b'\n'
+
+        if self.rotate_bytes and self._part_bytes and self._part_bytes + len(line) > self.rotate_bytes:
+            self._close_part()
+
+        self._buffer.append(line)
+        self._buffered += len(line)
+        self._part_bytes += len(line)
+        self.lines_written += 1
+        if self._buffered >= self.buffer_size:
+            self._flush_buffer()
+
+    def close(self):
+        self._close_part()
+        if self.lines_written:
+            self.logger.info("Saved %s line(s) of the data to %s file(s)", self.lines_written, len(self.paths))
+
+
+def capture_files(locations: Iterable[str]) -> List[str]:
+    """
+    The files of the saved data: given as is, found in the given directories or matching the glob patterns
+    """
+    paths = []
+    for location in locations:
+        if os.path.isdir(location):
+            paths.extend(sorted(glob.glob(os.path.join(location, '*.ndjson*'))))
+        elif os.path.isfile(location):
+            paths.append(location)
+        else:
+            paths.extend(sorted(glob.glob(location)))
+    return paths
+
+
+def _open_for_reading(path: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise ValueError(f'The zstandard package is required to read {path}')
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True))
+    return open(path, 'rb')
+
+
+def iter_capture(paths: Iterable[str], kind: Optional[str] = None) -> Iterator[dict]:
+    """
+    The lines of the saved data, optionally only of the given kind
+    """
+    for path in paths:
+        with _open_for_reading(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = codec.loads(line)
+                if kind is None or item.get('kind') == kind:
+                    yield item
+
+
+def iter_capture_pages(paths: Iterable[str]) -> Iterator[list]:
+    """
+    The saved source records grouped back into the pages they have been loaded by,
+    the records saved with the explicit error are given as the `(record, error)` tuples, as the source has yielded them
+    """
+    page, page_index = [], None
+    for item in iter_capture(paths, kind='record'):
+        index = item.get('index')
+        if page and index != page_index:
+            yield page
+            page = []
+        page_index = index
+        # the connectors in the single mode can yield the whole page as the single record
+        if isinstance(item['data'], list):
+            page.extend(item['data'])
+        elif item.get('error'):
+            page.append((item['data'], item['error']))
+        else:
+            page.append(item['data'])
+    if page:
+        yield page
@@ -0,0 +1,66 @@
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional, Tuple
+
+
+class SyncCheckpoint:
+    """
+    Yielded by the source between the pages of the records: once every record loaded before it has been
+    processed and accepted by Oomnitza, `commit` saves the progress of the source
+    """
+    __slots__ = ('commit',)
+
+    def __init__(self, commit: Callable[[], None]):
+        self.commit = commit
+
+
+class CheckpointStore:
+    """
+    Keeps the last checkpoint of the source of the connector in the local sqlite DB, so the next run can resume from it
+    """
+
+    def __init__(self, connector_id: str, db_name: str = 'state.db'):
+        self.connector_id = str(connector_id)
+        self.db_name = db_name
+        with self.connection_manager() as db_connection:
+            cursor = db_connection.cursor()
+            cursor.execute(
+                "create table if not exists `sync_checkpoints` "
+                "(`connector_id` text, `state` text, `saved_at` int, primary key (`connector_id`))")
+
+    @contextmanager
+    def connection_manager(self):
+        connection = sqlite3.connect(self.db_name)
+        try:
+            yield connection
+            connection.commit()
+        except:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    def load(self) -> Optional[Tuple[dict, int]]:
+        """
+        The saved state and the time it has been saved at
+        """
+        with self.connection_manager() as db_connection:
+            cursor = db_connection.cursor()
+            cursor.execute("select `state`, `saved_at` from `sync_checkpoints` where `connector_id` = ?", (self.connector_id,))
+            record = cursor.fetchone()
+            if record:
+                return json.loads(record[0]), record[1]
+            return None
+
+    def save(self, state: dict):
+        with self.connection_manager() as db_connection:
+            cursor = db_connection.cursor()
+            cursor.execute("replace into `sync_checkpoints` (`connector_id`, `state`, `saved_at`) values (?,?,?)",
+                           (self.connector_id, json.dumps(state, default=str), int(time.time())))
+
+    def clear(self):
+        with self.connection_manager() as db_connection:
+            cursor = db_connection.cursor()
+            cursor.execute("delete from `sync_checkpoints` where `connector_id` = ?", (self.connector_id,))
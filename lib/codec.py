@@ -0,0 +1,146 @@
+import json
+import logging
+import re
+from typing import Any, Callable, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+LOG = logging.getLogger("lib/codec")
+
+JSON_CODECS = ('auto', 'orjson', 'json')
+
+# the integers orjson parses as the floats: beyond the unsigned 64-bit range or below the signed one, so at least 19 digits
+WIDE_INTEGER_DIGITS = 19
+WIDE_INTEGER_RE = re.compile(r'-?[0-9]{19,}')
+WIDE_INTEGER_BYTES_RE = re.compile(rb'-?[0-9]{19,}')
+UINT64_MAX = 2 ** 64 - 1
+INT64_MIN = -2 ** 63
+
+# NOTE: every digit becomes `0`, so the long run of the digits is found by the plain substring search, much faster than the regex
+_DIGITS_TO_ZERO = str.maketrans('123456789', '0' * 9)
+_DIGITS_TO_ZERO_BYTES = bytes.maketrans(b'123456789', b'0' * 9)
+
+
+def has_wide_integer(data: Union[str, bytes, bytearray, memoryview]) -> bool:
+    """
+    True if the JSON may have the integer orjson can not parse exactly. The digits within the strings and the fractions
+    are matched as well, such JSON is just parsed by the standard codec
+    """
+    if isinstance(data, str):
+        if '0' * WIDE_INTEGER_DIGITS not in data.translate(_DIGITS_TO_ZERO):
+            return False
+        matches = WIDE_INTEGER_RE.finditer(data)
+    else:
+        data = bytes(data) if isinstance(data, memoryview) else data
+        if b'0' * WIDE_INTEGER_DIGITS not in data.translate(_DIGITS_TO_ZERO_BYTES):
+            return False
+        matches = WIDE_INTEGER_BYTES_RE.finditer(data)
+
+    for match in matches:
+        value = int(match.group())
+        if value > UINT64_MAX or value < INT64_MIN:
+            return True
+    return False
+
+
+class StdlibJSONCodec:
+    """
+    The JSON codec of the standard library, always available
+    """
+    name = 'json'
+
+    def dumps(self, value: Any, default: Optional[Callable] = None, indent: bool = False) -> str:
+        if indent:
+            return json.dumps(value, default=default, ensure_ascii=False, indent=2)
+        return json.dumps(value, default=default, ensure_ascii=False, separators=(',', ':'))
+
+    def dumps_bytes(self, value: Any, default: Optional[Callable] = None, indent: bool = False) -> bytes:
+        return self.dumps(value, default=default, indent=indent).encode('utf-8')
+
+    def loads(self, data: Union[str, bytes, bytearray, memoryview]) -> Any:
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+
+class OrjsonCodec(StdlibJSONCodec):
+    """
+    The native orjson codec. The output is the same compact UTF-8 JSON as of the standard codec with one exception:
+        - NaN and Infinity are written as `null`, the standard codec writes them as the invalid JSON
+
+    The JSON orjson can not parse exactly is parsed by the standard codec: the integers beyond the 64-bit range
+    would become the floats, NaN, Infinity and the numbers beyond the double range are rejected by orjson
+
+    NOTE: the dates are passed to `default` as with the standard codec, so their format is controlled by the connector
+    """
+    name = 'orjson'
+
+    def __init__(self):
+        self._options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(self, value: Any, default: Optional[Callable] = None, indent: bool = False) -> str:
+        return self.dumps_bytes(value, default=default, indent=indent).decode('utf-8')
+
+    def dumps_bytes(self, value: Any, default: Optional[Callable] = None, indent: bool = False) -> bytes:
+        options = self._options | orjson.OPT_INDENT_2 if indent else self._options
+        try:
+            return orjson.dumps(value, default=default, option=options)
+        except orjson.JSONEncodeError as e:
+            # NOTE: the only thing the standard codec can write and orjson can not is the integer beyond 64 bits
+            if 'Integer exceeds' not in str(e):
+                raise
+            return StdlibJSONCodec.dumps(self, value, default=default, indent=indent).encode('utf-8')
+
+    def loads(self, data: Union[str, bytes, bytearray, memoryview]) -> Any:
+        if has_wide_integer(data):
+            return StdlibJSONCodec.loads(self, data)
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return StdlibJSONCodec.loads(self, data)
+
+
+_codec = None
+
+
+def set_codec(name: str = 'auto'):
+    """
+    Choose the codec used by the connector: `orjson` if it is installed and `json` otherwise for `auto`
+    """
+    global _codec
+    if name not in JSON_CODECS:
+        raise ValueError(f'Unknown JSON codec {name!r}, expected one of {", ".join(JSON_CODECS)}')
+
+    if name == 'json' or orjson is None:
+        if name == 'orjson':
+            LOG.warning("The orjson package is not installed, the standard JSON codec is used")
+        _codec = StdlibJSONCodec()
+    else:
+        _codec = OrjsonCodec()
+
+
+def get_codec() -> StdlibJSONCodec:
+    if _codec is None:
+        set_codec()
+    return _codec
+
+
+def dumps(value: Any, default: Optional[Callable] = None, indent: bool = False) -> str:
+    return get_codec().dumps(value, default=default, indent=indent)
+
+
+def dumps_bytes(value: Any, default: Optional[Callable] = None, indent: bool = False) -> bytes:
+    """
+    The UTF-8 encoded JSON, ready to be sent as the request body
+    """
+    return get_codec().dumps_bytes(value, default=default, indent=indent)
+
+
+def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+    """
+    Parse the JSON given as the text or directly as the bytes of the response body
+    """
+    return get_codec().loads(data)
@@ -0,0 +1,37 @@
+import zlib
+from typing import Callable, Iterator, Optional
+
+from lib import codec
+
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def iter_json_chunks(payload: dict, default: Optional[Callable] = None, stream_key: str = 'records') -> Iterator[bytes]:
+    """
+    Serialize the payload piece by piece, the list under `stream_key` is serialized record by record,
+    so the whole JSON document is never built as a single string
+    """
+    if not isinstance(payload.get(stream_key), list):
+        yield codec.dumps_bytes(payload, default=default)
+        return
+
+    envelope = {k: v for k, v in payload.items() if k != stream_key}
+    # NOTE: open the envelope object and continue it with the streamed list
+    yield codec.dumps_bytes(envelope, default=default)[:-1]
+    yield b',' if envelope else b''
+    yield codec.dumps_bytes(stream_key) + b':['
+    for i, record in enumerate(payload[stream_key]):
+        if i:
+            yield b','
+        yield codec.dumps_bytes(record, default=default)
+    yield b']}'
+
+
+def gzip_json(payload: dict, default: Optional[Callable] = None, stream_key: str = 'records', level: int = 6) -> bytes:
+    """
+    Serialize the payload to JSON directly into the gzip stream
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+    chunks = [compressor.compress(_) for _ in iter_json_chunks(payload, default=default, stream_key=stream_key)]
+    chunks.append(compressor.flush())
+    return b''.join(chunks)
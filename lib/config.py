@@ -200,7 +200,10 @@ def init_connector_from_configuration(connector_name, configuration, cmdline_arg
 
             cfg["__testmode__"] = cmdline_args.testmode
             cfg["__save_data__"] = cmdline_args.save_data
+            cfg["__save_data_compression__"] = getattr(cmdline_args, 'save_data_compression', 'none')
+            cfg["__save_data_rotate_mb__"] = getattr(cmdline_args, 'save_data_rotate_mb', 0)
             cfg["__ignore_cloud_maintenance__"] = cmdline_args.ignore_cloud_maintenance
+            cfg["__profile_dir__"] = cmdline_args.profile_dir if getattr(cmdline_args, 'profile', False) else None
             try:
                 cfg["__workers__"] = cmdline_args.workers
             except:
@@ -314,6 +317,8 @@ def parse_connector_config_for_cloud_initiated(connector_name, extra_cfg, args):
         # ensure the instance of the connector class initiated for the cloud based connector has its own copy of OomnitzaConnector and not sharing it
         # among other threads
         initialized_connector_configuration['__connector__'].OomnitzaConnector = deepcopy(initialized_connector_configuration['__connector__'].OomnitzaConnector)
+        # the copied session would get its own cold connection pools, the new one mounts the shared adapters instead
+        initialized_connector_configuration['__connector__'].OomnitzaConnector._session = None
         return initialized_connector_configuration
     except IOError:
         raise ConfigError("Could not open config file.")
@@ -1,27 +1,40 @@
 import copy
+import functools
 import json
 import logging
 import os
 import os.path
+import pickle
+import sqlite3
 from datetime import date, datetime
 from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 from uuid import uuid4
 
-import gevent
 import requests
-from gevent.pool import Pool
-from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
 from urllib3.exceptions import InsecureRequestWarning
 
 from constants import FATAL_ERROR_FLAG, TRUE_VALUES, ConfigFieldType
+from lib import codec
+from lib.batcher import BulkBatcher
+from lib.cancellation import CancellationWatcher
+from lib.capture import CaptureWriter, iter_capture_pages
+from lib.checkpoints import SyncCheckpoint
+from lib.compression import gzip_json as gzip_json_payload
+from lib.conversion_pool import FAILED, REJECTED, ConversionError, ConversionPool
 from lib.converters import Converter
+from lib.delta_sync import DeltaTracker, FingerprintStore
 from lib.error import AuthenticationError, ConfigError
 from lib.filter import DynamicException
-from lib.httpadapters import AdapterMap, retries
+from lib.httpadapters import SHARED_ADAPTERS, AdapterMap, pool_maxsize_for
 from lib.logger import ContextLoggingAdapter
+from lib.mapping_plan import FieldPlan, MappingPlan, build_field_template, parse_converter_spec
+from lib.metrics import RECORDS, STAGE_SECONDS, TEMPLATE_CACHE_LOOKUPS
+from lib.pipeline import ChunkedRecordPipeline, RecordPipeline
+from lib.profiler import profile_run
 from lib.renderer import _RawValue
 from lib.strongbox import Strongbox, StrongboxBackend
+from lib.uploader import Uploader
 from lib.version import VERSION
 from utils.data import get_field_value
 from utils.distutils import strtobool
@@ -50,7 +63,8 @@ def run_connector(connector_cfg, options):
             return
 
         try:
-            connector_instance.determine_processing_mode(connector_name, options)
+            with profile_run(connector_cfg.get('__profile_dir__'), connector_name, connector_instance.portion):
+                connector_instance.determine_processing_mode(connector_name, options)
         except ConfigError as exp:
             LOG.error(exp)
         except requests.HTTPError:
@@ -206,9 +220,24 @@ class BaseConnector(object):
         'user_pem_file': {'order': 13, 'default': ""},
         'connector_bulk_mode': {'order': 14, 'default': "False"},
         'test_run': {'order': 15, 'default': "False"},
-        'is_custom': {'order': 16, 'default': "False"}
+        'is_custom': {'order': 16, 'default': "False"},
+        'bulk_batch_size': {'order': 17, 'default': "100"},
+        'bulk_batch_max_bytes': {'order': 18, 'default': "2097152"},
+        'bulk_batch_linger': {'order': 19, 'default': "10"},
+        'upload_workers': {'order': 20, 'default': "2"},
+        'cancellation_check_interval': {'order': 21, 'default': "10"},
+        'delta_sync': {'order': 22, 'default': "False"},
+        'delta_sync_full_every': {'order': 23, 'default': "7"},
+        'conversion_processes': {'order': 24, 'default': "0"},
+        'conversion_chunk_size': {'order': 25, 'default': "50"},
     }
 
+    def get_common_setting(self, key: str) -> str:
+        """
+        Value of the common setting, the defaults of the common settings are not copied into the `settings`
+        """
+        return self.settings.get(key) or self.CommonSettings[key].get('default', '')
+
     def get_connector_name(self):
         """ Return connector name to be used for logging. """
         return self.connector_name
@@ -237,10 +266,17 @@ class BaseConnector(object):
         return str(uuid4())
 
     def __init__(self, section, settings):
-        self.payload_buffer = []
         self.test_run_batch_size = 10
         self.batch_size = 100
         self.batch_send_size = 100
+        self._pipeline = None
+        self._batcher = None
+        self._uploader = None
+        self._capture = None
+        self._delta = None
+        self._conversion_pool = None
+        self._extra_input_values = None
+        self._cancellation_watcher = None
         self.processed_records_counter = 0.
         self.sent_records_counter = 0.
         self.section = section
@@ -252,6 +288,7 @@ class BaseConnector(object):
         self._session = None
         self.portion = self.gen_portion_id()
         self._cached_credential_details = None
+        self._mapping_plan = None
 
         self.context_id = ContextLoggingAdapter.generate_unique_context_id()
 
@@ -446,17 +483,30 @@ class BaseConnector(object):
                 self._session.cert = user_pem_file
             if protocol:
                 self.logger.info("Forcing SSL Protocol to: %s", protocol)
-                if protocol.lower() in AdapterMap:
-                    self._session.mount("https://", AdapterMap[protocol.lower()](max_retries=retries))
-                else:
+                if protocol.lower() not in AdapterMap:
                     raise RuntimeError("Invalid value for ssl_protocol: %r. Valid values are %r.",
                                        protocol, list(set(AdapterMap.keys())))
-            else:
-                self._session.mount("https://", HTTPAdapter(max_retries=retries))
 
-            self._session.mount("http://", HTTPAdapter(max_retries=retries))
+            # NOTE: the adapters are shared across the process, so the keep-alive connections outlive the session
+            pool_maxsize = self.get_pool_maxsize()
+            self._session.mount("https://", SHARED_ADAPTERS.get(
+                'https',
+                verify=self._session.verify,
+                cert=user_pem_file,
+                protocol=protocol,
+                pool_maxsize=pool_maxsize
+            ))
+            self._session.mount("http://", SHARED_ADAPTERS.get('http', pool_maxsize=pool_maxsize))
         return self._session
 
+    def get_pool_maxsize(self) -> int:
+        """
+        The number of the connections kept alive per origin, enough for every worker and upload worker to have its own
+        """
+        workers = self.settings.get('__workers__') or 0
+        upload_workers = int(self.get_common_setting('upload_workers')) if workers else 0
+        return pool_maxsize_for(workers + upload_workers)
+
     def get(self, url, headers=None, auth=None):
         """
         Performs a HTTP GET against the passed URL using either the standard or passed headers
@@ -493,6 +543,7 @@ class BaseConnector(object):
             headers: Dict[str, Any] = None,
             auth: Union[Tuple, Callable] = None,
             post_as_json: bool = True,
+            gzip_json: bool = False,
     ):
         """
         Performs a HTTP POST against the passed URL.
@@ -502,14 +553,18 @@ class BaseConnector(object):
         :param headers: optional headers to override the headers from defaults
         :param auth: Auth tuple or callable to enable Basic/Digest/Custom HTTP Auth.
         :param post_as_json: True to ensure dates in the json appear correctly.
+        :param gzip_json: True to serialize the payload directly into the gzip-compressed body
         :return: the response object
         """
         session = self._get_session()
         headers = headers or self.get_headers()
         auth = auth or self.get_auth()
 
-        if post_as_json:
-            data = json.dumps(data, default=self.json_serializer)
+        if gzip_json:
+            data = gzip_json_payload(data, default=self.json_serializer)
+            headers = {**headers, 'Content-Encoding': 'gzip'}
+        elif post_as_json:
+            data = codec.dumps_bytes(data, default=self.json_serializer)
 
         if self.is_oomnitza_connector():
             # Reduce logging verbosity
@@ -565,20 +620,18 @@ class BaseConnector(object):
             self.send_to_oomnitza(rec, error=explicit_error)
             return
 
-        if not (self.__filter__ is None or self.__filter__(rec)):
+        if not (self.__filter__ is None or self.passes_filter(rec)):
             self.logger.info("Skipping record because it did not pass the filter.")
             return
 
         try:
-            converted_record = self.convert_record(rec)
+            with self.observe_stage('convert'):
+                converted_record = self.convert_record(rec)
         except self.ManagedConnectorRecordConversionException as e:
             # we have failed to convert the record - issue with the mapping?
             self.send_to_oomnitza(rec, error=str(e))
         else:
-            if not converted_record:
-                self.logger.info("Skipping record because it has not been converted properly")
-                return
-            self.send_to_oomnitza_bulk(converted_record)
+            self.deliver_converted_record(converted_record, self.send_to_oomnitza_bulk)
 
     def sender(self, rec, explicit_error):
         """
@@ -588,26 +641,133 @@ class BaseConnector(object):
             self.send_to_oomnitza(rec, error=explicit_error)
             return
 
-        if not (self.__filter__ is None or self.__filter__(rec)):
+        if not (self.__filter__ is None or self.passes_filter(rec)):
             self.logger.info("Skipping record because it did not pass the filter")
             return
 
         try:
-            converted_record = self.convert_record(rec)
+            with self.observe_stage('convert'):
+                converted_record = self.convert_record(rec)
         except self.ManagedConnectorRecordConversionException as e:
             # we have failed to convert the record - issue with the mapping?
             self.send_to_oomnitza(rec, error=str(e))
         else:
-            if not converted_record:
-                self.logger.info("Skipping record because it has not been converted properly")
-                return
-            self.send_to_oomnitza(converted_record)
+            self.deliver_converted_record(converted_record, self.send_to_oomnitza)
+
+    def sender_chunk(self, chunk, send):
+        """
+        Same as the `sender`, but the whole chunk of the records is converted at once by the conversion processes
+        """
+        records = []
+        for rec, explicit_error in chunk:
+            if explicit_error:
+                self.send_to_oomnitza(rec, error=explicit_error)
+            elif self.__filter__ is None or self.passes_filter(rec):
+                records.append(rec)
+            else:
+                self.logger.info("Skipping record because it did not pass the filter")
+
+        if not records:
+            return
+
+        with self.observe_stage('convert'):
+            results = self._conversion_pool.convert(records)
+
+        failures = []
+        for rec, (outcome, value) in zip(records, results):
+            if outcome == REJECTED:
+                # we have failed to convert the record - issue with the mapping?
+                self.send_to_oomnitza(rec, error=value)
+            elif outcome == FAILED:
+                failures.append(value)
+            else:
+                self.deliver_converted_record(value, send)
+
+        if failures:
+            raise ConversionError(f"Failed to convert {len(failures)} of {len(records)} record(s), the first error is:\n{failures[0]}")
+
+    def deliver_converted_record(self, converted_record, send):
+        if not converted_record:
+            self.logger.info("Skipping record because it has not been converted properly")
+            return
+        if self.is_unchanged_record(converted_record):
+            return
+        send(converted_record)
+
+    def is_unchanged_record(self, converted_record) -> bool:
+        """
+        With the `delta_sync` enabled the records not changed since the last run are not sent
+        """
+        if self._delta is not None and self._delta.is_unchanged(converted_record):
+            RECORDS.inc(result='unchanged', **self.metric_labels)
+            return True
+        return False
+
+    def passes_filter(self, rec) -> bool:
+        with self.observe_stage('filter'):
+            return self.__filter__(rec)
+
+    @property
+    def metric_labels(self) -> Dict[str, str]:
+        labels = self.__dict__.get('_metric_labels')
+        if labels is None:
+            labels = self._metric_labels = {
+                'connector': self.settings.get('__name__') or self.section,
+                'connector_id': str(self.ConnectorID or ''),
+            }
+        return labels
+
+    def observe_stage(self, stage: str):
+        """
+        Times the `with` block as the given stage of the sync
+        """
+        return STAGE_SECONDS.time(stage=stage, **self.metric_labels)
+
+    def load_source_records(self, options):
+        """
+        The records of the run: loaded from the source or, in the `replay` mode, read from the data saved by the `--save-data`
+        """
+        replay_from = self.settings.get('__replay_from__')
+        if replay_from:
+            return iter_capture_pages(replay_from)
+        return self._load_records(options)
+
+    def iter_source_records(self, records):
+        """
+        Times every fetch of the next portion of the data from the source
+        """
+        iterator = iter(records)
+        while True:
+            with self.observe_stage('source'):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            self.observe_render_time()
+            yield item
+
+    def observe_render_time(self):
+        """
+        Observe the time the templates have been rendered since the previous observation as the `render` stage.
+
+        NOTE: it is observed once per portion of the source rather than once per template, and the same time is counted
+        by the stage the rendering happens in as well (source, fetch_*, convert), so the stages must not be summed up
+        """
+        take_render_seconds = getattr(self, 'take_render_seconds', None)
+        if take_render_seconds is None:
+            return
+        seconds = take_render_seconds()
+        if seconds:
+            STAGE_SECONDS.observe(seconds, stage='render', **self.metric_labels)
 
     def is_authorized(self):
         """
         Check if authorized
         :return:
         """
+        if self.settings.get('__replay_from__'):
+            # the source is not called when the saved data is replayed
+            return True
         try:
             self.authenticate()
         except AuthenticationError as exp:
@@ -629,34 +789,220 @@ class BaseConnector(object):
         return self.is_managed and hasattr(self, 'folder_path')
 
     def finalize_processed_portion(self):
-        self.OomnitzaConnector.finalize_portion(self.portion)
+        # NOTE: the portion must never be finalized before all its data is accepted by Oomnitza,
+        #  it is also finalized from the source in the middle of the run, with the records still in flight
+        self.wait_for_loaded_records()
+        with self.observe_stage('finalize'):
+            self.OomnitzaConnector.finalize_portion(self.portion)
 
-    def create_connection_pool(self):
-        pool_size = self.settings['__workers__']
-        if pool_size == 0:
-            # do not use gevent at all, for example for the testing
-            connection_pool = None
-        else:
-            connection_pool = Pool(size=pool_size)
-        return connection_pool
+    def reach_checkpoint(self, checkpoint: SyncCheckpoint, pipeline: RecordPipeline):
+        """
+        Wait until every record loaded so far is accepted by Oomnitza and let the source save its progress
+        """
+        self.wait_for_loaded_records()
+
+        failed = pipeline.failed + (self._uploader.failed if self._uploader is not None else 0)
+        if failed:
+            # NOTE: the next run has to load the lost records again, so the progress is not saved anymore
+            self.logger.warning("%s record(s) or upload(s) have failed, the checkpoint is not saved", failed)
+            return
+        checkpoint.commit()
+
+    def create_uploader(self) -> Uploader:
+        # NOTE: with zero workers gevent is not used, so the data is uploaded synchronously
+        concurrency = int(self.get_common_setting('upload_workers')) if self.settings['__workers__'] else 0
+        return Uploader(self.OomnitzaConnector.upload, concurrency=concurrency, metric_labels=self.metric_labels, logger=self.logger)
+
+    def wait_for_uploads(self):
+        if self._uploader is not None:
+            self._uploader.wait()
+
+    def wait_for_loaded_records(self):
+        """
+        Wait until every record loaded so far is converted, the partial bulk batch is sent and all the uploads are done
+        """
+        if self._pipeline is not None:
+            self._pipeline.drain()
+        if self._batcher is not None:
+            self._batcher.flush()
+        self.wait_for_uploads()
+
+    def log_connection_stats(self, since: Dict[str, int]):
+        # NOTE: the pools are shared by the whole process, so the concurrent runs are counted as well
+        stats = SHARED_ADAPTERS.connection_stats()
+        opened = max(stats['opened'] - since['opened'], 0)
+        requests_sent = stats['requests'] - since['requests']
+        self.logger.info("HTTP connections: %s opened, %s reused", opened, max(requests_sent - opened, 0))
+
+    def template_cache_info(self) -> Dict[str, int]:
+        # NOTE: only the managed connectors render the templates and have the template cache
+        template_cache = getattr(self, 'template_cache', None)
+        return template_cache.info() if template_cache is not None else {}
+
+    def log_template_cache_stats(self, since: Dict[str, int]):
+        info = self.template_cache_info()
+        if not info:
+            return
+        hits = info['hits'] - since.get('hits', 0)
+        misses = info['misses'] - since.get('misses', 0)
+        TEMPLATE_CACHE_LOOKUPS.inc(hits, result='hit', **self.metric_labels)
+        TEMPLATE_CACHE_LOOKUPS.inc(misses, result='miss', **self.metric_labels)
+        self.logger.info("Template cache: %s hit(s), %s miss(es), %s of %s template(s) cached", hits, misses, info['size'], info['maxsize'])
+
+    def get_sync_fields(self) -> List[str]:
+        return list(filter(bool, map(str.strip, self.settings.get('sync_field', '').split(','))))
+
+    def create_delta_tracker(self) -> Optional[DeltaTracker]:
+        if self.get_common_setting('delta_sync') not in TRUE_VALUES:
+            return None
+        sync_fields = self.get_sync_fields()
+        if not sync_fields:
+            self.logger.warning("The delta sync requires the `sync_field` to identify the records, all the records will be sent")
+            return None
+        return DeltaTracker(
+            FingerprintStore(self.section),
+            sync_fields,
+            full_every=int(self.get_common_setting('delta_sync_full_every') or 0),
+            serializer=self.json_serializer,
+            logger=self.logger
+        )
+
+    def save_delta_tracker(self):
+        if self._delta is not None:
+            try:
+                self._delta.save()
+            except sqlite3.Error:
+                self.logger.exception("Error saving the delta sync state.")
+            self._delta = None
+
+    def create_bulk_batcher(self) -> BulkBatcher:
+        workers = self.settings['__workers__']
+        return BulkBatcher(
+            self.upload_bulk_batch,
+            max_records=int(self.settings.get('bulk_batch_size') or self.batch_send_size),
+            max_bytes=int(self.get_common_setting('bulk_batch_max_bytes')),
+            # NOTE: with zero workers gevent is not used, so the batches are sent synchronously and only by the size
+            linger_seconds=float(self.get_common_setting('bulk_batch_linger')) if workers else 0,
+            serializer=self.json_serializer,
+            logger=self.logger
+        )
+
+    def create_record_pipeline(self, handler, send) -> RecordPipeline:
+        # NOTE: with zero workers gevent is not used at all, for example for the testing
+        workers = self.settings['__workers__']
+        if self._conversion_pool is not None:
+            return ChunkedRecordPipeline(
+                functools.partial(self.sender_chunk, send=send),
+                workers=workers,
+                chunk_size=int(self.get_common_setting('conversion_chunk_size')),
+                logger=self.logger
+            ).start()
+        return RecordPipeline(handler, workers=workers, logger=self.logger).start()
+
+    def get_conversion_state(self) -> dict:
+        """
+        The part of the connector the conversion process needs to convert the records the same way, must be picklable
+        """
+        extra_input_values = {}
+        if self.is_managed:
+            # NOTE: the inputs are the same for all the records, but can require the API calls, so resolve them here
+            for specs in self.field_mappings.values():
+                if specs.get('extra_input'):
+                    key = json.dumps(specs['extra_input'], sort_keys=True)
+                    extra_input_values[key] = self.get_extra_input_value(specs['extra_input'])
+
+        return {
+            'section': self.section,
+            'settings': self.settings,
+            'field_mappings': self.field_mappings,
+            'connector_name': self.connector_name,
+            'context_id': self.context_id,
+            'ConnectorID': self.ConnectorID,
+            'MappingName': self.MappingName,
+            '_mapping_plan': None,
+            '_extra_input_values': extra_input_values,
+        }
+
+    @classmethod
+    def create_converter(cls, state: dict) -> 'BaseConnector':
+        """
+        Recreate the connector from the `get_conversion_state` in the conversion process, only to convert the records
+        """
+        converter = cls.__new__(cls)
+        converter.__dict__.update(state)
+        return converter
+
+    def create_conversion_pool(self) -> Optional[ConversionPool]:
+        processes = int(self.get_common_setting('conversion_processes'))
+        if processes <= 0:
+            return None
+
+        if type(self).convert_record is not BaseConnector.convert_record:
+            self.logger.info("The connector has its own conversion of the records, the conversion processes are not used")
+            return None
+
+        try:
+            return ConversionPool(processes, type(self), self.get_conversion_state(), logger=self.logger)
+        except (pickle.PicklingError, TypeError, AttributeError) as exc:
+            self.logger.warning("The mapping can not be passed to the conversion processes, the records are converted in-process: %s", exc)
+            return None
+
+    def close_conversion_pool(self):
+        if self._conversion_pool is not None:
+            self._conversion_pool.close()
+            self._conversion_pool = None
 
     def make_data_dir(self, path=SAVED_DATA_PATH):
         os.makedirs(path, exist_ok=True)
 
-    def save_data_locally(self, record, index, path=SAVED_DATA_PATH):
-        filename = f"{path}/{index}.json"
-        self.save_to_json_file(record, filename, path)
+    def open_capture(self, path=SAVED_DATA_PATH) -> CaptureWriter:
+        """
+        The writer of the data saved by the `--save-data`, one per run
+        """
+        rotate_mb = self.settings.get('__save_data_rotate_mb__') or 0
+        return CaptureWriter(
+            path,
+            self.settings.get('__name__') or self.section,
+            portion=self.portion,
+            compression=self.settings.get('__save_data_compression__') or 'none',
+            rotate_bytes=int(float(rotate_mb) * 1024 * 1024),
+            serializer=self.json_serializer,
+            logger=self.logger
+        )
+
+    def close_capture(self):
+        if self._capture is not None:
+            try:
+                self._capture.close()
+            except OSError:
+                self.logger.exception("Error saving data.")
+            self._capture = None
+
+    def save_data_locally(self, record, index, error=None, path=SAVED_DATA_PATH):
+        if self._capture is not None:
+            # NOTE: the explicit error is saved with the record, so the replay gets the same `(record, error)`;
+            #  the page of the single mode connector can hold such tuples as well, its records are saved one by one
+            for item in (record if isinstance(record, list) else [(record, error)]):
+                item, item_error = item if isinstance(item, tuple) and len(item) == 2 else (item, None)
+                self._capture.write('record', item, index=index, **({'error': item_error} if item_error else {}))
+        else:
+            # outside of the sync, for example the single test response of the managed connector
+            filename = f"{path}/{index}.json"
+            self.save_to_json_file(record, filename, path)
 
     def _save_processed_payload_locally(self, payload, path=SAVED_DATA_PATH):
-        filename = "{0}/oom.payload{1:0>3}.json".format(path, self.send_counter)
-        self.save_to_json_file(payload, filename, path)
-        self.send_counter += 1
+        if self._capture is not None:
+            self._capture.write('payload', payload)
+        else:
+            filename = "{0}/oom.payload{1:0>3}.json".format(path, self.send_counter)
+            self.save_to_json_file(payload, filename, path)
+            self.send_counter += 1
 
     def save_to_json_file(self, data, filename, path=SAVED_DATA_PATH):
         self.make_data_dir(path)
-        with open(filename, "w") as save_file:
+        with open(filename, "wb") as save_file:
             self.logger.info("Saving payload data to %s.", filename)
-            json.dump(data, save_file, indent=2, default=self.json_serializer)
+            save_file.write(codec.dumps_bytes(data, default=self.json_serializer, indent=True))
 
     def determine_processing_mode(self, connector_name, options):
 
@@ -668,12 +1014,37 @@ class BaseConnector(object):
             self.logger.info(f"{connector_name} Connector running in Mode: Bulk")
 
     def is_run_canceled(self) -> bool:
+        """
+        Cheap check for the hot loops, the actual state of the portion is polled by the cancellation watcher
+        """
+        if self._cancellation_watcher is not None:
+            return self._cancellation_watcher.is_canceled()
+
+        return self.check_run_canceled_in_oomnitza()
+
+    def check_run_canceled_in_oomnitza(self) -> bool:
         portion_info = self.OomnitzaConnector.get_portion_info(correlation_id=self.portion)
         if portion_info and portion_info.get('canceled') is True:
             return True
 
         return False
 
+    def start_cancellation_watcher(self):
+        # NOTE: with zero workers gevent is not used, so the portion is checked directly
+        if not self.settings['__workers__']:
+            return
+
+        self._cancellation_watcher = CancellationWatcher(
+            self.check_run_canceled_in_oomnitza,
+            interval=float(self.get_common_setting('cancellation_check_interval')),
+            logger=self.logger
+        ).start()
+
+    def stop_cancellation_watcher(self):
+        if self._cancellation_watcher is not None:
+            self._cancellation_watcher.stop()
+            self._cancellation_watcher = None
+
     def perform_sync_bulk_paginated(self, options):
         """
         This method controls the sync process. Called from the command line script to do the work.
@@ -695,20 +1066,31 @@ class BaseConnector(object):
             self.save_test_response_to_file()
             return True
 
+        # the mapping is compiled again for every run
+        self._mapping_plan = None
+
+        self._uploader = self.create_uploader()
+        self._capture = self.open_capture() if save_data else None
+        # NOTE: the test runs do not send the data, so they must not affect the next runs
+        self._delta = self.create_delta_tracker() if not is_test_run else None
+        connection_stats = SHARED_ADAPTERS.connection_stats()
+        template_cache_stats = self.template_cache_info()
+        self._batcher = self.create_bulk_batcher()
+        self._conversion_pool = self.create_conversion_pool() if not is_test_run else None
+        pipeline = self.create_record_pipeline(self.sender_bulk, self.send_to_oomnitza_bulk)
+        self._pipeline = pipeline
+        self.start_cancellation_watcher()
         try:
-            connection_pool = self.create_connection_pool()
-            tasks = []
-
             test_run_complete = False
 
             options["batch_size"] = self.batch_size
 
-            for index, item in enumerate(self._load_records(options)):
-                batch = item
+            for index, item in enumerate(self.iter_source_records(self.load_source_records(options))):
+                if isinstance(item, SyncCheckpoint):
+                    self.reach_checkpoint(item, pipeline)
+                    continue
 
-                batch_length = len(batch)
-                if batch_length < self.batch_send_size:
-                    self.batch_send_size = batch_length
+                batch = item
 
                 explicit_error = None
 
@@ -727,7 +1109,7 @@ class BaseConnector(object):
                         record, explicit_error = record
 
                     if save_data:
-                        self.save_data_locally(record, index)
+                        self.save_data_locally(record, index, error=explicit_error)
 
                     if self.processed_records_counter < limit_records:
                         if not self.keep_going:
@@ -735,15 +1117,10 @@ class BaseConnector(object):
 
                         # Increase records counter
                         self.processed_records_counter += 1
+                        RECORDS.inc(result='loaded', **self.metric_labels)
 
-                        if self.processed_records_counter == batch_length:
-                            if batch_length % self.batch_size:
-                                self.batch_send_size = batch_length % self.batch_size
-
-                        if connection_pool:
-                            tasks.append(gevent.spawn(self.sender_bulk, record, explicit_error))
-                        else:
-                            self.sender_bulk(record, explicit_error)
+                        # NOTE: blocks while the workers are busy with the previously loaded records
+                        pipeline.put(record, explicit_error)
 
                         explicit_error = None
 
@@ -757,13 +1134,8 @@ class BaseConnector(object):
                         if is_test_run and self.processed_records_counter == 10:
                             self.stop_sync()
 
-                if self.payload_buffer:
-                    # this should all be good records, no errors, and they are already converted and processed,
-                    # There just wasn't enough records left to meet the 'batch_send_size'.
-                    self.send_good_end_data_in_bulk()
-
-            if connection_pool:
-                gevent.joinall(tasks, timeout=30)
+            # wait for all the loaded records to be converted and sent before the portion is finalized
+            pipeline.join()
 
             # At the end explicitly finalize the portion
             self.finalize_processed_portion()
@@ -777,10 +1149,23 @@ class BaseConnector(object):
 
         except RequestException as exp:
             raise ConfigError("Error loading records from %s: %s" % (self.MappingName, str(exp)))
-
-    def send_good_end_data_in_bulk(self):
-        self.send_to_oomnitza(self.payload_buffer, None, False, increment=len(self.payload_buffer))
-        self.payload_buffer.clear()
+        finally:
+            # do not leave the workers behind if the source has failed in the middle
+            pipeline.join()
+            self._pipeline = None
+            # the rest of the records did not fill the whole batch, send them as well, even if the source has failed
+            self._batcher.close()
+            self._batcher = None
+            self.close_conversion_pool()
+            self.stop_cancellation_watcher()
+            self.wait_for_uploads()
+            self._uploader.log_summary()
+            self._uploader = None
+            self.close_capture()
+            self.save_delta_tracker()
+            self.log_connection_stats(connection_stats)
+            self.log_template_cache_stats(template_cache_stats)
+            self.observe_render_time()
 
     def perform_sync(self, options):
         """
@@ -802,12 +1187,25 @@ class BaseConnector(object):
             self.save_test_response_to_file()
             return True
 
+        # the mapping is compiled again for every run
+        self._mapping_plan = None
+
+        self._uploader = self.create_uploader()
+        self._capture = self.open_capture() if save_data else None
+        # NOTE: the test runs do not send the data, so they must not affect the next runs
+        self._delta = self.create_delta_tracker() if not is_test_run else None
+        connection_stats = SHARED_ADAPTERS.connection_stats()
+        template_cache_stats = self.template_cache_info()
+        self._conversion_pool = self.create_conversion_pool() if not is_test_run else None
+        pipeline = self.create_record_pipeline(self.sender, self.send_to_oomnitza)
+        self._pipeline = pipeline
+        self.start_cancellation_watcher()
         try:
-            connection_pool = self.create_connection_pool()
-            tasks = []
-
             options["batch_size"] = self.batch_size
-            for index, record in enumerate(self._load_records(options)):
+            for index, record in enumerate(self.iter_source_records(self.load_source_records(options))):
+                if isinstance(record, SyncCheckpoint):
+                    self.reach_checkpoint(record, pipeline)
+                    continue
 
                 explicit_error = None
                 if isinstance(record, tuple) and len(record) == 2:
@@ -817,7 +1215,7 @@ class BaseConnector(object):
                     break
 
                 if save_data:
-                    self.save_data_locally(record, index)
+                    self.save_data_locally(record, index, error=explicit_error)
 
                 if not isinstance(record, list):
                     record = [record]
@@ -833,15 +1231,14 @@ class BaseConnector(object):
                         if isinstance(rec, tuple) and len(rec) == 2:
                             rec, explicit_error = rec
 
-                        if connection_pool:
-                            tasks.append(gevent.spawn(self.sender, rec, explicit_error))
-                        else:
-                            self.sender(rec, explicit_error)
+                        # NOTE: blocks while the workers are busy with the previously loaded records
+                        pipeline.put(rec, explicit_error)
 
                         explicit_error = None
 
                         # increase records counter
                         self.processed_records_counter += 1
+                        RECORDS.inc(result='loaded', **self.metric_labels)
                         if not self.processed_records_counter % 10:
                             msg = (
                                 f"Processed {self.processed_records_counter} record(s) from the source. "
@@ -852,8 +1249,8 @@ class BaseConnector(object):
                         if is_test_run and self.processed_records_counter == 10:
                             self.stop_sync()
 
-            if connection_pool:
-                gevent.joinall(tasks, timeout=30)
+            # wait for all the loaded records to be converted and sent before the portion is finalized
+            pipeline.join()
 
             # at the end explicitly finalize the portion
             self.finalize_processed_portion()
@@ -867,6 +1264,20 @@ class BaseConnector(object):
 
         except RequestException as exp:
             raise ConfigError("Error loading records from %s: %s" % (self.MappingName, str(exp)))
+        finally:
+            # do not leave the workers behind if the source has failed in the middle
+            pipeline.join()
+            self._pipeline = None
+            self.close_conversion_pool()
+            self.stop_cancellation_watcher()
+            self.wait_for_uploads()
+            self._uploader.log_summary()
+            self._uploader = None
+            self.close_capture()
+            self.save_delta_tracker()
+            self.log_connection_stats(connection_stats)
+            self.log_template_cache_stats(template_cache_stats)
+            self.observe_render_time()
 
     def _validate_insert_update_only(self, insert_only, update_only):
         if insert_only and update_only:
@@ -887,7 +1298,7 @@ class BaseConnector(object):
         self._validate_insert_update_only(insert_only, update_only)
         payload = {
             "connector_version": VERSION,
-            "sync_field": list(filter(bool, map(str.strip, self.settings.get('sync_field', '').split(',')))),
+            "sync_field": self.get_sync_fields(),
             "records": records if isinstance(records, list) else [records],
             "portion": self.portion,
             "data_type": self.RecordType,
@@ -911,33 +1322,23 @@ class BaseConnector(object):
 
     def send_to_oomnitza_bulk(self, data, error=None, is_fatal=False):
         """
-        Determine which method on the Oomnitza connector to call based on type of data.
+        Add the converted record to the batch, the batch is sent to Oomnitza once it is full or has been waiting for too long.
 
         :param data: the data to send (either single object or list)
         :param error: optional error message as the clear mark we must not process this item, but immediately accept this and store as the error
         :param is_fatal: a flag indicating the type of error and that the connector has stopped
-        :return: the results of the Oomnitza method call
+        :return: the results of the Oomnitza method call if the data has been sent immediately
         """
+        if error or self._batcher is None:
+            return self.send_to_oomnitza(data, error=error, is_fatal=is_fatal)
 
-        self.payload_buffer.append(data)  # Add payload to the buffer
-        if len(self.payload_buffer) >= self.batch_send_size:
-            payload = self._collect_payload(self.payload_buffer, error, is_fatal)
+        self._batcher.add(data)
 
-            if self.settings.get("__save_data__"):
-                try:
-                    self._save_processed_payload_locally(payload)
-                except:
-                    self.logger.exception("Error saving data.")
-
-            if self.settings['__testmode__']:
-                result = self.OomnitzaConnector.test_upload(payload)
-            else:
-                result = self.OomnitzaConnector.upload(payload)
-                self.sent_records_counter += len(self.payload_buffer)
-                self.payload_buffer.clear()
-        else:
-            result = None  # No upload if buffer size < batch_size
-        return result
+    def upload_bulk_batch(self, records):
+        """
+        Send the batch of the converted records collected by the batcher.
+        """
+        return self.send_to_oomnitza(records, increment=len(records))
 
     def send_to_oomnitza(self, data, error=None, is_fatal=False, increment=1):
         """
@@ -959,12 +1360,26 @@ class BaseConnector(object):
 
         if self.settings['__testmode__']:
             result = self.OomnitzaConnector.test_upload(payload)
+        elif self._uploader is not None:
+            # NOTE: the upload is done by the upload workers, the records are counted as sent once Oomnitza accepts them
+            keys = self._delta.keys_of(payload['records']) if self._delta is not None and not error else ()
+            result = self._uploader.submit(payload, on_success=lambda: self._on_records_accepted(increment, keys))
         else:
+            keys = self._delta.keys_of(payload['records']) if self._delta is not None and not error else ()
             result = self.OomnitzaConnector.upload(payload)
-            self.sent_records_counter += increment
+            self._on_records_accepted(increment, keys)
 
         return result
 
+    def _on_records_accepted(self, increment, keys):
+        self._count_sent_records(increment)
+        if keys and self._delta is not None:
+            self._delta.accept(keys)
+
+    def _count_sent_records(self, increment):
+        self.sent_records_counter += increment
+        RECORDS.inc(increment, result='sent', **self.metric_labels)
+
     def save_test_response_to_file(self):
         """
         Performs the api call and save it to a file.
@@ -1008,6 +1423,16 @@ class BaseConnector(object):
         """
         return self._convert_record(incoming_record, self.field_mappings)
 
+    def get_mapping_plan(self, field_mappings) -> MappingPlan:
+        """
+        Return the compiled plan for the given field mappings. The plan is compiled once per the connector run
+        and reused for every record unless other mappings given
+        """
+        if self._mapping_plan is None or not self._mapping_plan.is_compiled_for(field_mappings):
+            native_env = self.jinja_native_env if self.is_managed else None
+            self._mapping_plan = MappingPlan(field_mappings, native_env=native_env)
+        return self._mapping_plan
+
     def _convert_record(self, incoming_record, field_mappings):
         """
         Convert the passed incoming_record using passed field mappings.
@@ -1015,63 +1440,71 @@ class BaseConnector(object):
         :param field_mappings: the field mappings to use
         :return: the outgoing record as a dict
         """
-        outgoing_record = {}
-        missing_fields = set()
+        plan = self.get_mapping_plan(field_mappings)
+        outgoing_record = dict.fromkeys(plan.field_names)
 
-        for field, specs in list(field_mappings.items()):
-            source = specs.get('source', None)
-            extra_input = specs.get('extra_input', None)
+        # NOTE: the record keys escaping and the sanitizing of the jinja args is done once for the whole record
+        template_context = None
+        if self.is_managed and plan.needs_template_context:
+            template_context = sanitize_jinja_call_args(escape_illegal_keys(incoming_record))
 
-            if source or extra_input:
-                if self.is_managed:
-                    try:
-                        if source:
-                            incoming_value = self.get_field_value_managed(source, escape_illegal_keys(incoming_record))
-                        else:
-                            incoming_value = self.get_extra_input_value(extra_input)
+        missing_fields = []
+        for field_plan in plan.required_fields:
+            incoming_value = self._evaluate_field_plan(field_plan, incoming_record, template_context)
+            if not incoming_value:
+                missing_fields.append(field_plan.field)
+            outgoing_record[field_plan.field] = incoming_value
 
-                    except Exception as e:
-                        self.logger.exception('Failed to render the value given in mapping')
-                        raise self.ManagedConnectorRecordConversionException(source=source, error=str(e))
-                else:
-                    incoming_value = self.get_field_value(source, incoming_record)
+        if missing_fields:
+            self.logger.warning("Record missing fields: %r. Incoming Record: %r", missing_fields, incoming_record)
+            return None
 
-            else:
-                setting = specs.get('setting')
-                if setting:
-                    incoming_value = self.get_setting_value(setting)
-                else:
-                    hardcoded = specs.get('hardcoded', None)
-                    if hardcoded is not None:
-                        incoming_value = hardcoded
-                    else:
-                        raise RuntimeError("Field %s is not configured correctly.", field)
+        for field_plan in plan.optional_fields:
+            outgoing_record[field_plan.field] = self._evaluate_field_plan(field_plan, incoming_record, template_context)
 
-            converter = specs.get('converter', None)
-            if converter:
-                try:
-                    incoming_value = self.apply_converter(converter, source or field, incoming_record, incoming_value)
-                except Exception as exp:
-                    self.logger.exception("Failed to run converter: %s", converter)
-                    incoming_value = None
+        return outgoing_record
 
-            f_type = specs.get('type', None)
-            if f_type:
-                incoming_value = f_type(incoming_value)
+    def _evaluate_field_plan(self, field_plan: FieldPlan, incoming_record, template_context):
+        source = field_plan.source
 
-            if specs.get('required', False) in TRUE_VALUES and not incoming_value:
-                missing_fields.add(field)
+        if field_plan.kind in (FieldPlan.SOURCE, FieldPlan.EXTRA_INPUT):
+            if self.is_managed:
+                try:
+                    if source:
+                        incoming_value = field_plan.render(template_context)
+                        if isinstance(incoming_value, _RawValue):
+                            incoming_value = incoming_value.render()
+                    else:
+                        incoming_value = self.get_extra_input_value(field_plan.extra_input)
 
-            outgoing_record[field] = incoming_value
+                except Exception as e:
+                    self.logger.exception('Failed to render the value given in mapping')
+                    raise self.ManagedConnectorRecordConversionException(source=source, error=str(e))
+            else:
+                incoming_value = self.get_field_value(source, incoming_record)
 
-        # if subrecords:
-        #     outgoing_record.update(subrecords)
+        elif field_plan.kind == FieldPlan.SETTING:
+            incoming_value = self.get_setting_value(field_plan.setting)
+        else:
+            incoming_value = field_plan.hardcoded
 
-        if missing_fields:
-            self.logger.warning("Record missing fields: %r. Incoming Record: %r", list(missing_fields), incoming_record)
-            return None
+        if field_plan.converter:
+            try:
+                incoming_value = Converter.run_converter(
+                    field_plan.converter_name,
+                    source or field_plan.field,
+                    incoming_record,
+                    incoming_value,
+                    dict(field_plan.converter_params)
+                )
+            except Exception as exp:
+                self.logger.exception("Failed to run converter: %s", field_plan.converter)
+                incoming_value = None
 
-        return outgoing_record
+        if field_plan.f_type:
+            incoming_value = field_plan.f_type(incoming_value)
+
+        return incoming_value
 
     def get_field_value(self, field, data, default=None):
         """
@@ -1089,21 +1522,9 @@ class BaseConnector(object):
         """
         Implement the value retrieval support for the managed connectors using the Jinja2 templating engine
         """
-        if any(
-                (
-                        self.jinja_native_env.block_start_string in field,
-                        self.jinja_native_env.block_end_string in field,
-                        self.jinja_native_env.variable_start_string in field,
-                        self.jinja_native_env.variable_end_string in field
-                )
-        ):
-            # if the field definition contains the Jinja env control symbols - then do nothing
-            field_template = field
-        else:
-            # fallback / simplification compatibility, treat the incoming value as the jinja2 variable
-            field_template = self.jinja_native_env.variable_start_string + field + self.jinja_native_env.variable_end_string
+        field_template = build_field_template(self.jinja_native_env, field)
 
-        value = self.jinja_native_env.from_string(field_template).render(
+        value = self.template_cache.get_template(self.jinja_native_env, field_template).render(
             **sanitize_jinja_call_args(data)
         )
 
@@ -1117,6 +1538,10 @@ class BaseConnector(object):
         """
         Implement the value retrieval support for the managed connectors using the Jinja2 templating engine
         """
+        if self._extra_input_values is not None:
+            # the conversion process has the values resolved by the connector
+            return self._extra_input_values.get(json.dumps(extra_inputs, sort_keys=True))
+
         input_type = extra_inputs['type']
         input_value = extra_inputs['value']
 
@@ -1146,16 +1571,7 @@ class BaseConnector(object):
 
     @classmethod
     def apply_converter(cls, converter_name, field, record, value):
-        params = {}
-        if ':' in converter_name:
-            converter_name, args = converter_name.split(':', 1)
-            for arg in args.split('|'):
-                if '=' in arg:
-                    k, v = arg.split('=', 1)
-                else:
-                    k, v = arg, True
-                params[k] = v
-
+        converter_name, params = parse_converter_spec(converter_name)
         return Converter.run_converter(converter_name, field, record, value, params)
 
 
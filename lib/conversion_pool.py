@@ -0,0 +1,87 @@
+import logging
+import multiprocessing
+import pickle
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from lib.converters import Converter
+from lib.filter import DynamicConverter
+
+LOG = logging.getLogger("lib/conversion_pool")
+
+# the outcome of the conversion of the single record
+CONVERTED = 'converted'
+# the mapping can not be applied to the record, the error is sent to Oomnitza with the record
+REJECTED = 'rejected'
+# unexpected error, the traceback is returned instead of the record
+FAILED = 'failed'
+
+# the converter of the worker process, created once by the pool initializer
+_converter = None
+
+
+def _init_worker(connector_class, state: dict, dynamic_converters: Dict[str, str], log_level: int):
+    global _converter
+    # NOTE: the handlers of the connector process can not be passed to the worker, the worker logs to stderr
+    logging.basicConfig(level=log_level)
+    for name, source in dynamic_converters.items():
+        DynamicConverter(name, source)
+    _converter = connector_class.create_converter(state)
+
+
+def _convert_chunk(records: list) -> List[Tuple[str, Any]]:
+    results = []
+    for record in records:
+        try:
+            results.append((CONVERTED, _converter.convert_record(record)))
+        except _converter.ManagedConnectorRecordConversionException as e:
+            results.append((REJECTED, str(e)))
+        except Exception:
+            results.append((FAILED, traceback.format_exc()))
+    return results
+
+
+class ConversionError(Exception):
+    pass
+
+
+class ConversionPool:
+    """
+    Converts the records in the separate worker processes, so the conversion is not limited by the single core
+    of the connector process busy with the I/O.
+
+    Every worker recreates the converting part of the connector with `connector_class.create_converter(state)`
+    and keeps it, with its compiled mapping, for the whole run. The records are passed by the chunks, the chunks
+    are converted in any order, the records of the chunk come back in the order they were given.
+
+    NOTE: the workers are started with `spawn`, the forked copy of the process running the gevent hub is not safe
+    """
+
+    def __init__(self, processes: int, connector_class, state: dict, logger: Optional[logging.Logger] = None):
+        self.logger = logger or LOG
+        dynamic_converters = {
+            name: converter.source for name, converter in Converter.registered_converters().items()
+            if isinstance(converter, DynamicConverter)
+        }
+        initargs = (connector_class, state, dynamic_converters, logging.getLogger().getEffectiveLevel())
+        # fail early and in the connector process if something of the connector can not be passed to the workers
+        pickle.dumps(initargs)
+
+        self.processes = processes
+        self._executor = ProcessPoolExecutor(
+            processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=initargs
+        )
+        self.logger.info("Converting the records in %s process(es)", processes)
+
+    def convert(self, records: list) -> List[Tuple[str, Any]]:
+        """
+        The (outcome, converted record or error) for every given record, blocks only the calling greenlet
+        """
+        return self._executor.submit(_convert_chunk, records).result()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
@@ -24,6 +24,9 @@ class Converter(object):
     def register_converter(self, name, converter):
         self.__loaded_converters[name] = converter
 
+    def registered_converters(self):
+        return dict(self.__loaded_converters)
+
     def run_all_cleanups(self):
         for name, fn in self.__converters_cleanup.items():
             fn()
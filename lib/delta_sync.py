@@ -0,0 +1,147 @@
+import hashlib
+import json
+import logging
+import sqlite3
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+LOG = logging.getLogger("lib/delta_sync")
+
+
+class FingerprintStore:
+    """
+    Keeps the fingerprints of the records accepted by Oomnitza in the previous runs, per connector, in the local sqlite DB
+    """
+
+    def __init__(self, connector: str, db_name: str = 'state.db'):
+        self.connector = connector
+        self.db_name = db_name
+        with self.connection_manager() as db_connection:
+            cursor = db_connection.cursor()
+            cursor.execute(
+                "create table if not exists `record_fingerprints` "
+                "(`connector` text, `record_key` text, `fingerprint` text, "
+                "primary key (`connector`, `record_key`))")
+            cursor.execute(
+                "create table if not exists `delta_sync_runs` "
+                "(`connector` text, `runs` int, primary key (`connector`))")
+
+    @contextmanager
+    def connection_manager(self):
+        connection = sqlite3.connect(self.db_name)
+        try:
+            yield connection
+            connection.commit()
+        except:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    def load(self) -> Dict[str, str]:
+        with self.connection_manager() as db_connection:
+            cursor = db_connection.cursor()
+            cursor.execute("select `record_key`, `fingerprint` from `record_fingerprints` where `connector` = ?", (self.connector,))
+            return dict(cursor.fetchall())
+
+    def save(self, fingerprints: Dict[str, str]):
+        with self.connection_manager() as db_connection:
+            cursor = db_connection.cursor()
+            cursor.executemany(
+                "replace into `record_fingerprints` (`connector`, `record_key`, `fingerprint`) values (?,?,?)",
+                ((self.connector, key, fingerprint) for key, fingerprint in fingerprints.items()))
+
+    def increment_runs(self) -> int:
+        """
+        Count the run and return its number, starting from 1
+        """
+        with self.connection_manager() as db_connection:
+            cursor = db_connection.cursor()
+            cursor.execute("select `runs` from `delta_sync_runs` where `connector` = ?", (self.connector,))
+            record = cursor.fetchone()
+            runs = (record[0] if record else 0) + 1
+            cursor.execute("replace into `delta_sync_runs` (`connector`, `runs`) values (?,?)", (self.connector, runs))
+            return runs
+
+
+class DeltaTracker:
+    """
+    Decides which of the converted records have not changed since the last run and can be skipped.
+
+    The record is identified by the values of the `sync_field` fields and fingerprinted by the hash of its whole
+    converted content. The fingerprint is remembered only once Oomnitza has accepted the upload with the record,
+    so the records of the failed uploads are sent again by the next run. Every `full_every`-th run sends all the records.
+
+    NOTE: the calls have no gevent switch inside, so the workers of the pipeline can share the tracker without the lock
+    """
+
+    def __init__(self, store: FingerprintStore, sync_fields: Sequence[str], full_every: int = 0,
+                 serializer: Optional[Callable] = None, logger: Optional[logging.Logger] = None):
+        self.store = store
+        self.sync_fields = list(sync_fields)
+        self.serializer = serializer
+        self.logger = logger or LOG
+
+        self.run_number = store.increment_runs()
+        self.full_run = bool(full_every) and self.run_number % full_every == 0
+        self.previous = store.load()
+        self._pending = {}
+        self._accepted = {}
+        self.checked = 0
+        self.unchanged = 0
+
+        if self.full_run:
+            self.logger.info("Delta sync: the run #%s sends all the records", self.run_number)
+
+    def key_of(self, record) -> Optional[str]:
+        if not isinstance(record, dict) or not self.sync_fields:
+            return None
+        values = [record.get(_) for _ in self.sync_fields]
+        if any(value in (None, '') for value in values):
+            return None
+        return json.dumps(values, default=self.serializer)
+
+    def fingerprint_of(self, record) -> str:
+        # NOTE: always the standard codec, the fingerprints saved by the previous runs must not depend on the chosen one
+        content = json.dumps(record, sort_keys=True, separators=(',', ':'), default=self.serializer)
+        return hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+
+    def is_unchanged(self, record) -> bool:
+        """
+        True if the record is the same as the one accepted by the previous run, otherwise it is remembered to be sent
+        """
+        key = self.key_of(record)
+        if key is None:
+            return False
+
+        self.checked += 1
+        fingerprint = self.fingerprint_of(record)
+        if not self.full_run and self.previous.get(key) == fingerprint:
+            self.unchanged += 1
+            return True
+
+        self._pending[key] = fingerprint
+        return False
+
+    def keys_of(self, records: Iterable) -> List[str]:
+        return [key for key in map(self.key_of, records) if key is not None]
+
+    def accept(self, keys: Iterable[str]):
+        """
+        Oomnitza has accepted the upload with the records
+        """
+        for key in keys:
+            fingerprint = self._pending.pop(key, None)
+            if fingerprint is not None:
+                self._accepted[key] = fingerprint
+
+    def save(self):
+        if self._accepted:
+            self.store.save(self._accepted)
+            self._accepted = {}
+
+        if self.checked:
+            self.logger.info(
+                "Delta sync: %s of %s record(s) have not changed since the last run and have not been sent (%.1f%%)",
+                self.unchanged, self.checked, 100. * self.unchanged / self.checked
+            )
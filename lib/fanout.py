@@ -0,0 +1,72 @@
+import logging
+from typing import Callable, Hashable, Iterable, Iterator, Optional, Tuple
+
+import gevent
+from gevent.pool import Pool
+from gevent.queue import Queue
+
+LOG = logging.getLogger("lib/fanout")
+
+_END = object()
+
+
+class FanOut:
+    """
+    Iterates the given sources at once, each in its own greenlet, up to `concurrency` sources at a time, and yields
+    their items as `(key, item)` in the order they come.
+
+    The source is the key and the function returning the iterator of its items, it is called in the greenlet of the source.
+    The items are handed over through the small queue, so the sources are not ahead of the consumer by more than `concurrency` items.
+    The first error of the sources is raised to the consumer, the other sources are stopped by `close`
+    """
+
+    def __init__(self, sources: Iterable[Tuple[Hashable, Callable[[], Iterator]]], concurrency: int,
+                 logger: Optional[logging.Logger] = None):
+        self.concurrency = max(int(concurrency), 1)
+        self.logger = logger or LOG
+        self._items = Queue(maxsize=self.concurrency)
+        self._pool = Pool(self.concurrency)
+        self._greenlet = gevent.spawn(self._run, sources)
+
+    def _run(self, sources: Iterable[Tuple[Hashable, Callable[[], Iterator]]]):
+        try:
+            for key, source in sources:
+                # NOTE: waits for the free slot of the pool
+                self._pool.spawn(self._drain, key, source)
+            self._pool.join()
+        except Exception as exc:
+            self._items.put((None, None, exc))
+            return
+        self._items.put((None, _END, None))
+
+    def _drain(self, key: Hashable, source: Callable[[], Iterator]):
+        items = None
+        try:
+            items = source()
+            for item in items:
+                self._items.put((key, item, None))
+        except Exception as exc:
+            self._items.put((key, None, exc))
+        finally:
+            # NOTE: the source stopped by `close` releases its resources in this greenlet, not when it is collected
+            if hasattr(items, 'close'):
+                items.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> Tuple[Hashable, object]:
+        key, item, error = self._items.get()
+        if error is not None:
+            self.close()
+            raise error
+        if item is _END:
+            # NOTE: keep the end for the following calls
+            self._items.put((None, _END, None))
+            raise StopIteration
+        return key, item
+
+    def close(self):
+        if not self._greenlet.dead:
+            self._greenlet.kill()
+        self._pool.kill()
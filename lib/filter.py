@@ -41,6 +41,10 @@ class DynamicConverter(object):
 
         converters.Converter.register_converter(self._name, self)
 
+    @property
+    def source(self):
+        return self._filter_str
+
     def __call__(self, field, record, value, params):
         LOG.debug("running FilterConverter: %s", self._name)
         return self._filter(field, record, value, params)
@@ -1,17 +1,29 @@
 import base64
 import ssl
 import tempfile
-from typing import Optional
+import threading
+from typing import Dict, Optional, Tuple
 
 import OpenSSL
-from requests.adapters import DEFAULT_POOLBLOCK
+from requests.adapters import DEFAULT_POOLBLOCK, DEFAULT_POOLSIZE
 from requests.adapters import HTTPAdapter
 from urllib3 import Retry, PoolManager
 from urllib3.util.ssl_ import create_urllib3_context
 
 from constants import MTLSType
+from lib.ratelimit import REGISTRY as RATE_LIMITERS, host_of
 
-retries = Retry(
+
+class RateLimitAwareRetry(Retry):
+    """Retry reporting every retried response to the rate limiter of its host."""
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if response is not None and _pool is not None and _pool.host:
+            RATE_LIMITERS.for_host(_pool.host.lower()).on_response(response.status, response.headers)
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+
+retries = RateLimitAwareRetry(
     total=10,
     backoff_factor=0.5,
     allowed_methods=["GET", "POST"],  # Connector should not make/retry on other methods
@@ -19,7 +31,18 @@ retries = Retry(
 )
 
 
-class BaseHttpAdapter(HTTPAdapter):
+class RateLimitedHTTPAdapter(HTTPAdapter):
+    """"Transport adapter" that paces the requests with the shared per-host rate limiter."""
+
+    def send(self, request, *args, **kwargs):
+        limiter = RATE_LIMITERS.for_host(host_of(request.url))
+        limiter.acquire()
+        response = super().send(request, *args, **kwargs)
+        limiter.on_response(response.status_code, response.headers)
+        return response
+
+
+class BaseHttpAdapter(RateLimitedHTTPAdapter):
     """base "Transport adapter" that allows us to force protocol use."""
     Protocol = None
 
@@ -55,7 +78,67 @@ if getattr(ssl, '_SSLv2_IF_EXISTS', False):
     AdapterMap['sslv2'] = Sslv2HttpAdapter
 
 
-class SSLAdapter(HTTPAdapter):
+def pool_maxsize_for(concurrency: int) -> int:
+    """Number of the keep-alive connections to keep per origin for the given number of concurrent requests."""
+    return max(DEFAULT_POOLSIZE, int(concurrency or 0))
+
+
+class SharedAdapterRegistry:
+    """
+    Process-wide registry of the transport adapters.
+
+    The sessions keep their own cookies and auth, but mount the adapters from here, so the keep-alive connections
+    to the same origin are reused across the connector runs and threads. The adapter is shared only by the sessions
+    with the same TLS settings, because `requests` applies the verification and the client certificate to the pool
+    """
+    # the number of the origins every adapter keeps the connection pools for
+    POOL_ORIGINS = 32
+
+    def __init__(self):
+        self._adapters: Dict[Tuple, HTTPAdapter] = {}
+        self._lock = threading.Lock()
+
+    def get(self, scheme: str, verify=True, cert=None, protocol: str = '', pool_maxsize: int = DEFAULT_POOLSIZE) -> HTTPAdapter:
+        protocol = (protocol or '').lower() if scheme == 'https' else ''
+        key = (scheme, verify, cert, protocol, pool_maxsize)
+        with self._lock:
+            adapter = self._adapters.get(key)
+            if adapter is None:
+                adapter_class = AdapterMap[protocol] if protocol else RateLimitedHTTPAdapter
+                adapter = self._adapters[key] = adapter_class(
+                    pool_connections=self.POOL_ORIGINS,
+                    pool_maxsize=pool_maxsize,
+                    max_retries=retries
+                )
+            return adapter
+
+    def connection_stats(self) -> Dict[str, int]:
+        """
+        The number of the connections opened and the requests sent over them by all the alive pools
+        """
+        opened = requests = 0
+        with self._lock:
+            adapters = list(self._adapters.values())
+        for adapter in adapters:
+            pools = adapter.poolmanager.pools
+            for pool_key in pools.keys():
+                pool = pools.get(pool_key)
+                if pool is not None:
+                    opened += pool.num_connections
+                    requests += pool.num_requests
+        return {'opened': opened, 'requests': requests, 'reused': max(requests - opened, 0)}
+
+    def clear(self):
+        with self._lock:
+            for adapter in self._adapters.values():
+                adapter.close()
+            self._adapters.clear()
+
+
+SHARED_ADAPTERS = SharedAdapterRegistry()
+
+
+class SSLAdapter(RateLimitedHTTPAdapter):
     def __init__(self, certfile, keyfile=None, password=None, *args, **kwargs):
         self._certfile = certfile
         self._keyfile = keyfile
@@ -0,0 +1,126 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from constants import TRUE_VALUES
+
+
+def parse_converter_spec(converter_spec: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Split the converter definition given in the mapping into the converter name and its params.
+
+    >>> parse_converter_spec('split:on=@|index=1')
+    ('split', {'on': '@', 'index': '1'})
+    >>> parse_converter_spec('capitalize')
+    ('capitalize', {})
+    """
+    params = {}
+    converter_name = converter_spec
+    if ':' in converter_spec:
+        converter_name, args = converter_spec.split(':', 1)
+        for arg in args.split('|'):
+            if '=' in arg:
+                k, v = arg.split('=', 1)
+            else:
+                k, v = arg, True
+            params[k] = v
+
+    return converter_name, params
+
+
+def build_field_template(env, field: str) -> str:
+    """
+    Return the Jinja template for the managed mapping source.
+    If the source contains no Jinja control symbols it is treated as a plain variable name
+    """
+    if any(
+            (
+                    env.block_start_string in field,
+                    env.block_end_string in field,
+                    env.variable_start_string in field,
+                    env.variable_end_string in field
+            )
+    ):
+        # if the field definition contains the Jinja env control symbols - then do nothing
+        return field
+
+    # fallback / simplification compatibility, treat the incoming value as the jinja2 variable
+    return env.variable_start_string + field + env.variable_end_string
+
+
+class FieldPlan:
+    """
+    Single field of the mapping with everything that can be prepared before the records arrive
+    """
+    SOURCE = 'source'
+    EXTRA_INPUT = 'extra_input'
+    SETTING = 'setting'
+    HARDCODED = 'hardcoded'
+
+    __slots__ = (
+        'field', 'kind', 'source', 'extra_input', 'setting', 'hardcoded',
+        'template', 'template_error',
+        'converter', 'converter_name', 'converter_params',
+        'f_type', 'required',
+    )
+
+    def __init__(self, field: str, specs: dict, native_env=None):
+        self.field = field
+        self.source = specs.get('source', None)
+        self.extra_input = specs.get('extra_input', None)
+        self.setting = None
+        self.hardcoded = None
+        self.template = None
+        self.template_error = None
+
+        if self.source or self.extra_input:
+            self.kind = self.SOURCE if self.source else self.EXTRA_INPUT
+            if self.source and native_env is not None:
+                try:
+                    self.template = native_env.from_string(build_field_template(native_env, self.source))
+                except Exception as e:
+                    # NOTE: keep the error to fail each record the same way as it was failing before
+                    # the mapping was compiled, so the error will be delivered with the records
+                    self.template_error = e
+        else:
+            self.setting = specs.get('setting')
+            if self.setting:
+                self.kind = self.SETTING
+            else:
+                self.hardcoded = specs.get('hardcoded', None)
+                if self.hardcoded is None:
+                    raise RuntimeError("Field %s is not configured correctly." % field)
+                self.kind = self.HARDCODED
+
+        self.converter = specs.get('converter', None)
+        if self.converter:
+            self.converter_name, self.converter_params = parse_converter_spec(self.converter)
+        else:
+            self.converter_name, self.converter_params = None, None
+
+        self.f_type: Optional[Callable] = specs.get('type', None)
+        self.required = specs.get('required', False) in TRUE_VALUES
+
+    def render(self, context: Dict[str, Any]) -> Any:
+        if self.template_error is not None:
+            raise self.template_error
+        return self.template.render(**context)
+
+
+class MappingPlan:
+    """
+    The field mappings compiled once per connector run.
+
+    Required fields go first, so the record missing any of them can be rejected
+    before the rest of the mapping is evaluated
+    """
+
+    def __init__(self, field_mappings: dict, native_env=None):
+        self.field_mappings = field_mappings
+        fields = [FieldPlan(field, specs, native_env=native_env) for field, specs in list(field_mappings.items())]
+
+        self.field_names: List[str] = [_.field for _ in fields]
+        self.required_fields: List[FieldPlan] = [_ for _ in fields if _.required]
+        self.optional_fields: List[FieldPlan] = [_ for _ in fields if not _.required]
+        self.needs_template_context = any(_.kind == FieldPlan.SOURCE for _ in fields)
+
+    def is_compiled_for(self, field_mappings: dict) -> bool:
+        return self.field_mappings is field_mappings
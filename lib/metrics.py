@@ -0,0 +1,249 @@
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+LOG = logging.getLogger("lib/metrics")
+
+# seconds, from the single template rendering up to the slow SaaS page
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., 30., 60.)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    Base of the metrics, the values are kept per combination of the label values.
+
+    NOTE: the connector runs in the gevent loop, the updates have no switch inside, so they do not need the lock
+    """
+    type_name = None
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def _key(self, labels: Dict[str, str]) -> tuple:
+        try:
+            return tuple(str(labels[_]) for _ in self.labelnames)
+        except KeyError as exc:
+            raise ValueError(f'Metric {self.name} requires the label {exc}') from None
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        for key, value in sorted(self._values.items()):
+            yield self.name, _format_labels(self.labelnames, key), value
+
+    def exposition(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        lines.extend(f'{name}{labels} {_format_value(value)}' for name, labels, value in self.samples())
+        return lines
+
+    def clear(self):
+        self._values.clear()
+
+
+class Counter(Metric):
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    type_name = 'gauge'
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class _Timer:
+
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class Histogram(Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            # per bucket counts (not cumulative), sum, count
+            state = self._values[key] = [[0] * len(self.buckets), 0., 0]
+
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[0][i] += 1
+                break
+        state[1] += value
+        state[2] += 1
+
+    def time(self, **labels) -> _Timer:
+        """
+        Observe the duration of the `with` block
+        """
+        return _Timer(self, labels)
+
+    def get(self, **labels) -> Tuple[float, int]:
+        """
+        The sum and the count of the observations
+        """
+        state = self._values.get(self._key(labels))
+        return (state[1], state[2]) if state else (0., 0)
+
+    def percentile(self, q: float, **labels) -> Optional[float]:
+        """
+        Estimate the q-th percentile (0..100) from the buckets of all the series matching the given labels,
+        interpolating linearly within the bucket as Prometheus `histogram_quantile` does
+        """
+        counts = [0] * len(self.buckets)
+        for key, state in self._values.items():
+            if all(str(labels[name]) == value for name, value in zip(self.labelnames, key) if name in labels):
+                counts = [a + b for a, b in zip(counts, state[0])]
+
+        total = sum(counts)
+        if not total:
+            return None
+
+        rank = total * q / 100.
+        cumulative, lower = 0, 0.
+        for bound, count in zip(self.buckets, counts):
+            if count and cumulative + count >= rank:
+                if bound == float('inf'):
+                    # nothing is known about the values above the last bucket
+                    return lower
+                return lower + (bound - lower) * (rank - cumulative) / count
+            cumulative += count
+            lower = bound
+        return lower
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket', _format_labels(self.labelnames, key, ('le', _format_value(bound))), cumulative
+            labels = _format_labels(self.labelnames, key)
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, count
+
+
+class MetricsRegistry:
+    """
+    In-process registry of the metrics, exposed in the Prometheus text format
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def _register(self, metric_class, name, *args, **kwargs) -> Metric:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = metric_class(name, *args, **kwargs)
+        elif not isinstance(metric, metric_class):
+            raise ValueError(f'Metric {name} is already registered as {metric.type_name}')
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def exposition(self) -> str:
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].exposition())
+        return '\n'.join(lines) + '\n'
+
+    def write_to_file(self, path: str):
+        try:
+            with open(path, 'w') as f:
+                f.write(self.exposition())
+        except OSError:
+            LOG.exception("Failed to write the metrics to %s", path)
+        else:
+            LOG.info("The metrics have been saved to %s", path)
+
+    def clear(self):
+        for metric in self._metrics.values():
+            metric.clear()
+
+
+REGISTRY = MetricsRegistry()
+
+CONNECTOR_LABELS = ('connector', 'connector_id')
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'connector_stage_duration_seconds',
+    'Time spent in the stage of the sync: the source fetch, the SaaS behaviors, rendering, conversion, filtering, upload and finalization.',
+    CONNECTOR_LABELS + ('stage',)
+)
+RECORDS = REGISTRY.counter(
+    'connector_records_total',
+    'Records loaded from the source and sent to Oomnitza.',
+    CONNECTOR_LABELS + ('result',)
+)
+UPLOADS = REGISTRY.counter(
+    'connector_uploads_total',
+    'Uploads to Oomnitza by their result.',
+    CONNECTOR_LABELS + ('result',)
+)
+UPLOADS_IN_FLIGHT = REGISTRY.gauge(
+    'connector_uploads_in_flight',
+    'Uploads to Oomnitza currently in progress.',
+    CONNECTOR_LABELS
+)
+TEMPLATE_CACHE_LOOKUPS = REGISTRY.counter(
+    'connector_template_cache_lookups_total',
+    'Lookups of the compiled templates in the template cache of the managed connector by their result, hit or miss.',
+    CONNECTOR_LABELS + ('result',)
+)
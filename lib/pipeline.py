@@ -0,0 +1,120 @@
+import logging
+
+import gevent
+from gevent.queue import JoinableQueue
+
+LOG = logging.getLogger("lib/pipeline")
+
+# how many not yet processed records can wait in the queue per single worker
+QUEUE_SIZE_PER_WORKER = 10
+
+
+class RecordPipeline:
+    """
+    Staged processing of the records loaded from the source:
+
+        source iterator -> bounded queue -> N worker greenlets -> handler (convert & send)
+
+    The queue is bounded, so the source is blocked in `put` until the workers catch up and the memory
+    stays flat no matter how fast the records are loaded. `drain` waits until every accepted record is processed,
+    `join` does the same and stops the workers.
+
+    With zero workers the records are processed synchronously in the caller, without gevent
+    """
+    _STOP = object()
+
+    def __init__(self, handler, workers: int, queue_size: int = None, logger=None):
+        self.handler = handler
+        self.workers = workers
+        self.logger = logger or LOG
+        self.processed = 0
+        self.failed = 0
+
+        self._queue = None
+        self._greenlets = []
+        if workers:
+            self._queue = JoinableQueue(maxsize=queue_size or workers * QUEUE_SIZE_PER_WORKER)
+
+    def start(self):
+        self._greenlets = [gevent.spawn(self._work) for _ in range(self.workers)]
+        return self
+
+    def put(self, *args):
+        """
+        Pass the record to the workers, blocks while the queue is full
+        """
+        if self._queue is None:
+            self.handler(*args)
+            self.processed += 1
+        else:
+            self._queue.put(args)
+
+    def drain(self):
+        """
+        Wait until all the records accepted so far are processed, the workers keep waiting for the next ones
+        """
+        if self._queue is not None:
+            self._queue.join()
+
+    def join(self):
+        """
+        Stop accepting the records and wait until all the queued ones are processed
+        """
+        if self._queue is None:
+            return
+
+        for _ in self._greenlets:
+            self._queue.put(self._STOP)
+        gevent.joinall(self._greenlets)
+        self._greenlets = []
+
+    def _work(self):
+        while True:
+            args = self._queue.get()
+            if args is self._STOP:
+                self._queue.task_done()
+                return
+
+            try:
+                self.handler(*args)
+            except Exception:
+                self.failed += 1
+                self.logger.exception("Failed to process the record")
+            else:
+                self.processed += 1
+            finally:
+                self._queue.task_done()
+
+
+class ChunkedRecordPipeline(RecordPipeline):
+    """
+    Same as the `RecordPipeline`, but the records are collected into the chunks of `chunk_size`
+    and the handler is called with the list of the `put` arguments of every record of the chunk
+    """
+
+    def __init__(self, handler, workers: int, chunk_size: int, queue_size: int = None, logger=None):
+        # NOTE: the queue holds the whole chunks, so it is shorter to keep the same number of the records in memory
+        super().__init__(handler, workers, queue_size=queue_size or workers * 2, logger=logger)
+        self.chunk_size = chunk_size
+        self._chunk = []
+
+    def put(self, *args):
+        self._chunk.append(args)
+        if len(self._chunk) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Pass the collected records to the workers without waiting for the chunk to be filled
+        """
+        if self._chunk:
+            chunk, self._chunk = self._chunk, []
+            super().put(chunk)
+
+    def drain(self):
+        self.flush()
+        super().drain()
+
+    def join(self):
+        self.flush()
+        super().join()
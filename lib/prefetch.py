@@ -0,0 +1,61 @@
+import logging
+from typing import Iterator, Optional
+
+import gevent
+from gevent.lock import Semaphore
+from gevent.queue import Queue
+
+LOG = logging.getLogger("lib/prefetch")
+
+_END = object()
+
+
+class Prefetcher:
+    """
+    Iterates the given pages in the separate greenlet, up to `depth` pages ahead of the consumer, so the next pages
+    are being requested while the current one is processed.
+
+    The pages come in the order of the source. The error of the source is raised to the consumer in place of the page
+    it has failed on, after all the pages loaded before it. The source is stopped by `close`, the pages loaded ahead are dropped
+    """
+
+    def __init__(self, pages: Iterator, depth: int = 1, logger: Optional[logging.Logger] = None):
+        self.depth = max(int(depth), 1)
+        self.logger = logger or LOG
+        self._pages = Queue()
+        # NOTE: the slot is taken before the page is requested and returned once the consumer takes the page
+        self._slots = Semaphore(self.depth)
+        self._greenlet = gevent.spawn(self._run, pages)
+
+    def _run(self, pages: Iterator):
+        try:
+            while True:
+                self._slots.acquire()
+                page = next(pages, _END)
+                self._pages.put((page, None))
+                if page is _END:
+                    return
+        except Exception as exc:
+            self._pages.put((None, exc))
+        finally:
+            # NOTE: the source stopped by `close` releases its resources in this greenlet, not when it is collected
+            if hasattr(pages, 'close'):
+                pages.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        page, error = self._pages.get()
+        self._slots.release()
+        if error is not None:
+            raise error
+        if page is _END:
+            # NOTE: keep the end for the following calls
+            self._pages.put((_END, None))
+            raise StopIteration
+        return page
+
+    def close(self):
+        if not self._greenlet.dead:
+            self._greenlet.kill()
@@ -0,0 +1,200 @@
+import cProfile
+import logging
+import os
+import re
+import signal
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional
+from weakref import WeakKeyDictionary
+
+import gevent
+from greenlet import settrace
+
+LOG = logging.getLogger("lib/profiler")
+
+# seconds of the CPU time between the stack samples
+SAMPLING_INTERVAL = 0.005
+
+# both cProfile and the interval timer are process-wide, so only one run can be profiled at a time
+_profiling_lock = threading.Lock()
+
+
+def _greenlet_label(greenlet) -> str:
+    """
+    The samples are attributed to the function the greenlet runs, so the pool of the workers makes a single flame
+    """
+    if greenlet is None or greenlet.parent is None:
+        return 'main'
+    run = getattr(greenlet, '_run', None) or getattr(greenlet, 'run', None)
+    name = getattr(run, '__qualname__', None) or getattr(greenlet, 'name', None) or type(greenlet).__name__
+    return f'greenlet:{name}'
+
+
+class RunGreenlets:
+    """
+    The greenlets of the profiled run: the greenlet the run is started in and all the greenlets spawned from them,
+    e.g. the workers of the pipeline and the uploader. The other runs and the hub share the same thread, but not the run
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._members = WeakKeyDictionary()
+
+    def __contains__(self, greenlet) -> bool:
+        if greenlet is None:
+            return False
+        member = self._members.get(greenlet)
+        if member is None:
+            # NOTE: gevent keeps the weak reference to the spawning greenlet, the raw greenlets (e.g. the hub) have none
+            spawning = getattr(greenlet, 'spawning_greenlet', None)
+            spawning = spawning() if spawning is not None else None
+            member = self._members[greenlet] = greenlet is self.root or (spawning is not None and spawning in self)
+        return member
+
+
+class RunProfile:
+    """
+    The deterministic profile of the run greenlets only.
+
+    cProfile follows the stack of the whole thread, so the profile is paused at every greenlet switch and resumed
+    once one of the run greenlets is switched to. The stacks of the greenlets are never mixed, the frame interrupted
+    by the switch is counted up to the switch and its callees afterwards, so the cumulative time of the long-living frames,
+    e.g. of the sync loop, is underestimated. The own time of the functions is exact
+    """
+
+    def __init__(self, greenlets: RunGreenlets):
+        self.greenlets = greenlets
+        self.profile = cProfile.Profile()
+        self._previous_trace = None
+
+    def _trace(self, event, args):
+        if event in ('switch', 'throw'):
+            _, target = args
+            self.profile.disable()
+            if target in self.greenlets:
+                self.profile.enable()
+        if self._previous_trace is not None:
+            self._previous_trace(event, args)
+
+    def start(self):
+        self._previous_trace = settrace(self._trace)
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        settrace(self._previous_trace)
+        self._previous_trace = None
+
+    def dump_stats(self, path: str):
+        self.profile.dump_stats(path)
+
+
+class StackSampler:
+    """
+    Sampling profiler driven by the SIGPROF interval timer.
+
+    Every sample is the stack of the greenlet running at the moment, prefixed with the greenlet label,
+    and the result is written in the "collapsed stack" format understood by flamegraph.pl and speedscope.
+    With the `greenlets` given, the samples taken while the other greenlets are running are dropped
+    """
+
+    def __init__(self, interval: float = SAMPLING_INTERVAL, greenlets: Optional[RunGreenlets] = None):
+        self.interval = interval
+        self.greenlets = greenlets
+        self.samples = Counter()
+        self._frame_names = {}
+        self._previous_handler = None
+
+    def _frame_name(self, code) -> str:
+        name = self._frame_names.get(code)
+        if name is None:
+            name = self._frame_names[code] = f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+        return name
+
+    def _sample(self, signum, frame):
+        current = gevent.getcurrent()
+        if self.greenlets is not None and current not in self.greenlets:
+            return
+        stack = []
+        while frame is not None:
+            stack.append(self._frame_name(frame.f_code))
+            frame = frame.f_back
+        stack.append(_greenlet_label(current))
+        self.samples[';'.join(reversed(stack))] += 1
+
+    def start(self) -> bool:
+        """
+        The signals are available only on POSIX and only in the main thread of the process
+        """
+        if not hasattr(signal, 'SIGPROF'):
+            return False
+        try:
+            self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+        except ValueError:
+            return False
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        return True
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+
+    def write(self, path: str):
+        with open(path, 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+def _safe_file_name(value) -> str:
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', str(value))
+
+
+@contextmanager
+def profile_run(directory: Optional[str], connector_name: str, portion: Optional[str] = None):
+    """
+    Profile the block and save the artifacts to the `directory`:
+
+        <connector>-<portion>-<timestamp>.pstats     - deterministic profile, open with `python -m pstats` or snakeviz
+        <connector>-<portion>-<timestamp>.collapsed  - sampled stacks per greenlet, for the flame graph
+
+    Only the greenlet of the run and the greenlets spawned by it are profiled, not the other runs of the process.
+    Does nothing if the directory is not set or some other run is being profiled at the moment
+    """
+    if not directory:
+        yield
+        return
+
+    if not _profiling_lock.acquire(blocking=False):
+        LOG.warning("Another run is being profiled at the moment, %s will not be profiled", connector_name)
+        yield
+        return
+
+    try:
+        run_greenlets = RunGreenlets(gevent.getcurrent())
+        sampler = StackSampler(greenlets=run_greenlets)
+        if not sampler.start():
+            LOG.warning("The stack sampling is not available, only the deterministic profile of %s will be saved", connector_name)
+            sampler = None
+        profiler = RunProfile(run_greenlets)
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            if sampler:
+                sampler.stop()
+
+            os.makedirs(directory, exist_ok=True)
+            base_name = os.path.join(
+                directory,
+                '-'.join(_safe_file_name(_) for _ in (connector_name, portion or 'run', time.strftime('%Y%m%dT%H%M%S')))
+            )
+            profiler.dump_stats(f'{base_name}.pstats')
+            if sampler:
+                sampler.write(f'{base_name}.collapsed')
+            LOG.info("The profile of %s has been saved to %s.*", connector_name, base_name)
+    finally:
+        _profiling_lock.release()
@@ -0,0 +1,219 @@
+import logging
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Dict, Mapping, Optional, Tuple
+from urllib.parse import urlsplit
+
+LOG = logging.getLogger("lib/ratelimit")
+
+# the statuses meaning the host wants us to slow down
+THROTTLE_STATUSES = (429, 503)
+
+# X-RateLimit-Reset above this value is the epoch timestamp, otherwise it is the number of seconds
+EPOCH_THRESHOLD = 10 ** 9
+
+
+def host_of(url: str) -> str:
+    return (urlsplit(url).hostname or '').lower()
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """
+    Number of seconds to wait from the `Retry-After` header, it is either the delay in seconds or the HTTP date
+    """
+    if not value:
+        return None
+
+    value = value.strip()
+    try:
+        return max(float(value), 0.)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+    return max(retry_at - (now or time.time()), 0.)
+
+
+def parse_rate_limit_reset(headers: Mapping[str, str], now: Optional[float] = None) -> Optional[float]:
+    """
+    Number of seconds to wait if the `X-RateLimit-*` headers tell the quota is exhausted
+    """
+    remaining = headers.get('X-RateLimit-Remaining')
+    reset = headers.get('X-RateLimit-Reset')
+    if remaining is None or reset is None:
+        return None
+
+    try:
+        if float(remaining) > 0:
+            return None
+        reset = float(reset)
+    except ValueError:
+        return None
+
+    if reset > EPOCH_THRESHOLD:
+        return max(reset - (now or time.time()), 0.)
+    return max(reset, 0.)
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens per second, up to `capacity` tokens can be accumulated for the burst
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(self.rate, 1.))
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """
+        Take the token, returns the number of seconds the caller must wait before using it
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= 1
+            return -self.tokens / self.rate if self.tokens < 0 else 0.
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+
+class AdaptiveHostLimiter:
+    """
+    Rate limiter of the single host shared by all the connectors of the process.
+
+    The host is not limited until it throttles us. On the first 429/503 the rate is set to the half of the rate
+    observed during the last second, every next throttling halves it again (multiplicative decrease)
+    and every successful response increases it by `increase` requests per second (additive increase).
+    `Retry-After` and exhausted `X-RateLimit-*` quota pause all the requests to the host
+    """
+    # the rate is never decreased more often than this, the throttled responses of the concurrent requests come in a burst
+    DECREASE_COOLDOWN = 1.
+
+    def __init__(self, host: str, min_rate: float = 0.5, increase: float = 0.1, logger=None):
+        self.host = host
+        self.min_rate = float(min_rate)
+        self.increase = float(increase)
+        self.logger = logger or LOG
+
+        self.rate: Optional[float] = None
+        self.blocked_until = 0.
+        self.throttled = 0
+
+        self._next_slot = 0.
+        self._last_decrease = 0.
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def _observed_rate(self, now: float) -> float:
+        while self._recent and self._recent[0] < now - 1.:
+            self._recent.popleft()
+        return float(len(self._recent))
+
+    def reserve(self) -> float:
+        """
+        Take the slot for the next request, returns the number of seconds the caller must wait before sending it
+        """
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self.blocked_until)
+            if self.rate is not None:
+                start = max(start, self._next_slot)
+                self._next_slot = start + 1. / self.rate
+
+            self._recent.append(start)
+            self._observed_rate(now)
+            return start - now
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds: float, reason: str):
+        with self._lock:
+            blocked_until = time.monotonic() + seconds
+            if blocked_until > self.blocked_until:
+                self.blocked_until = blocked_until
+                self.logger.warning("Pausing the requests to %s for %.2f second(s): %s", self.host, seconds, reason)
+
+    def on_response(self, status: int, headers: Mapping[str, str]):
+        retry_after = parse_retry_after(headers.get('Retry-After'))
+        if retry_after:
+            self.pause(retry_after, "Retry-After")
+        else:
+            quota_reset = parse_rate_limit_reset(headers)
+            if quota_reset:
+                self.pause(quota_reset, "the rate limit quota is exhausted")
+
+        if status in THROTTLE_STATUSES:
+            self._decrease()
+        elif status < 400:
+            self._increase()
+
+    def _decrease(self):
+        with self._lock:
+            now = time.monotonic()
+            self.throttled += 1
+            if now - self._last_decrease < self.DECREASE_COOLDOWN:
+                return
+
+            self._last_decrease = now
+            current = self.rate if self.rate is not None else self._observed_rate(now)
+            self.rate = max(current / 2., self.min_rate)
+            self.logger.warning("%s is throttling the requests, the rate is decreased to %.2f request(s) per second", self.host, self.rate)
+
+    def _increase(self):
+        with self._lock:
+            if self.rate is not None:
+                self.rate += self.increase
+
+
+class RateLimiterRegistry:
+    """
+    Process-wide registry of the limiters, all the sessions talking to the same host share the same limiter
+    """
+
+    def __init__(self):
+        self._hosts: Dict[str, AdaptiveHostLimiter] = {}
+        self._ceilings: Dict[Tuple[str, float], TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def for_host(self, host: str) -> AdaptiveHostLimiter:
+        with self._lock:
+            limiter = self._hosts.get(host)
+            if limiter is None:
+                limiter = self._hosts[host] = AdaptiveHostLimiter(host)
+            return limiter
+
+    def ceiling(self, host: str, rate: float) -> TokenBucket:
+        """
+        Fixed requests-per-second ceiling declared for the host, shared by everyone declaring the same ceiling
+        """
+        key = (host, float(rate))
+        with self._lock:
+            bucket = self._ceilings.get(key)
+            if bucket is None:
+                bucket = self._ceilings[key] = TokenBucket(rate)
+            return bucket
+
+    def clear(self):
+        with self._lock:
+            self._hosts.clear()
+            self._ceilings.clear()
+
+
+REGISTRY = RateLimiterRegistry()
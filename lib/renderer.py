@@ -1,7 +1,12 @@
 import importlib
+import time
+from collections import ChainMap, OrderedDict
+from contextlib import contextmanager
 from logging import Logger
 from typing import Any, Optional, Dict
+from weakref import WeakKeyDictionary
 
+import gevent
 from jinja2 import UndefinedError, Undefined, TemplateSyntaxError, Environment, pass_environment
 from jinja2.exceptions import SecurityError
 from jinja2.nativetypes import NativeEnvironment
@@ -134,6 +139,51 @@ class _GlobalVariableContext:
         raise AttributeError
 
 
+class TemplateCache:
+    """
+    Bounded LRU cache of the compiled templates keyed by the environment and the template source.
+
+    The same pagination controls, headers, URLs and software templates are rendered again and again
+    during the run, so there is no need to lex, parse and compile them every time
+    """
+
+    def __init__(self, maxsize: int = 512):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._templates = OrderedDict()
+
+    def get_template(self, env: Environment, source: str):
+        key = (id(env), source)
+        template = self._templates.get(key)
+        if template is not None:
+            self.hits += 1
+            self._templates.move_to_end(key)
+            return template
+
+        self.misses += 1
+        template = env.from_string(source)
+        if self.maxsize > 0:
+            self._templates[key] = template
+            if len(self._templates) > self.maxsize:
+                self._templates.popitem(last=False)
+        return template
+
+    def clear(self):
+        self._templates.clear()
+
+    def __len__(self):
+        return len(self._templates)
+
+    def info(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._templates),
+            'maxsize': self.maxsize,
+        }
+
+
 class Renderer:
     """
     Common Jinja2 renderer, usable in the different places
@@ -142,6 +192,16 @@ class Renderer:
     jinja_string_env = None
     jinja_native_env = None
     rendering_context = None
+    template_cache = None
+    # the greenlet-local scopes of the rendering context, see `rendering_scope`
+    _rendering_scopes = None
+
+    # NOTE: the rendering is too frequent to be observed by the stage metric one by one, the time is summed up here and
+    # observed once per batch of the records, see `take_render_seconds`
+    render_seconds = 0.
+
+    # the number of the compiled templates kept by the renderer, 0 disables the cache
+    TEMPLATE_CACHE_SIZE = 512
 
     def __init__(self, *args, **kwargs):
         # NOTE 1: Init 3d-party context at the class initialization to avoid extra
@@ -154,45 +214,98 @@ class Renderer:
         # NOTE 3: .pop() instead .get() because in case of native usage of Renderer it will call
         # python native Object __init__(self) that doesnt has *args, **kwarg in the function signature
         oomnitza_connector = kwargs.pop('oomnitza_connector', None) or self.OomnitzaConnector
+        template_cache_size = kwargs.pop('template_cache_size', self.TEMPLATE_CACHE_SIZE)
         self.rendering_context = {
             'GlobalSetting': _GlobalVariableContext(oomnitza_connector=oomnitza_connector)
         }
+        self.init_jinja_environments(template_cache_size)
+        super().__init__(*args, **kwargs)
 
+    def init_jinja_environments(self, template_cache_size: int = TEMPLATE_CACHE_SIZE):
         self.jinja_string_env = StringEnvironmentWithImportSupport()
         self.jinja_native_env = SafeNativeEnvironmentWithImportSupport()
         self.jinja_native_env.filters.update({
             "as_is": as_is,
         })
-        super().__init__(*args, **kwargs)
+        # NOTE: the cache is shared by both environments, the key includes the environment
+        self.template_cache = TemplateCache(maxsize=template_cache_size)
+
+    @contextmanager
+    def rendering_scope(self, context=None):
+        """
+        The rendering context of the current greenlet layered over the shared one: the variables set within the scope
+        are seen only by this greenlet, the shared variables are seen as well. So the greenlets can render the templates
+        of the different items at once.
+
+        The scope is layered over the given `context` instead, e.g. over the scope of the greenlet that has spawned this one
+        """
+        if self._rendering_scopes is None:
+            self._rendering_scopes = WeakKeyDictionary()
+        greenlet = gevent.getcurrent()
+        parent = self._rendering_scopes.get(greenlet)
+        if context is None:
+            context = self.rendering_context if parent is None else parent
+        self._rendering_scopes[greenlet] = ChainMap({}, context)
+        try:
+            yield
+        finally:
+            if parent is None:
+                del self._rendering_scopes[greenlet]
+            else:
+                self._rendering_scopes[greenlet] = parent
+
+    def current_rendering_context(self):
+        """
+        The rendering context of the current greenlet: its scope if it is in one, otherwise the shared context
+        """
+        if self._rendering_scopes:
+            scope = self._rendering_scopes.get(gevent.getcurrent())
+            if scope is not None:
+                return scope
+        return self.rendering_context
 
     def update_rendering_context(self, **kwargs):
-        self.rendering_context.update(**kwargs)
+        self.current_rendering_context().update(**kwargs)
 
     def clear_rendering_context(self, *args):
+        context = self.current_rendering_context()
         for arg in args:
-            self.rendering_context.pop(arg, None)
+            context.pop(arg, None)
 
     def get_arg_from_rendering_context(self, keyword):
-        return self.rendering_context.get(keyword, None)
+        return self.current_rendering_context().get(keyword, None)
+
+    def take_render_seconds(self) -> float:
+        """
+        The seconds spent rendering since the previous call
+        """
+        seconds, self.render_seconds = self.render_seconds, 0.
+        return seconds
 
     def render_to_string(self, template: Any) -> str:
         """
         Render the value to the string
         """
+        started = time.perf_counter()
+        context = self.current_rendering_context()
         try:
-            return self.jinja_string_env.from_string(str(template)).render(**self.rendering_context)
+            return self.template_cache.get_template(self.jinja_string_env, str(template)).render(**context)
         except UndefinedError:
-            logger.debug(f'Failed to render to string. Template: {str(template)}. Context: {self.rendering_context}')
+            logger.debug(f'Failed to render to string. Template: {str(template)}. Context: {context}')
             return ''
         except TemplateSyntaxError as e:
             raise ConfigError(f'Invalid configuration for the managed connector: {e.message}')
+        finally:
+            self.render_seconds += time.perf_counter() - started
 
     def render_to_native(self, template: Any) -> Any:
         """
         Render the value to its native type based on the inputs
         """
+        started = time.perf_counter()
+        context = self.current_rendering_context()
         try:
-            val = self.jinja_native_env.from_string(str(template)).render(**self.rendering_context)
+            val = self.template_cache.get_template(self.jinja_native_env, str(template)).render(**context)
             if val == Undefined():
                 raise UndefinedError
 
@@ -201,7 +314,9 @@ class Renderer:
 
             return val
         except UndefinedError:
-            logger.debug(f'Failed to render to native. Template: {str(template)}. Context: {self.rendering_context}')
+            logger.debug(f'Failed to render to native. Template: {str(template)}. Context: {context}')
             return None
         except TemplateSyntaxError as e:
             raise ConfigError(f'Invalid configuration for the managed connector: {e.message}')
+        finally:
+            self.render_seconds += time.perf_counter() - started
@@ -0,0 +1,83 @@
+import logging
+import time
+from typing import Callable, Optional
+
+from gevent.lock import Semaphore
+
+LOG = logging.getLogger("lib/session_secret")
+
+
+class SessionSecretCache:
+    """
+    Keeps the secret generated by the session-based authorization of the SaaS for its lifetime, so the login is not
+    repeated for every request.
+
+    `generate` returns the secret, its lifetime in seconds is taken from its `ttl`, the secret without the lifetime
+    is not kept and every request generates its own, as before. The kept secret is generated again a bit before it expires,
+    while the other greenlets still use the old one, and at once if the SaaS has rejected it, see `invalidate`.
+    Only one greenlet generates the secret at a time, the others wait for its result.
+    """
+
+    # the secret is generated again once this share of its lifetime is left, but not earlier than a minute before it expires
+    REFRESH_SHARE = 0.1
+    MAX_REFRESH_MARGIN = 60.
+
+    def __init__(self, generate: Callable[[], dict], logger: Optional[logging.Logger] = None):
+        self.generate = generate
+        self.logger = logger or LOG
+        self.generated = 0
+        self._secret = None
+        self._refresh_at = 0.
+        self._expires_at = 0.
+        self._caching = False
+        self._lock = Semaphore()
+
+    def get(self) -> dict:
+        if self.generated and not self._caching:
+            # NOTE: the secret is not kept, so there is nothing to wait for, the greenlets generate their own ones at once
+            return self._generate()
+
+        secret = self._secret
+        if secret is not None:
+            now = time.monotonic()
+            if now < self._refresh_at:
+                return secret
+            if now < self._expires_at and self._lock.locked():
+                # another greenlet is already generating the new one, the current one is still valid
+                return secret
+
+        with self._lock:
+            # NOTE: the secret could have been generated while this greenlet was waiting for the lock
+            if self._secret is not None and time.monotonic() < self._refresh_at:
+                return self._secret
+            return self._generate()
+
+    def _generate(self) -> dict:
+        # NOTE: the lifetime is counted from the login request, the SaaS has started it before the response has come
+        started = time.monotonic()
+        secret = self.generate()
+        self.generated += 1
+
+        ttl = float(secret.get('ttl') or 0)
+        self._caching = ttl > 0
+        if not self._caching:
+            self._secret = None
+            return secret
+
+        self._secret = secret
+        self._expires_at = started + ttl
+        self._refresh_at = self._expires_at - min(ttl * self.REFRESH_SHARE, self.MAX_REFRESH_MARGIN)
+        self.logger.debug("The session secret has been generated, it is kept for %.0f second(s)", ttl)
+        return secret
+
+    def invalidate(self, headers: dict, params: dict) -> bool:
+        """
+        Forget the kept secret the SaaS has rejected the request with. True if the request should be repeated
+        with the new secret, False if it has been made with the secret just generated for it
+        """
+        secret = self._secret
+        if secret is not None and secret.get('headers') == headers and secret.get('params') == params:
+            self._secret = None
+            return True
+        # NOTE: the kept secret has been already replaced by another greenlet
+        return self._caching
@@ -0,0 +1,126 @@
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from gevent.pool import Pool
+
+from lib.metrics import STAGE_SECONDS, UPLOADS, UPLOADS_IN_FLIGHT
+
+LOG = logging.getLogger("lib/uploader")
+
+
+class LatencyStats:
+    """
+    Latency of the requests, the percentiles are calculated over the last `window` requests
+    """
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+        self._recent: List[float] = []
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self._recent.append(seconds)
+        if len(self._recent) > self.window:
+            del self._recent[:len(self._recent) - self.window]
+
+    def percentile(self, p: float) -> float:
+        if not self._recent:
+            return 0.
+        ordered = sorted(self._recent)
+        return ordered[min(int(len(ordered) * p / 100.), len(ordered) - 1)]
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'avg': self.total / self.count if self.count else 0.,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+
+
+class Uploader:
+    """
+    Sends the payloads to Oomnitza with up to `concurrency` requests in flight.
+
+    The upload workers share the same session of the Oomnitza connector, so the keep-alive connections are reused.
+    `wait` is the barrier: it returns only when every submitted payload has been acknowledged or has permanently failed,
+    so the portion can be finalized only after all its data.
+    With zero concurrency the payloads are sent synchronously and the errors are raised to the caller
+    """
+
+    def __init__(self, upload: Callable[[Any], Any], concurrency: int = 0, metric_labels: Optional[Dict[str, str]] = None, logger=None):
+        self.upload = upload
+        self.metric_labels = metric_labels
+        self.logger = logger or LOG
+        self.latency = LatencyStats()
+        self.acknowledged = 0
+        self.failed = 0
+
+        self._pool = Pool(size=concurrency) if concurrency else None
+
+    def submit(self, payload, on_success: Optional[Callable[[], Any]] = None):
+        """
+        Send the payload, blocks while all the upload workers are busy
+        """
+        if self._pool is None:
+            try:
+                self._send(payload, on_success)
+            except Exception:
+                self._count_failure()
+                raise
+        else:
+            self._pool.spawn(self._send_logged, payload, on_success)
+
+    def wait(self):
+        if self._pool is not None:
+            self._pool.join()
+
+    def _send(self, payload, on_success):
+        labels = self.metric_labels
+        if labels is not None:
+            UPLOADS_IN_FLIGHT.inc(**labels)
+        started = time.monotonic()
+        try:
+            result = self.upload(payload)
+        finally:
+            elapsed = time.monotonic() - started
+            self.latency.observe(elapsed)
+            if labels is not None:
+                UPLOADS_IN_FLIGHT.dec(**labels)
+                STAGE_SECONDS.observe(elapsed, stage='upload', **labels)
+
+        self.acknowledged += 1
+        if labels is not None:
+            UPLOADS.inc(result='acknowledged', **labels)
+        if on_success is not None:
+            on_success()
+        return result
+
+    def _send_logged(self, payload, on_success):
+        try:
+            self._send(payload, on_success)
+        except Exception:
+            self._count_failure()
+            self.logger.exception("Failed to upload the data to Oomnitza")
+
+    def _count_failure(self):
+        self.failed += 1
+        if self.metric_labels is not None:
+            UPLOADS.inc(result='failed', **self.metric_labels)
+
+    def log_summary(self):
+        summary = self.latency.summary()
+        if not summary['count']:
+            return
+
+        self.logger.info(
+            "Uploads: %s acknowledged, %s failed. Latency avg %.3fs, p50 %.3fs, p99 %.3fs, max %.3fs",
+            self.acknowledged, self.failed, summary['avg'], summary['p50'], summary['p99'], summary['max']
+        )
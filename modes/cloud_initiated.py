@@ -2,6 +2,7 @@ import logging
 import sys
 from time import sleep
 from threading import Thread
+from typing import List
 
 from requests.exceptions import RetryError
 
@@ -32,6 +33,18 @@ def run_the_managed_sync(cloud_config, cmdline_args):
     run_connector(connector_config, {})
 
 
+def start_managed_syncs(oomnitza_config, cmdline_args) -> List[Thread]:
+    """
+    Check Oomnitza for the managed syncs to run once and start each of them in its own thread
+    """
+    threads = []
+    for cloud_config in oomnitza_config['__connector__'].check_managed_cloud_configs():
+        thread = Thread(target=run_the_managed_sync, args=(cloud_config, cmdline_args))
+        thread.start()
+        threads.append(thread)
+    return threads
+
+
 def cloud_initiated_upload(cmdline_args):
 
     try:
@@ -47,7 +60,7 @@ def cloud_initiated_upload(cmdline_args):
 
     while True:
         try:
-            cloud_configs = oomnitza_config['__connector__'].check_managed_cloud_configs()
+            start_managed_syncs(oomnitza_config, cmdline_args)
         except RetryError:
             if oomnitza_config['__ignore_cloud_maintenance__']:
                 # if we are ignoring the cloud maintenance we have be very tolerant to retry errors
@@ -56,8 +69,5 @@ def cloud_initiated_upload(cmdline_args):
                 continue
             raise
 
-        for cloud_config in cloud_configs:
-            Thread(target=run_the_managed_sync, args=(cloud_config, cmdline_args)).start()
-
         # sleep between checks
         sleep(10)
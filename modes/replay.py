@@ -0,0 +1,121 @@
+import logging
+import sys
+import time
+
+from lib import codec, config
+from lib.capture import capture_files
+from lib.converters import Converter
+from lib.profiler import profile_run
+
+LOG = logging.getLogger("connector.py")
+
+REPLAY_SINKS = ('local', 'oomnitza')
+
+
+class LocalSink:
+    """
+    Stands for the Oomnitza connector in the `replay` mode: the payloads are serialized as for the real upload
+    and counted, but not sent anywhere. Everything else, for example the mappings, is still requested from Oomnitza
+    """
+
+    def __init__(self, oomnitza_connector, serializer=None):
+        self._oomnitza_connector = oomnitza_connector
+        self._serializer = serializer
+        self.uploads = 0
+        self.uploaded_records = 0
+        self.uploaded_bytes = 0
+
+    def __getattr__(self, item):
+        return getattr(self._oomnitza_connector, item)
+
+    def upload(self, payload):
+        self.uploads += 1
+        self.uploaded_records += len(payload.get('records', []))
+        self.uploaded_bytes += len(codec.dumps_bytes(payload, default=self._serializer))
+
+    def test_upload(self, payload):
+        self.upload(payload)
+
+    def finalize_portion(self, portion_id):
+        pass
+
+    def get_portion_info(self, correlation_id):
+        return {}
+
+    def create_synthetic_finalized_successful_portion(self, *args, **kwargs):
+        pass
+
+    def create_synthetic_finalized_failed_portion(self, *args, **kwargs):
+        pass
+
+    def create_synthetic_finalized_empty_portion(self, *args, **kwargs):
+        pass
+
+
+def replay_upload(cmdline_args):
+    """
+    Main entry point for Oomnitza connector for the "replay" connector mode: the records saved by the `--save-data`
+    are filtered, converted and uploaded by the connector instead of the records loaded from the source
+    """
+    if len(cmdline_args.connectors) != 1:
+        LOG.error("Exactly one connector must be specified for the replay. Exiting")
+        sys.exit(1)
+
+    name = cmdline_args.connectors[0]
+    if name.startswith(('managed.', 'managed_reports.')):
+        # NOTE: the configuration of the managed connector is given by Oomnitza only with its scheduled run, there is nothing to build it from
+        LOG.error("The managed connectors can not be replayed, only the connectors of the config.ini can. Exiting")
+        sys.exit(1)
+
+    paths = capture_files(cmdline_args.replay_from or [])
+    if not paths:
+        LOG.error("No saved data found at %s. Exiting", ', '.join(cmdline_args.replay_from or []) or '--replay-from')
+        sys.exit(1)
+
+    try:
+        connectors = config.parse_config_for_client_initiated(cmdline_args)
+    except config.ConfigError as exp:
+        LOG.error("Error loading config.ini: %s", str(exp))
+        sys.exit(1)
+    except KeyboardInterrupt:
+        raise
+    except Exception:
+        LOG.exception("Error processing config.ini file.")
+        sys.exit(1)
+
+    if name not in connectors:
+        LOG.error("Connector '%s' is not enabled.", name)
+        sys.exit(1)
+
+    connector_cfg = connectors[name]
+    connector = connector_cfg['__connector__']
+    connector.settings['__replay_from__'] = paths
+
+    sink = None
+    if cmdline_args.replay_sink == 'local':
+        sink = connector.OomnitzaConnector = LocalSink(connector.OomnitzaConnector, connector.json_serializer)
+        # nothing is sent to Oomnitza, so the replay must not affect the delta sync of the real runs
+        connector.settings['delta_sync'] = 'False'
+
+    options = {}
+    if cmdline_args.record_count:
+        options['record_count'] = cmdline_args.record_count
+
+    LOG.info("Replaying %s file(s) of the saved data with the connector: %s", len(paths), name)
+    started = time.perf_counter()
+    with profile_run(connector_cfg.get('__profile_dir__'), connector_cfg['__name__'], connector.portion):
+        connector.determine_processing_mode(connector_cfg['__name__'], options)
+    elapsed = time.perf_counter() - started
+
+    Converter.run_all_cleanups()
+
+    processed = connector.processed_records_counter
+    LOG.info(
+        "Replayed %d record(s) in %.2f second(s): %.1f record(s) per second. %d record(s) have been sent to the destination",
+        processed, elapsed, processed / elapsed if elapsed else 0., connector.sent_records_counter
+    )
+    if sink is not None:
+        LOG.info(
+            "The local sink has received %d upload(s) with %d record(s), %d byte(s) of JSON",
+            sink.uploads, sink.uploaded_records, sink.uploaded_bytes
+        )
@@ -5,6 +5,9 @@ import logging
 import gevent
 from gevent import pywsgi
 
+from lib.metrics import REGISTRY as METRICS
+from lib.profiler import profile_run
+
 LOG = logging.getLogger("connector_server")
 
 
@@ -29,6 +32,10 @@ class Server(object):
 
     def handle_incoming_request(self, environ, response):
 
+        if environ['PATH_INFO'] == '/metrics':
+            response('200 OK', [('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')])
+            return [METRICS.exposition().encode('utf-8')]
+
         # take the last part of the url as identifier of connector to handle the request
         connector_name = environ['PATH_INFO'].split('/')[-1]
         connector_to_handle_request = self.non_oomnitza_connectors.get(connector_name)
@@ -38,7 +45,8 @@ class Server(object):
         else:
             try:
                 gevent.spawn(
-                    connector_to_handle_request['__connector__'].server_handler,
+                    self.run_server_handler,
+                    connector_to_handle_request,
                     # Important: read the body content before passing to the greenlet
                     *(environ['wsgi.input'].read(), environ, self.options)
                 ).start()
@@ -49,6 +57,12 @@ class Server(object):
         response('204 NO CONTENT', [('Content-Type', 'text/html')])
         return [None]
 
+    @staticmethod
+    def run_server_handler(connector_cfg, body, environ, options):
+        connector = connector_cfg['__connector__']
+        with profile_run(connector_cfg.get('__profile_dir__'), connector_cfg['__name__'], connector.portion):
+            connector.server_handler(body, environ, options)
+
     def http_server(self):
         http_server = pywsgi.WSGIServer((self.host, int(self.port)),
                                         self.handle_incoming_request)
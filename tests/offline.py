@@ -0,0 +1,62 @@
+"""
+The managed connector run offline: Oomnitza is stood for in memory and the SaaS is never called
+"""
+import gevent
+
+from connectors.managed import Connector
+from lib.connector import BaseConnector
+
+
+class OfflineOomnitza:
+    """
+    Stands for the Oomnitza connector, keeps the order of the uploads and the finalization of the portion
+    """
+    settings = {'url': 'http://oomnitza.invalid', 'api_token': 'test'}
+
+    def __init__(self):
+        self.events = []
+
+    def authenticate(self):
+        pass
+
+    def get_mappings_for_managed(self, connector_id):
+        return {
+            'serial': {'type': 'attribute', 'value': 'serial'},
+            'name': {'type': 'attribute', 'value': '{{ name|upper }}'},
+        }
+
+    def upload(self, payload):
+        # NOTE: the slow upload keeps the records in flight when the list fails
+        gevent.sleep(0.01)
+        self.events.append(('upload', payload))
+
+    def finalize_portion(self, portion):
+        self.events.append(('finalize', portion))
+
+    def get_portion_info(self, correlation_id):
+        return {}
+
+
+def make_managed_connector(oomnitza, workers, **settings):
+    BaseConnector.OomnitzaConnector = oomnitza
+    connector = Connector('managed.1', {
+        'id': '1',
+        'name': 'test',
+        'type': 'assets',
+        'sync_field': 'serial',
+        'update_only': 'False',
+        'insert_only': 'False',
+        'inputs': {},
+        'saas_authorization': {'headers': {'Authorization': 'Bearer test'}, 'params': {}},
+        'oomnitza_authorization': 'test',
+        'list_behavior': {'url': 'http://saas.invalid/list', 'http_method': 'GET', 'headers': [], 'params': []},
+        'bulk_batch_size': '100',
+        '__workers__': workers,
+        '__testmode__': False,
+        '__name__': 'managed.1',
+        'use_server_map': 'False',
+        **settings
+    })
+    connector.OomnitzaConnector = oomnitza
+    connector.get_oomnitza_auth_for_sync = lambda: 'test'
+    return connector
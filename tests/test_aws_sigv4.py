@@ -0,0 +1,107 @@
+import datetime
+import hashlib
+import hmac
+
+import pytest
+
+from lib.aws_sigv4 import canonical_uri, sign_request
+
+# the credentials, the date, the region and the service shared by the vectors of the AWS `aws-sig-v4-test-suite`
+ACCESS_KEY = 'AKIDEXAMPLE'
+SECRET_KEY = 'wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY'
+SESSION_TOKEN = (
+    'AQoDYXdzEPT//////////wEXAMPLEtc764bNrC9SAPBSM22wDOk4x4HIZ8j4FZTwdQWLWsKWHGBuFqwAeMicRXmxfpSPfIeoIYRqTflfKD8YUuwthAx7mSEI/'
+    'qkPpKPi/kMcGdQrmGdeehM4IC1NtBmUpp2wUE8phUZampKsburEDy0KPkyQDYwT7WZ0wq5VSXDvp75YU9HFvlRd8Tx6q6fE8YQcHNVXAkiY9q6d+xo0rKwT38xVqr7ZD0u0'
+    'iPPkUL64lIZbqBAz+scqKmlzm8FDrypNC9Yjc8fPOLn9FX9KSYvKTr4rvx3iSIlTJabIQwj2ICCR/oLxBA=='
+)
+NOW = datetime.datetime(2015, 8, 30, 12, 36, 0)
+UNRESERVED = '-._~0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+EMPTY_PAYLOAD_HASH = 'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855'
+
+# name: (method, url, headers, params, body, session token, expected signature)
+VECTORS = {
+    'get-vanilla': ('GET', 'https://example.amazonaws.com/', {}, {}, None, None,
+                    '5fa00fa31553b73ebf1942676e86291e8372ff2a2260956d9b8aae1d763fbf31'),
+    'get-vanilla-query-order-key-case': ('GET', 'https://example.amazonaws.com/', {}, {'Param2': 'value2', 'Param1': 'value1'}, None, None,
+                                         'b97d918cfa904a5beff61c982a1b6f458b799221646efd99d3219ec94cdf2500'),
+    'get-vanilla-query-unreserved': ('GET', 'https://example.amazonaws.com/', {}, {UNRESERVED: UNRESERVED}, None, None,
+                                     '9c3e54bfcdf0b19771a7f523ee5669cdf59bc7cc0884027167c21bb143a40197'),
+    'get-utf8': ('GET', 'https://example.amazonaws.com/ሴ', {}, {}, None, None,
+                 '8318018e0b0f223aa2bbf98705b62bb787dc9c0e678f255a891fd03141be5d85'),
+    'get-space': ('GET', 'https://example.amazonaws.com/example space/', {}, {}, None, None,
+                  '652487583200325589f1fba4c7e578f72c47cb61beeca81406b39ddec1366741'),
+    'post-vanilla': ('POST', 'https://example.amazonaws.com/', {}, {}, None, None,
+                     '5da7c1a2acd57cee7505fc6676e4e544621c30862966e37dddb68e92efbe5d6b'),
+    'post-x-www-form-urlencoded': ('POST', 'https://example.amazonaws.com/', {'Content-Type': 'application/x-www-form-urlencoded'}, {},
+                                   'Param1=value1', None, 'ff11897932ad3f4e8b18135d722051e5ac45fc38421b1da7b9d196a0fe09473a'),
+    'post-sts-header-before': ('POST', 'https://example.amazonaws.com/', {}, {}, None, SESSION_TOKEN,
+                               '85d96828115b5dc0cfc3bd16ad9e210dd772bbebba041836c64533a82be05ead'),
+}
+# the vectors with nothing to encode in the path, they are signed the same way with the path encoded once or twice
+PLAIN_PATH_VECTORS = [name for name in VECTORS if name not in ('get-utf8', 'get-space')]
+
+
+def sign(method, url, headers, params, body, session_token, **kwargs) -> dict:
+    api_call_specification = {'http_method': method, 'url': url, 'headers': dict(headers), 'params': dict(params), 'body': body}
+    return sign_request(api_call_specification, ACCESS_KEY, SECRET_KEY, session_token=session_token,
+                        region='us-east-1', service='service', now=NOW, **kwargs)
+
+
+def signature_of(api_call_specification: dict) -> str:
+    return api_call_specification['headers']['Authorization'].rpartition('Signature=')[2]
+
+
+def expected_signature(path: str) -> str:
+    """
+    The signature of the GET request of the suite with the given canonical URI, derived as the AWS documentation describes it
+    """
+    canonical_request = '\n'.join(('GET', path, '', 'host:example.amazonaws.com\nx-amz-date:20150830T123600Z\n', 'host;x-amz-date', EMPTY_PAYLOAD_HASH))
+    string_to_sign = '\n'.join((
+        'AWS4-HMAC-SHA256', '20150830T123600Z', '20150830/us-east-1/service/aws4_request',
+        hashlib.sha256(canonical_request.encode('utf-8')).hexdigest(),
+    ))
+    key = ('AWS4' + SECRET_KEY).encode('utf-8')
+    for part in ('20150830', 'us-east-1', 'service', 'aws4_request'):
+        key = hmac.new(key, part.encode('utf-8'), hashlib.sha256).digest()
+    return hmac.new(key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+@pytest.mark.parametrize('name', VECTORS)
+def test_aws_test_suite_vectors(name):
+    # NOTE: the suite encodes the path once, as S3 does
+    *request, expected = VECTORS[name]
+    assert signature_of(sign(*request, double_encode_path=False)) == expected
+
+
+@pytest.mark.parametrize('name', PLAIN_PATH_VECTORS)
+def test_vectors_with_the_plain_path_are_signed_the_same_by_default(name):
+    *request, expected = VECTORS[name]
+    assert signature_of(sign(*request)) == expected
+
+
+def test_derived_signature_matches_the_suite():
+    assert expected_signature('/example%20space/') == VECTORS['get-space'][-1]
+
+
+@pytest.mark.parametrize('url, path', [
+    ('https://example.amazonaws.com/example space/', '/example%2520space/'),
+    ('https://example.amazonaws.com/ሴ', '/%25E1%2588%25B4'),
+    ('https://example.amazonaws.com/example%20space/', '/example%2520space/'),
+    ('https://example.amazonaws.com/a:b@c', '/a%3Ab%40c'),
+])
+def test_path_is_double_encoded_by_default(url, path):
+    signed = sign('GET', url, {}, {}, None, None)
+    assert signature_of(signed) == expected_signature(path)
+    # the path is sent encoded once, the service encodes it again to check the signature
+    assert signed['url'] == url.replace(' ', '%20').replace('ሴ', '%E1%88%B4')
+
+
+@pytest.mark.parametrize('path, once, twice', [
+    ('', '/', '/'),
+    ('/documents and settings/', '/documents%20and%20settings/', '/documents%2520and%2520settings/'),
+    ('/already%20encoded', '/already%20encoded', '/already%2520encoded'),
+    ('/-._~', '/-._~', '/-._~'),
+])
+def test_canonical_uri(path, once, twice):
+    assert canonical_uri(path, double_encode=False) == once
+    assert canonical_uri(path) == twice
@@ -0,0 +1,64 @@
+import gevent
+
+from lib.batcher import BulkBatcher
+from lib.connector import BaseConnector
+
+
+def test_flush_by_number_of_records():
+    batches = []
+    batcher = BulkBatcher(batches.append, max_records=3)
+    for record in range(7):
+        batcher.add(record)
+    assert batches == [[0, 1, 2], [3, 4, 5]]
+    batcher.close()
+    assert batches[-1] == [6]
+    assert batcher.flushed_batches == 3
+
+
+def test_flush_by_serialized_size():
+    batches = []
+    record = {'name': 'x' * 90}
+    batcher = BulkBatcher(batches.append, max_records=100, max_bytes=250)
+    for _ in range(5):
+        batcher.add(record)
+    # every record is ~100 bytes, so the third one crosses the limit
+    assert [len(_) for _ in batches] == [3]
+    batcher.close()
+    assert [len(_) for _ in batches] == [3, 2]
+
+
+def test_flush_by_linger():
+    batches = []
+    batcher = BulkBatcher(batches.append, max_records=100, linger_seconds=0.02)
+    batcher.add(1)
+    batcher.add(2)
+    assert batches == []
+    gevent.sleep(0.05)
+    assert batches == [[1, 2]]
+    batcher.close()
+    assert batcher.flushed_batches == 1
+
+
+def test_linger_of_flushed_batch_does_not_flush_the_next_one():
+    batches = []
+    batcher = BulkBatcher(batches.append, max_records=2, linger_seconds=0.03)
+    batcher.add(1)
+    gevent.sleep(0.02)
+    batcher.add(2)
+    batcher.add(3)
+    gevent.sleep(0.015)
+    # the timer of the first batch has expired, the third record is still waiting for its own
+    assert batches == [[1, 2]]
+    gevent.sleep(0.03)
+    assert batches == [[1, 2], [3]]
+
+
+def test_connector_batcher_uses_default_limits():
+    class Connector(BaseConnector):
+        MappingName = 'test'
+        FieldMappings = {}
+
+    connector = Connector('test', {'use_server_map': 'False', '__workers__': 2})
+    batcher = connector.create_bulk_batcher()
+    assert batcher.max_bytes == 2097152
+    assert batcher.linger_seconds == 10
@@ -0,0 +1,61 @@
+import logging
+import time
+
+import gevent
+
+from lib.cancellation import CancellationWatcher
+
+
+def test_cancellation_is_detected_in_background():
+    answers = iter([False, False, True])
+    watcher = CancellationWatcher(lambda: next(answers), interval=0.01).start()
+    assert not watcher.is_canceled()
+    gevent.sleep(0.05)
+    assert watcher.is_canceled()
+    assert watcher.observed_at >= watcher.detected_at
+    watcher.stop()
+
+
+def test_latency_is_bounded_by_the_last_check_finding_the_run_going(caplog):
+    checks = []
+
+    def check():
+        # the run is canceled in Oomnitza between the second and the third check
+        checks.append(time.monotonic())
+        return len(checks) > 2
+
+    watcher = CancellationWatcher(check, interval=0.02).start()
+    with caplog.at_level(logging.INFO):
+        gevent.sleep(0.1)
+        assert watcher.is_canceled()
+    watcher.stop()
+
+    assert watcher.running_at <= checks[1] < checks[2] <= watcher.detected_at
+    assert any(_.startswith('The run has stopped ') and 'after the run has been canceled in Oomnitza' in _ for _ in caplog.messages)
+
+
+def test_failed_checks_back_off():
+    calls = []
+
+    def check():
+        calls.append(None)
+        raise ConnectionError
+
+    watcher = CancellationWatcher(check, interval=0.01, max_interval=0.04).start()
+    gevent.sleep(0.1)
+    watcher.stop()
+    # 0, 0.02, 0.06, 0.1 instead of the every 0.01 second
+    assert 2 <= len(calls) <= 4
+    assert not watcher.is_canceled()
+
+
+def test_stop_ends_the_checks():
+    calls = []
+    watcher = CancellationWatcher(lambda: calls.append(None), interval=0.01).start()
+    gevent.sleep(0.025)
+    watcher.stop()
+    # NOTE: the kill is delivered on the next switch
+    gevent.sleep(0)
+    checked = len(calls)
+    gevent.sleep(0.03)
+    assert len(calls) == checked
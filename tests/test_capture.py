@@ -0,0 +1,125 @@
+import gzip
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from lib.capture import CaptureWriter, capture_files, iter_capture_pages, zstandard
+from lib.connector import BaseConnector
+from modes.replay import replay_upload
+from offline import OfflineOomnitza, make_managed_connector
+
+
+def read_lines(path):
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rb') as f:
+            data = f.read()
+    elif path.endswith('.zst'):
+        with open(path, 'rb') as f:
+            data = zstandard.ZstdDecompressor().stream_reader(f).read()
+    else:
+        with open(path, 'rb') as f:
+            data = f.read()
+    return [json.loads(line) for line in data.splitlines()]
+
+
+PAGES = [
+    [{'serial': 'serial-1', 'name': 'device-1'}, ({'serial': 'serial-2', 'name': 'device-2'}, 'the details have failed')],
+    [{'serial': 'serial-3', 'name': 'device-3'}],
+]
+
+
+def uploaded(oomnitza):
+    """
+    The serials of the records sent to Oomnitza with their errors
+    """
+    return sorted(
+        (record.get('serial'), payload['error'])
+        for kind, payload in oomnitza.events if kind == 'upload'
+        for record in payload['records']
+    )
+
+
+@pytest.mark.parametrize('compression', ['none', 'gzip', pytest.param('zstd', marks=pytest.mark.skipif(zstandard is None, reason='zstandard is not installed'))])
+def test_capture_round_trip(tmp_path, compression):
+    writer = CaptureWriter(str(tmp_path), 'managed.1', 'portion', compression=compression, buffer_size=64)
+    writer.write('record', {'id': 1}, index=0)
+    writer.write('payload', {'records': [{'id': 1}]})
+    writer.close()
+
+    [path] = writer.paths
+    assert os.path.basename(path).startswith('managed.1-portion-')
+    assert read_lines(path) == [
+        {'kind': 'record', 'index': 0, 'data': {'id': 1}},
+        {'kind': 'payload', 'data': {'records': [{'id': 1}]}},
+    ]
+
+
+def test_capture_is_rotated_by_size(tmp_path):
+    writer = CaptureWriter(str(tmp_path), 'test', rotate_bytes=100)
+    for i in range(10):
+        writer.write('record', {'id': i, 'name': 'x' * 20}, index=i)
+    writer.close()
+
+    assert len(writer.paths) > 1
+    assert [_.endswith(f'.{n:04d}.ndjson') for n, _ in enumerate(writer.paths, 1)] == [True] * len(writer.paths)
+    lines = [line for path in writer.paths for line in read_lines(path)]
+    assert [_['data']['id'] for _ in lines] == list(range(10))
+    assert writer.lines_written == 10
+
+
+def test_nothing_is_written_without_data(tmp_path):
+    writer = CaptureWriter(str(tmp_path / 'capture'), 'test')
+    writer.close()
+    assert writer.paths == []
+    assert not os.path.exists(str(tmp_path / 'capture'))
+
+
+def test_unknown_compression():
+    with pytest.raises(ValueError):
+        CaptureWriter('.', 'test', compression='bz2')
+
+
+@pytest.mark.skipif(zstandard is not None, reason='zstandard is installed')
+def test_zstd_falls_back_to_gzip(tmp_path):
+    writer = CaptureWriter(str(tmp_path), 'test', compression='zstd')
+    writer.write('record', {'id': 1}, index=0)
+    writer.close()
+    assert writer.compression == 'gzip'
+    assert read_lines(writer.paths[0])[0]['data'] == {'id': 1}
+
+
+def test_capture_pages_keep_explicit_errors(tmp_path):
+    writer = CaptureWriter(str(tmp_path), 'test')
+    writer.write('record', {'id': 1}, index=0)
+    writer.write('record', {'id': 2}, index=0, error='failed')
+    writer.write('record', [{'id': 3}, {'id': 4}], index=1)
+    writer.close()
+
+    assert list(iter_capture_pages(writer.paths)) == [[{'id': 1}, ({'id': 2}, 'failed')], [{'id': 3}, {'id': 4}]]
+
+
+@pytest.mark.parametrize('bulk', [True, False])
+def test_replay_sends_errored_records_with_their_errors(tmp_path, bulk):
+    oomnitza = OfflineOomnitza()
+    connector = make_managed_connector(oomnitza, 0, __save_data__='True')
+    connector._use_single_mode = lambda: not bulk
+    connector._load_list = lambda batch_size, resume=None: iter(PAGES)
+    connector.open_capture = lambda: BaseConnector.open_capture(connector, path=str(tmp_path))
+    connector.determine_processing_mode('test', {})
+    expected = uploaded(oomnitza)
+    assert ('serial-2', 'the details have failed') in expected
+
+    replayed = OfflineOomnitza()
+    connector = make_managed_connector(replayed, 0, __replay_from__=capture_files([str(tmp_path)]))
+    connector._use_single_mode = lambda: not bulk
+    connector.determine_processing_mode('test', {})
+    assert uploaded(replayed) == expected
+
+
+@pytest.mark.parametrize('name', ['managed.123', 'managed_reports.123'])
+def test_replay_of_managed_connector_is_refused(tmp_path, name):
+    with pytest.raises(SystemExit) as exc_info:
+        replay_upload(SimpleNamespace(connectors=[name], replay_from=[str(tmp_path)], replay_sink='local', record_count=None))
+    assert exc_info.value.code == 1
@@ -0,0 +1,148 @@
+import sqlite3
+
+import pytest
+
+from lib.checkpoints import CheckpointStore
+from offline import OfflineOomnitza, make_managed_connector
+
+PAGES = [[{'serial': f'serial-{page}-{i}', 'name': f'device-{page}-{i}'} for i in range(3)] for page in range(4)]
+
+
+class SaaS:
+    """
+    The paginated list of the items, the page is chosen by the `iteration` of the rendering context
+    """
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.requested = []
+
+    def attach(self, connector):
+        def make_api_request(behavior, pagination, break_early, add_if, **kwargs):
+            iteration = connector.get_arg_from_rendering_context('iteration')
+            self.requested.append(iteration)
+            if iteration == self.fail_on:
+                raise ConnectionError('the page has failed')
+            return (PAGES[iteration] if iteration < len(PAGES) else []), {}, {}
+
+        connector.make_api_request = make_api_request
+        connector._use_single_mode = lambda: False
+        return connector
+
+
+def connect(oomnitza, saas, workers=2, url='http://saas.invalid/list', **settings):
+    connector = make_managed_connector(oomnitza, workers, checkpoint_every_pages='1', list_behavior={
+        'url': url, 'http_method': 'GET', 'headers': [], 'params': [], 'result': '{{ list_response }}',
+    }, **settings)
+    return saas.attach(connector)
+
+
+def sync(oomnitza, saas, **kwargs):
+    connector = connect(oomnitza, saas, **kwargs)
+    connector.determine_processing_mode('test', {})
+    return connector
+
+
+def sent_serials(oomnitza):
+    return sorted(
+        record['serial']
+        for kind, payload in oomnitza.events if kind == 'upload' and not payload.get('error')
+        for record in payload['records']
+    )
+
+
+def all_serials(pages):
+    return sorted(record['serial'] for page in pages for record in page)
+
+
+@pytest.fixture(autouse=True)
+def state_db(tmp_path, monkeypatch):
+    # NOTE: the checkpoints are kept in the state.db of the working directory
+    monkeypatch.chdir(tmp_path)
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_failed_run_is_resumed_from_the_last_checkpoint(workers):
+    failed = SaaS(fail_on=2)
+    with pytest.raises(Exception):
+        sync(OfflineOomnitza(), failed, workers=workers)
+    assert failed.requested == [0, 1, 2]
+
+    oomnitza, resumed = OfflineOomnitza(), SaaS()
+    sync(oomnitza, resumed, workers=workers)
+    assert resumed.requested == [2, 3, 4]
+    assert sent_serials(oomnitza) == all_serials(PAGES[2:])
+
+    # the completed run has cleared the checkpoint
+    assert CheckpointStore('1').load() is None
+    again = SaaS()
+    sync(OfflineOomnitza(), again, workers=workers)
+    assert again.requested == [0, 1, 2, 3, 4]
+
+
+def test_expired_checkpoint_is_ignored():
+    with pytest.raises(Exception):
+        sync(OfflineOomnitza(), SaaS(fail_on=2))
+    with sqlite3.connect('state.db') as db_connection:
+        db_connection.execute("update `sync_checkpoints` set `saved_at` = `saved_at` - 100")
+
+    saas = SaaS()
+    sync(OfflineOomnitza(), saas, checkpoint_resume_window='60')
+    assert saas.requested[0] == 0
+
+
+def test_checkpoint_of_other_list_behavior_is_ignored():
+    with pytest.raises(Exception):
+        sync(OfflineOomnitza(), SaaS(fail_on=2))
+
+    saas = SaaS()
+    sync(OfflineOomnitza(), saas, url='http://saas.invalid/other-list')
+    assert saas.requested[0] == 0
+
+
+def test_checkpoint_is_not_saved_after_failed_upload():
+    class FailingOomnitza(OfflineOomnitza):
+        def upload(self, payload):
+            if not self.events:
+                self.events.append(('failed', payload))
+                raise ConnectionError('the upload has failed')
+            super().upload(payload)
+
+    with pytest.raises(Exception):
+        sync(FailingOomnitza(), SaaS(fail_on=2))
+    assert CheckpointStore('1').load() is None
+
+
+def test_test_run_does_not_use_checkpoints():
+    connector = sync(OfflineOomnitza(), SaaS(), test_run='True')
+    assert connector._checkpoint_store is None
+
+
+def test_canceled_run_keeps_the_checkpoint():
+    with pytest.raises(Exception):
+        sync(OfflineOomnitza(), SaaS(fail_on=2))
+    saved = CheckpointStore('1').load()
+
+    # the list loop finds the run canceled before the first page, it returns without the error
+    connector = connect(OfflineOomnitza(), SaaS())
+    connector.is_run_canceled = lambda: True
+    assert list(connector._load_records({})) == []
+    assert CheckpointStore('1').load()[0] == saved[0]
+
+    resumed = SaaS()
+    sync(OfflineOomnitza(), resumed)
+    assert resumed.requested == [2, 3, 4]
+
+
+def test_next_run_does_not_inherit_the_list_state():
+    connector = sync(OfflineOomnitza(), SaaS(), list_prefetch_depth='2')
+    assert connector._checkpoint_store is not None
+    assert connector._list_prefetch_depth == 2
+
+    # the same connector runs the list of the basic connector next time
+    connector.BasicConnector = 'basic'
+    connector._load_basic_connector_list = lambda connector_settings: iter(())
+    assert list(connector._load_records({})) == []
+    assert connector._checkpoint_store is None
+    assert connector._streamed_list_path is None
+    assert connector._list_prefetch_depth == 0
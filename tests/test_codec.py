@@ -0,0 +1,52 @@
+import math
+
+import pytest
+
+from lib import codec
+from utils.helper_utils import response_to_object
+
+CODECS = ['json'] + (['orjson'] if codec.orjson is not None else [])
+
+
+@pytest.fixture(params=CODECS)
+def json_codec(request):
+    previous = codec.get_codec().name
+    codec.set_codec(request.param)
+    yield request.param
+    codec.set_codec(previous)
+
+
+@pytest.mark.parametrize('body', [b'{"a": NaN, "b": Infinity}', '{"a": NaN, "b": Infinity}'])
+def test_non_finite_numbers_are_parsed(json_codec, body):
+    result = response_to_object(body)
+
+    assert isinstance(result, dict)
+    assert math.isnan(result['a'])
+    assert result['b'] == float('inf')
+
+
+@pytest.mark.parametrize('body', [
+    b'{"id": 123456789012345678901234567890}',
+    '{"id": 123456789012345678901234567890}',
+    memoryview(b'{"id": 123456789012345678901234567890}'),
+])
+def test_wide_integers_keep_precision(json_codec, body):
+    assert response_to_object(body) == {'id': 123456789012345678901234567890}
+
+
+@pytest.mark.parametrize('value', [2 ** 64, 2 ** 64 - 1, -2 ** 63, -2 ** 63 - 1, 10 ** 30])
+def test_integers_at_the_64_bit_boundaries(json_codec, value):
+    result = response_to_object(f'[{value}, "{value}"]'.encode())
+
+    assert result == [value, str(value)]
+    assert type(result[0]) is int
+
+
+def test_long_digit_strings_are_not_wide_integers():
+    assert not codec.has_wide_integer(b'{"serial": "123456789012345678", "id": 18446744073709551615}')
+    assert codec.has_wide_integer(b'{"id": 18446744073709551616}')
+    assert codec.has_wide_integer('{"id": -9223372036854775809}')
+
+
+def test_invalid_json_is_returned_as_text(json_codec):
+    assert response_to_object(b'{"broken": ') == '{"broken": '
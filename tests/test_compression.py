@@ -0,0 +1,111 @@
+import gzip
+import json
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+from connectors.oomnitza import Connector as OomnitzaConnector
+from lib.compression import gzip_json, iter_json_chunks
+
+
+class RecordingAdapter(BaseAdapter):
+    """
+    Transport answering with the given statuses one by one and remembering the requests
+    """
+
+    def __init__(self, *statuses):
+        super().__init__()
+        self.statuses = list(statuses)
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        response = requests.Response()
+        response.status_code = self.statuses.pop(0)
+        response.request = request
+        response.url = request.url
+        response._content = b'{}'
+        return response
+
+    def close(self):
+        pass
+
+
+class Connector(OomnitzaConnector):
+
+    def authenticate(self):
+        pass
+
+
+def make_connector(adapter, compression='gzip'):
+    connector = Connector('oomnitza', {
+        'url': 'https://example.oomnitza.com',
+        'api_token': 'token',
+        'upload_compression': compression,
+    })
+    connector._session = requests.Session()
+    connector._session.mount('https://', adapter)
+    return connector
+
+
+def decode(request):
+    if request.headers.get('Content-Encoding') == 'gzip':
+        return json.loads(gzip.decompress(request.body))
+    return json.loads(request.body)
+
+
+@pytest.mark.parametrize('payload', [
+    {'records': [{'a': 1}, {'b': [1, 2]}], 'portion_id': 'x'},
+    {'records': []},
+    {'records': [{'a': 1}]},
+    {'no_records': True},
+])
+def test_streamed_json_is_the_same_document(payload):
+    assert json.loads(b''.join(iter_json_chunks(payload))) == payload
+    assert json.loads(gzip.decompress(gzip_json(payload))) == payload
+
+
+def test_upload_is_compressed():
+    adapter = RecordingAdapter(200)
+    payload = {'records': [{'serial': 'A'}], 'portion_id': 'x'}
+    make_connector(adapter).upload(payload)
+    request, = adapter.requests
+    assert request.headers['Content-Encoding'] == 'gzip'
+    assert decode(request) == payload
+
+
+def test_upload_is_not_compressed_by_default():
+    adapter = RecordingAdapter(200)
+    make_connector(adapter, compression='none').upload({'records': []})
+    assert 'Content-Encoding' not in adapter.requests[0].headers
+
+
+@pytest.mark.parametrize('status', [400, 415, 501])
+def test_rejected_compression_falls_back_to_plain_json(status):
+    adapter = RecordingAdapter(status, 200, 200)
+    connector = make_connector(adapter)
+    payload = {'records': [{'serial': 'A'}]}
+    connector.upload(payload)
+    connector.upload(payload)
+    compressed, plain, next_one = adapter.requests
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Encoding' not in plain.headers and decode(plain) == payload
+    # the compression stays off for the connector
+    assert 'Content-Encoding' not in next_one.headers
+
+
+def test_other_errors_are_not_retried_uncompressed():
+    adapter = RecordingAdapter(403)
+    with pytest.raises(requests.HTTPError):
+        make_connector(adapter).upload({'records': []})
+    assert len(adapter.requests) == 1
+
+
+def test_compression_stays_on_if_plain_json_fails_too():
+    adapter = RecordingAdapter(400, 400, 200)
+    connector = make_connector(adapter)
+    with pytest.raises(requests.HTTPError):
+        connector.upload({'records': []})
+    connector.upload({'records': []})
+    assert adapter.requests[-1].headers['Content-Encoding'] == 'gzip'
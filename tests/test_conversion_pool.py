@@ -0,0 +1,77 @@
+import pytest
+
+from lib import conversion_pool
+from lib.conversion_pool import CONVERTED, FAILED, REJECTED
+from lib.pipeline import ChunkedRecordPipeline
+from offline import OfflineOomnitza, make_managed_connector
+
+RECORDS = [{'serial': f'serial-{i}', 'name': f'device-{i}'} for i in range(25)]
+
+
+def uploaded(oomnitza):
+    return sorted(
+        (record['serial'], record['name'])
+        for kind, payload in oomnitza.events if kind == 'upload'
+        for record in payload['records']
+    )
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_chunks_are_flushed_by_size_and_at_the_end(workers):
+    chunks = []
+    pipeline = ChunkedRecordPipeline(chunks.append, workers=workers, chunk_size=10).start()
+    for i in range(25):
+        pipeline.put(i, None)
+    pipeline.join()
+    assert [len(_) for _ in chunks] == [10, 10, 5]
+    assert [args for chunk in chunks for args in chunk] == [(i, None) for i in range(25)]
+
+
+def test_drain_flushes_the_incomplete_chunk():
+    chunks = []
+    pipeline = ChunkedRecordPipeline(chunks.append, workers=2, chunk_size=10).start()
+    pipeline.put(1, None)
+    pipeline.drain()
+    assert chunks == [[(1, None)]]
+    pipeline.join()
+
+
+def test_outcome_of_every_record_of_the_chunk(monkeypatch):
+    class Converter:
+        ManagedConnectorRecordConversionException = ValueError
+
+        @staticmethod
+        def convert_record(record):
+            if record == 'rejected':
+                raise ValueError('the mapping can not be applied')
+            if record == 'failed':
+                raise KeyError('unexpected')
+            return {'converted': record}
+
+    monkeypatch.setattr(conversion_pool, '_converter', Converter)
+    results = conversion_pool._convert_chunk(['a', 'rejected', 'failed', 'b'])
+    assert [outcome for outcome, _ in results] == [CONVERTED, REJECTED, FAILED, CONVERTED]
+    assert results[0][1] == {'converted': 'a'} and results[3][1] == {'converted': 'b'}
+    assert results[1][1] == 'the mapping can not be applied'
+    assert 'KeyError' in results[2][1]
+
+
+@pytest.mark.parametrize('bulk', [True, False])
+def test_conversion_processes_convert_the_same_way(bulk, monkeypatch):
+    chunks = []
+    convert = conversion_pool.ConversionPool.convert
+    monkeypatch.setattr(conversion_pool.ConversionPool, 'convert', lambda self, records: chunks.append(len(records)) or convert(self, records))
+
+    def sync(oomnitza, **settings):
+        connector = make_managed_connector(oomnitza, 2, **settings)
+        connector._use_single_mode = lambda: not bulk
+        connector._load_list = lambda batch_size, resume=None: iter([RECORDS[:10], RECORDS[10:]] if bulk else RECORDS)
+        connector.determine_processing_mode('test', {})
+
+    in_process, in_pool = OfflineOomnitza(), OfflineOomnitza()
+    sync(in_process)
+    sync(in_pool, conversion_processes='1', conversion_chunk_size='7')
+    assert uploaded(in_pool) == uploaded(in_process)
+    assert uploaded(in_pool)[0] == ('serial-0', 'DEVICE-0')
+    assert len(uploaded(in_pool)) == len(RECORDS)
+    assert sum(chunks) == len(RECORDS) and max(chunks) == 7
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from lib.delta_sync import DeltaTracker, FingerprintStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return lambda connector='test': FingerprintStore(connector, db_name=os.path.join(str(tmp_path), 'state.db'))
+
+
+def run(store, records, accepted=True, full_every=0):
+    """
+    The records sent by the run, all of them are accepted by Oomnitza unless `accepted` is False
+    """
+    tracker = DeltaTracker(store, ['serial'], full_every=full_every)
+    sent = [record for record in records if not tracker.is_unchanged(record)]
+    if accepted:
+        tracker.accept(tracker.keys_of(sent))
+    tracker.save()
+    return sent
+
+
+def test_unchanged_records_are_not_sent_again(store):
+    records = [{'serial': 'A', 'name': 'a'}, {'serial': 'B', 'name': 'b'}]
+    assert run(store(), records) == records
+    assert run(store(), records) == []
+
+    changed = [{'serial': 'A', 'name': 'a'}, {'serial': 'B', 'name': 'renamed'}, {'serial': 'C', 'name': 'c'}]
+    assert run(store(), changed) == changed[1:]
+
+
+def test_fingerprint_does_not_depend_on_the_key_order(store):
+    run(store(), [{'serial': 'A', 'name': 'a', 'model': 'm'}])
+    assert run(store(), [{'model': 'm', 'name': 'a', 'serial': 'A'}]) == []
+
+
+def test_records_of_failed_uploads_are_sent_again(store):
+    records = [{'serial': 'A', 'name': 'a'}]
+    assert run(store(), records, accepted=False) == records
+    assert run(store(), records) == records
+    assert run(store(), records) == []
+
+
+def test_every_nth_run_sends_all_the_records(store):
+    records = [{'serial': 'A', 'name': 'a'}]
+    assert [len(run(store(), records, full_every=3)) for _ in range(6)] == [1, 0, 1, 0, 0, 1]
+
+
+def test_records_without_the_key_are_always_sent(store):
+    records = [{'serial': '', 'name': 'a'}, {'name': 'b'}, 'not a record']
+    run(store(), records)
+    assert run(store(), records) == records
+
+
+def test_connectors_have_separate_fingerprints(store):
+    records = [{'serial': 'A', 'name': 'a'}]
+    run(store('first'), records)
+    assert run(store('second'), records) == records
+    assert run(store('first'), records) == []
+
+
+def test_suppression_is_counted(store):
+    records = [{'serial': 'A'}, {'serial': 'B'}]
+    run(store(), records)
+    tracker = DeltaTracker(store(), ['serial'])
+    tracker.is_unchanged({'serial': 'A'})
+    tracker.is_unchanged({'serial': 'B', 'name': 'changed'})
+    assert (tracker.checked, tracker.unchanged) == (2, 1)
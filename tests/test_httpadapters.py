@@ -0,0 +1,56 @@
+import pytest
+
+from lib.connector import BaseConnector
+from lib.httpadapters import SHARED_ADAPTERS, RateLimitedHTTPAdapter, SharedAdapterRegistry, Tlsv1HttpAdapter, pool_maxsize_for
+
+
+class Connector(BaseConnector):
+    MappingName = 'test'
+    FieldMappings = {}
+
+
+@pytest.fixture(autouse=True)
+def clear_shared_adapters():
+    yield
+    SHARED_ADAPTERS.clear()
+
+
+def test_pool_maxsize_for():
+    assert pool_maxsize_for(0) == 10
+    assert pool_maxsize_for(None) == 10
+    assert pool_maxsize_for(25) == 25
+
+
+def test_adapters_are_shared_by_the_same_settings():
+    registry = SharedAdapterRegistry()
+    adapter = registry.get('https')
+    assert isinstance(adapter, RateLimitedHTTPAdapter)
+    assert registry.get('https') is adapter
+    assert registry.get('https', verify=False) is not adapter
+    assert registry.get('https', cert='client.pem') is not adapter
+    assert registry.get('https', pool_maxsize=20) is not adapter
+    assert isinstance(registry.get('https', protocol='TLS'), Tlsv1HttpAdapter)
+    # the forced protocol does not matter for the plain http
+    assert registry.get('http', protocol='tls') is registry.get('http')
+
+
+def test_connection_stats_of_unused_adapters():
+    registry = SharedAdapterRegistry()
+    registry.get('https')
+    assert registry.connection_stats() == {'opened': 0, 'requests': 0, 'reused': 0}
+
+
+def test_sessions_of_connectors_mount_the_shared_adapters():
+    first = Connector('first', {'use_server_map': 'False', '__workers__': 4})
+    second = Connector('second', {'use_server_map': 'False', '__workers__': 4})
+    first_session, second_session = first._get_session(), second._get_session()
+    assert first_session is not second_session
+    assert first_session.get_adapter('https://example.com') is second_session.get_adapter('https://example.com')
+
+
+def test_pool_is_sized_by_the_workers():
+    connector = Connector('test', {'use_server_map': 'False', '__workers__': 12})
+    # the workers plus the default 2 upload workers
+    assert connector.get_pool_maxsize() == 14
+    assert connector._get_session().get_adapter('https://example.com')._pool_maxsize == 14
+    assert Connector('test', {'use_server_map': 'False', '__workers__': 0}).get_pool_maxsize() == 10
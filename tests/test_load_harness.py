@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT_DIR
+
+HARNESS = os.path.join(ROOT_DIR, 'benchmarks', 'load_harness.py')
+
+
+@pytest.mark.parametrize('scenario', ['managed', 'upload'])
+def test_every_record_reaches_the_fake_oomnitza(scenario):
+    # NOTE: the harness patches the process with gevent, so it is run as the separate process
+    result = subprocess.run(
+        [
+            sys.executable, HARNESS, scenario,
+            '--records', '150', '--page-size', '50',
+            '--saas-latency', '0', '--saas-jitter', '0', '--upload-latency', '0', '--upload-jitter', '0',
+        ],
+        capture_output=True, text=True, timeout=120, cwd=ROOT_DIR
+    )
+    assert result.returncode == 0, result.stderr
+    assert 'records uploaded    150 of 150' in result.stdout
+    assert 'SaaS requests       ' in result.stdout
@@ -0,0 +1,60 @@
+import pytest
+
+from lib.connector import FATAL_ERROR_FLAG
+from offline import OfflineOomnitza, make_managed_connector
+
+RECORDS = 25
+PAGE_SIZE = 10
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+@pytest.mark.parametrize('bulk', [True, False])
+@pytest.mark.parametrize('exception', ['ManagedConnectorListGetInMiddleException', 'ManagedConnectorListMaxIterationException'])
+def test_list_failed_in_the_middle_finalizes_after_records_in_flight(exception, bulk, workers):
+    oomnitza = OfflineOomnitza()
+    connector = make_managed_connector(oomnitza, workers)
+    error = getattr(connector, exception)
+
+    def load_list(batch_size, resume=None):
+        records = [{'serial': f'serial-{i}', 'name': f'device-{i}'} for i in range(RECORDS)]
+        if bulk:
+            for start in range(0, RECORDS, PAGE_SIZE):
+                yield records[start:start + PAGE_SIZE]
+        else:
+            yield from records
+        raise error(error='the next page has failed')
+
+    connector._load_list = load_list
+    connector._use_single_mode = lambda: not bulk
+
+    with pytest.raises(error):
+        connector.determine_processing_mode('test', {})
+
+    kinds = [kind for kind, _ in oomnitza.events]
+    assert kinds[-1] == 'finalize' and kinds.count('finalize') == 1
+
+    payloads = [payload for kind, payload in oomnitza.events if kind == 'upload']
+    sent = sorted(record['serial'] for payload in payloads if not payload.get('error') for record in payload['records'])
+    assert sent == sorted(f'serial-{i}' for i in range(RECORDS))
+    assert [payload.get('error_type') for payload in payloads if payload.get('error')] == [FATAL_ERROR_FLAG]
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_source_failed_sends_partial_bulk_batch(workers):
+    oomnitza = OfflineOomnitza()
+    connector = make_managed_connector(oomnitza, workers)
+
+    def load_list(batch_size, resume=None):
+        yield [{'serial': f'serial-{i}', 'name': f'device-{i}'} for i in range(RECORDS)]
+        raise RuntimeError('the source has failed')
+
+    connector._load_list = load_list
+    connector._use_single_mode = lambda: False
+
+    with pytest.raises(RuntimeError):
+        connector.determine_processing_mode('test', {})
+
+    sent = sorted(record['serial'] for kind, payload in oomnitza.events if kind == 'upload' for record in payload['records'])
+    assert sent == sorted(f'serial-{i}' for i in range(RECORDS))
+    assert 'finalize' not in [kind for kind, _ in oomnitza.events]
+    assert connector._batcher is None
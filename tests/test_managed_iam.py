@@ -0,0 +1,37 @@
+import requests
+
+from offline import OfflineOomnitza, make_managed_connector
+
+IAM_CREDENTIALS = {'access_key': 'ASIAEXAMPLE', 'secret_key': 'secret', 'session_token': 'role-session-token'}
+
+
+def fake_response(content: bytes) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response.encoding = 'utf-8'
+    response._content = content
+    return response
+
+
+def test_detail_call_is_signed_with_the_credentials_of_the_account():
+    connector = make_managed_connector(OfflineOomnitza(), 0, detail_behavior={
+        'url': 'https://ec2.us-west-2.amazonaws.com/?Action=DescribeInstances&InstanceId={{ list_response_item.id }}',
+        'http_method': 'GET', 'headers': [], 'params': [],
+    })
+    sent = []
+
+    def perform_api_request(logger=None, stream=False, **api_call_specification):
+        sent.append(api_call_specification)
+        return fake_response(b'{"state": "running"}')
+
+    connector.perform_api_request = perform_api_request
+
+    details = connector.get_detail_of_item({'id': 'i-0123456789'}, iam_credentials=IAM_CREDENTIALS)
+
+    assert details['state'] == 'running'
+    [request] = sent
+    headers = request['headers']
+    assert headers['Authorization'].startswith('AWS4-HMAC-SHA256 Credential=ASIAEXAMPLE/')
+    assert '/us-west-2/ec2/aws4_request' in headers['Authorization']
+    assert headers['X-Amz-Security-Token'] == 'role-session-token'
+    assert 'InstanceId=i-0123456789' in request['url']
@@ -0,0 +1,75 @@
+import pytest
+
+from lib.connector import BaseConnector
+from lib.mapping_plan import FieldPlan, MappingPlan, parse_converter_spec
+from lib.renderer import Renderer
+
+
+class Connector(BaseConnector):
+    MappingName = 'test'
+    RecordType = 'assets'
+    FieldMappings = {
+        'NAME': {'source': 'name'},
+        'SERIAL_NUMBER': {'source': 'hardware.serial', 'required': True},
+        'USERNAME': {'source': 'user.email', 'converter': 'split_email'},
+        'SYNC_FIELD': {'setting': 'sync_field'},
+        'SOURCE': {'hardcoded': 'test'},
+    }
+
+
+@pytest.fixture
+def connector():
+    return Connector('test', {'use_server_map': 'False', 'sync_field': 'SERIAL_NUMBER'})
+
+
+def test_parse_converter_spec():
+    assert parse_converter_spec('split:on=@|index=1') == ('split', {'on': '@', 'index': '1'})
+    assert parse_converter_spec('memberOf:Engineering|default=other') == ('memberOf', {'Engineering': True, 'default': 'other'})
+    assert parse_converter_spec('capitalize') == ('capitalize', {})
+
+
+def test_required_fields_go_first():
+    plan = MappingPlan(Connector.FieldMappings)
+    assert [_.field for _ in plan.required_fields] == ['SERIAL_NUMBER']
+    assert [_.field for _ in plan.optional_fields] == ['NAME', 'USERNAME', 'SYNC_FIELD', 'SOURCE']
+    assert plan.field_names == list(Connector.FieldMappings)
+
+
+def test_field_kinds():
+    assert FieldPlan('A', {'source': 'a'}).kind == FieldPlan.SOURCE
+    assert FieldPlan('A', {'setting': 'a'}).kind == FieldPlan.SETTING
+    assert FieldPlan('A', {'hardcoded': ''}).kind == FieldPlan.HARDCODED
+    with pytest.raises(RuntimeError):
+        FieldPlan('A', {})
+
+
+def test_convert_record(connector):
+    record = {'name': 'laptop', 'hardware': {'serial': 'C02X1'}, 'user': {'email': 'jane@example.com'}}
+    assert connector.convert_record(record) == {
+        'NAME': 'laptop',
+        'SERIAL_NUMBER': 'C02X1',
+        'USERNAME': 'jane',
+        'SYNC_FIELD': 'SERIAL_NUMBER',
+        'SOURCE': 'test',
+    }
+
+
+def test_record_without_required_field_is_rejected(connector):
+    assert connector.convert_record({'name': 'laptop'}) is None
+
+
+def test_plan_is_compiled_once_per_mappings(connector):
+    plan = connector.get_mapping_plan(connector.field_mappings)
+    assert connector.get_mapping_plan(connector.field_mappings) is plan
+    assert connector.get_mapping_plan(dict(connector.field_mappings)) is not plan
+
+
+def test_template_error_is_raised_for_every_record():
+    env = Renderer(oomnitza_connector=object()).jinja_native_env
+    plan = MappingPlan({'NAME': {'source': '{{ name|upper }}'}, 'BROKEN': {'source': '{{ name | }}'}}, native_env=env)
+    name, broken = plan.optional_fields
+    assert name.render({'name': 'laptop'}) == 'LAPTOP'
+    assert plan.needs_template_context
+    for _ in range(2):
+        with pytest.raises(Exception):
+            broken.render({'name': 'laptop'})
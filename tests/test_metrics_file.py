@@ -0,0 +1,51 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import requests
+
+from conftest import ROOT_DIR
+
+
+def test_sigterm_of_managed_mode_saves_the_metrics(tmp_path):
+    fakes = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT_DIR, 'benchmarks', 'fakes.py'), json.dumps({
+            'records': 30, 'managed_connectors': 1,
+            'saas_latency': 0, 'saas_jitter': 0, 'upload_latency': 0, 'upload_jitter': 0,
+        })],
+        stdout=subprocess.PIPE, text=True
+    )
+    connector = None
+    try:
+        oomnitza_url = f"http://127.0.0.1:{json.loads(fakes.stdout.readline())['oomnitza']}"
+        ini_path = tmp_path / 'config.ini'
+        ini_path.write_text(f'[oomnitza]\nurl = {oomnitza_url}\napi_token = test\n')
+        metrics_path = tmp_path / 'metrics.prom'
+        # NOTE: the default logging config writes the log files next to the connector
+        logging_config_path = tmp_path / 'logging.json'
+        logging_config_path.write_text(json.dumps({'version': 1, 'disable_existing_loggers': False}))
+
+        connector = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT_DIR, 'connector.py'), 'managed', '--ini', str(ini_path),
+             '--logging-config', str(logging_config_path), '--metrics-file', str(metrics_path)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        # the managed sync is run once, then the connector waits for the next one until it is stopped
+        deadline = time.monotonic() + 60
+        while not requests.get(f'{oomnitza_url}/__stats').json()['finalized']:
+            assert time.monotonic() < deadline and connector.poll() is None
+            time.sleep(0.1)
+
+        connector.send_signal(signal.SIGTERM)
+        assert connector.wait(timeout=30) == 128 + signal.SIGTERM
+
+        metrics = metrics_path.read_text()
+        assert 'connector_records_total{connector="harness-harness-0",connector_id="harness-0",result="sent"} 30' in metrics
+    finally:
+        if connector is not None and connector.poll() is None:
+            connector.kill()
+        fakes.terminate()
+        fakes.wait()
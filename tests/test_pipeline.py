@@ -0,0 +1,61 @@
+import gevent
+import gevent.event
+import pytest
+
+from lib.pipeline import RecordPipeline
+
+
+def test_zero_workers_process_synchronously():
+    processed = []
+    pipeline = RecordPipeline(lambda record, error: processed.append((record, error)), workers=0).start()
+    pipeline.put(1, None)
+    assert processed == [(1, None)]
+    pipeline.join()
+    assert pipeline.processed == 1
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_workers_process_every_record(workers):
+    processed = []
+
+    def handler(record):
+        gevent.sleep(0)
+        processed.append(record)
+
+    pipeline = RecordPipeline(handler, workers=workers).start()
+    for record in range(100):
+        pipeline.put(record)
+    pipeline.join()
+    assert sorted(processed) == list(range(100))
+    assert pipeline.processed == 100 and pipeline.failed == 0
+
+
+def test_queue_is_bounded():
+    released = gevent.event.Event()
+    pipeline = RecordPipeline(lambda record: released.wait(), workers=1, queue_size=2).start()
+
+    def produce():
+        for record in range(10):
+            pipeline.put(record)
+
+    producer = gevent.spawn(produce)
+    gevent.sleep(0.01)
+    # one record is being processed, two are waiting in the queue, the source is blocked on the fourth one
+    assert not producer.dead
+    assert pipeline._queue.qsize() == 2
+    released.set()
+    producer.join()
+    pipeline.join()
+    assert pipeline.processed == 10
+
+
+def test_failed_record_does_not_stop_the_worker():
+    def handler(record):
+        if record % 2:
+            raise ValueError(record)
+
+    pipeline = RecordPipeline(handler, workers=2).start()
+    for record in range(10):
+        pipeline.put(record)
+    pipeline.join()
+    assert pipeline.processed == 5 and pipeline.failed == 5
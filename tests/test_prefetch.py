@@ -0,0 +1,40 @@
+import gevent
+import pytest
+
+from lib.prefetch import Prefetcher
+from lib.renderer import Renderer
+
+
+def test_pages_in_order_with_the_error_after_them():
+    def pages():
+        yield from ([1], [2], [3])
+        raise ValueError('the next page has failed')
+
+    prefetcher = Prefetcher(pages(), depth=2)
+    assert next(prefetcher) == [1]
+    assert next(prefetcher) == [2]
+    assert next(prefetcher) == [3]
+    with pytest.raises(ValueError):
+        next(prefetcher)
+
+
+def test_close_releases_the_source_in_its_greenlet():
+    renderer = Renderer(oomnitza_connector=object())
+    unwound_in = []
+
+    def pages():
+        # NOTE: the pages of the managed list are rendered in the own scope of the prefetching greenlet
+        with renderer.rendering_scope():
+            try:
+                for page in range(100):
+                    renderer.update_rendering_context(iteration=page)
+                    yield [page]
+            finally:
+                unwound_in.append(gevent.getcurrent())
+
+    prefetcher = Prefetcher(pages(), depth=2)
+    assert next(prefetcher) == [0]
+    prefetcher.close()
+
+    assert unwound_in == [prefetcher._greenlet]
+    assert not renderer._rendering_scopes
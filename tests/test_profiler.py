@@ -0,0 +1,89 @@
+import glob
+import os
+import pstats
+
+import gevent
+
+from lib.profiler import _profiling_lock, _safe_file_name, profile_run
+
+ROUNDS = 20
+
+
+def busy():
+    return sum(range(200000))
+
+
+def test_profile_artifacts_are_saved(tmp_path):
+    with profile_run(str(tmp_path), 'managed.123', 'portion/1'):
+        for _ in range(5):
+            busy()
+
+    [pstats_path] = glob.glob(os.path.join(str(tmp_path), 'managed.123-portion_1-*.pstats'))
+    assert 'busy' in {name for (_, _, name) in pstats.Stats(pstats_path).stats}
+    assert glob.glob(os.path.join(str(tmp_path), 'managed.123-portion_1-*.collapsed'))
+
+
+def test_nothing_is_profiled_without_the_directory(tmp_path):
+    with profile_run('', 'managed'):
+        busy()
+    assert not _profiling_lock.locked()
+
+
+def test_only_one_run_is_profiled_at_a_time(tmp_path):
+    with profile_run(str(tmp_path), 'first'):
+        with profile_run(str(tmp_path), 'second'):
+            busy()
+    assert glob.glob(os.path.join(str(tmp_path), 'first-*.pstats'))
+    assert not glob.glob(os.path.join(str(tmp_path), 'second-*'))
+    assert not _profiling_lock.locked()
+
+
+def test_safe_file_name():
+    assert _safe_file_name('a b/c:d') == 'a_b_c_d'
+
+
+def spin():
+    return sum(range(50000))
+
+
+def run_loop():
+    for _ in range(ROUNDS):
+        spin()
+        gevent.sleep(0)
+
+
+def run_worker():
+    for _ in range(ROUNDS):
+        spin()
+        gevent.sleep(0)
+
+
+def other_run():
+    for _ in range(ROUNDS):
+        spin()
+        gevent.sleep(0)
+
+
+def profiled_run(directory):
+    with profile_run(directory, 'profiled', 'portion'):
+        worker = gevent.spawn(run_worker)
+        run_loop()
+        worker.join()
+
+
+def test_only_the_greenlets_of_the_run_are_profiled(tmp_path):
+    other = gevent.spawn(other_run)
+    run = gevent.spawn(profiled_run, str(tmp_path))
+    gevent.joinall([other, run], raise_error=True)
+
+    [pstats_path] = glob.glob(os.path.join(str(tmp_path), 'profiled-portion-*.pstats'))
+    calls = {name: stats[1] for (_, _, name), stats in pstats.Stats(pstats_path).stats.items()}
+    assert 'run_loop' in calls and 'run_worker' in calls
+    assert 'other_run' not in calls
+    # the run and its worker, not the other greenlet running at the same time
+    assert calls['spin'] == 2 * ROUNDS
+
+    [collapsed_path] = glob.glob(os.path.join(str(tmp_path), 'profiled-portion-*.collapsed'))
+    with open(collapsed_path) as f:
+        stacks = [line.rsplit(' ', 1)[0] for line in f]
+    assert not [stack for stack in stacks if 'other_run' in stack]
@@ -0,0 +1,101 @@
+import time
+from email.utils import formatdate
+
+import pytest
+
+from lib.ratelimit import AdaptiveHostLimiter, RateLimiterRegistry, TokenBucket, host_of, parse_rate_limit_reset, parse_retry_after
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('3') == 3.
+    assert parse_retry_after('-1') == 0.
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('soon') is None
+    now = time.time()
+    assert parse_retry_after(formatdate(now + 30, usegmt=True), now=now) == pytest.approx(30, abs=1)
+    assert parse_retry_after(formatdate(now - 30, usegmt=True), now=now) == 0.
+
+
+def test_parse_rate_limit_reset():
+    now = 1700000000.
+    assert parse_rate_limit_reset({'X-RateLimit-Remaining': '5', 'X-RateLimit-Reset': '10'}) is None
+    assert parse_rate_limit_reset({'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '10'}) == 10.
+    assert parse_rate_limit_reset({'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(now + 20)}, now=now) == 20.
+    assert parse_rate_limit_reset({'X-RateLimit-Remaining': '0'}) is None
+
+
+def test_host_of():
+    assert host_of('https://API.example.com:8443/v1?x=1') == 'api.example.com'
+
+
+def test_token_bucket_allows_the_burst_and_then_paces():
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.reserve() == 0.
+    assert bucket.reserve() == 0.
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+
+
+def test_limiter_is_not_limited_until_throttled():
+    limiter = AdaptiveHostLimiter('example.com')
+    assert all(limiter.reserve() == 0. for _ in range(20))
+    limiter.on_response(200, {})
+    assert limiter.rate is None
+
+
+def test_throttling_decreases_the_rate_multiplicatively():
+    limiter = AdaptiveHostLimiter('example.com', min_rate=0.5)
+    for _ in range(8):
+        limiter.reserve()
+    limiter.on_response(429, {})
+    # half of the 8 requests sent during the last second
+    assert limiter.rate == 4.
+    # the burst of throttled responses to the concurrent requests decreases the rate once
+    limiter.on_response(429, {})
+    assert limiter.rate == 4. and limiter.throttled == 2
+
+    limiter._last_decrease -= AdaptiveHostLimiter.DECREASE_COOLDOWN
+    limiter.on_response(503, {})
+    assert limiter.rate == 2.
+
+
+def test_rate_never_goes_below_the_minimum():
+    limiter = AdaptiveHostLimiter('example.com', min_rate=0.5)
+    limiter.on_response(429, {})
+    assert limiter.rate == 0.5
+
+
+def test_success_increases_the_rate_additively():
+    limiter = AdaptiveHostLimiter('example.com', increase=0.5)
+    limiter.rate = 2.
+    limiter.on_response(200, {})
+    limiter.on_response(201, {})
+    limiter.on_response(404, {})
+    assert limiter.rate == 3.
+
+
+def test_limited_rate_spaces_the_requests():
+    limiter = AdaptiveHostLimiter('example.com')
+    limiter.rate = 10.
+    delays = [limiter.reserve() for _ in range(3)]
+    assert delays[0] == pytest.approx(0., abs=0.01)
+    assert delays[2] == pytest.approx(0.2, abs=0.01)
+
+
+def test_retry_after_pauses_the_host():
+    limiter = AdaptiveHostLimiter('example.com')
+    limiter.on_response(429, {'Retry-After': '2'})
+    assert limiter.reserve() == pytest.approx(2., abs=0.05)
+
+
+def test_exhausted_quota_pauses_the_host():
+    limiter = AdaptiveHostLimiter('example.com')
+    limiter.on_response(200, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '3'})
+    assert limiter.reserve() == pytest.approx(3., abs=0.05)
+
+
+def test_registry_shares_the_limiters():
+    registry = RateLimiterRegistry()
+    assert registry.for_host('example.com') is registry.for_host('example.com')
+    assert registry.for_host('example.com') is not registry.for_host('example.org')
+    assert registry.ceiling('example.com', 5) is registry.ceiling('example.com', 5.)
+    assert registry.ceiling('example.com', 5) is not registry.ceiling('example.com', 10)
@@ -0,0 +1,70 @@
+import gevent
+
+from lib.metrics import STAGE_SECONDS
+from lib.renderer import Renderer
+from offline import OfflineOomnitza, make_managed_connector
+
+
+def make_renderer():
+    renderer = Renderer(oomnitza_connector=object())
+    renderer.update_rendering_context(inputs={'region': 'us-east-1'})
+    return renderer
+
+
+def test_spawned_scopes_are_layered_over_the_scope_of_the_spawner():
+    renderer = make_renderer()
+
+    def render_item(item_id, context=None):
+        with renderer.rendering_scope(context):
+            renderer.update_rendering_context(list_response_item={'id': item_id})
+            gevent.sleep(0)
+            return renderer.render_to_string('{{ inputs.region }}/{{ account }}/{{ list_response_item.id }}')
+
+    with renderer.rendering_scope():
+        # e.g. the scope of the AWS account the page has been loaded for
+        renderer.update_rendering_context(account='111111111111')
+        context = renderer.current_rendering_context()
+
+        workers = [gevent.spawn(render_item, item_id, context) for item_id in range(3)]
+        gevent.joinall(workers, raise_error=True)
+        assert [worker.value for worker in workers] == [f'us-east-1/111111111111/{item_id}' for item_id in range(3)]
+
+        # the variables of the items are not seen by the spawner
+        assert renderer.get_arg_from_rendering_context('list_response_item') is None
+
+        # NOTE: without the context the new greenlet is layered over the shared context only
+        worker = gevent.spawn(render_item, 7)
+        worker.join()
+        assert worker.value == 'us-east-1//7'
+
+    assert renderer.get_arg_from_rendering_context('account') is None
+
+
+def test_render_seconds_are_summed_up():
+    renderer = make_renderer()
+    for _ in range(10):
+        renderer.render_to_string('{{ inputs.region }}')
+    renderer.render_to_native('{{ missing.value }}')
+    assert renderer.take_render_seconds() > 0
+    assert renderer.take_render_seconds() == 0
+
+
+def test_rendering_is_observed_once_per_source_batch():
+    pages = [[{'serial': f'serial-{page}-{i}', 'name': f'device-{i}'} for i in range(5)] for page in range(3)]
+    connector = make_managed_connector(OfflineOomnitza(), 0)
+
+    def load_list(batch_size, resume=None):
+        for page in pages:
+            for _ in page:
+                connector.render_to_string('{{ inputs }}')
+            yield page
+
+    connector._load_list = load_list
+    connector._use_single_mode = lambda: False
+    _, count = STAGE_SECONDS.get(stage='render', **connector.metric_labels)
+    connector.determine_processing_mode('test', {})
+
+    rendered, observed = STAGE_SECONDS.get(stage='render', **connector.metric_labels)
+    # the templates are rendered 15 times, the time of every batch is observed at once
+    assert observed - count == len(pages)
+    assert rendered > 0
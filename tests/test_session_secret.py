@@ -0,0 +1,138 @@
+import json
+from types import SimpleNamespace
+
+import gevent
+import pytest
+import requests
+
+from lib import session_secret
+from lib.session_secret import SessionSecretCache
+from offline import OfflineOomnitza, make_managed_connector
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(session_secret, 'time', SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+class Login:
+
+    def __init__(self, ttl=100, delay=0):
+        self.ttl = ttl
+        self.delay = delay
+        self.logins = 0
+
+    def __call__(self):
+        self.logins += 1
+        if self.delay:
+            gevent.sleep(self.delay)
+        return {'headers': {'Authorization': f'Bearer {self.logins}'}, 'params': {}, 'ttl': self.ttl}
+
+
+def test_secret_is_reused_for_its_lifetime(clock):
+    login = Login(ttl=100)
+    cache = SessionSecretCache(login)
+    assert cache.get()['headers'] == {'Authorization': 'Bearer 1'}
+    clock.now += 80
+    assert cache.get()['headers'] == {'Authorization': 'Bearer 1'}
+    # 10% of the lifetime before it expires
+    clock.now += 11
+    assert cache.get()['headers'] == {'Authorization': 'Bearer 2'}
+    assert login.logins == 2
+
+
+def test_secret_without_lifetime_is_generated_for_every_request(clock):
+    login = Login(ttl=0)
+    cache = SessionSecretCache(login)
+    assert [cache.get()['headers']['Authorization'] for _ in range(3)] == ['Bearer 1', 'Bearer 2', 'Bearer 3']
+
+
+def test_only_one_greenlet_logs_in(clock):
+    login = Login(ttl=100, delay=0.01)
+    cache = SessionSecretCache(login)
+    secrets = gevent.joinall([gevent.spawn(cache.get) for _ in range(10)], raise_error=True)
+    assert login.logins == 1
+    assert {_.value['headers']['Authorization'] for _ in secrets} == {'Bearer 1'}
+
+
+def test_valid_secret_is_used_while_the_new_one_is_generated(clock):
+    login = Login(ttl=100, delay=0.01)
+    cache = SessionSecretCache(login)
+    cache.get()
+    clock.now += 95
+    refreshing = gevent.spawn(cache.get)
+    gevent.sleep(0)
+    # the old secret is still valid, the greenlets do not wait for the login
+    assert cache.get()['headers'] == {'Authorization': 'Bearer 1'}
+    assert refreshing.get()['headers'] == {'Authorization': 'Bearer 2'}
+    assert cache.get()['headers'] == {'Authorization': 'Bearer 2'}
+
+
+def test_rejected_secret_is_generated_again(clock):
+    login = Login(ttl=100)
+    cache = SessionSecretCache(login)
+    rejected = cache.get()
+    assert cache.invalidate(rejected['headers'], rejected['params'])
+    assert cache.get()['headers'] == {'Authorization': 'Bearer 2'}
+    # the request with the replaced secret is repeated with the current one
+    assert cache.invalidate(rejected['headers'], rejected['params'])
+    assert cache.get()['headers'] == {'Authorization': 'Bearer 2'}
+
+
+def test_request_with_fresh_uncached_secret_is_not_repeated(clock):
+    cache = SessionSecretCache(Login(ttl=0))
+    secret = cache.get()
+    assert not cache.invalidate(secret['headers'], secret['params'])
+
+
+def test_managed_sync_logs_in_once_and_after_rejection():
+    pages = [[{'serial': f'serial-{page}-{i}', 'name': 'device'} for i in range(3)] for page in range(3)] + [[]]
+    requested = {'logins': 0, 'pages': 0, 'rejected': 0}
+
+    def respond(status, data):
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(data).encode('utf-8')
+        response.url = 'http://saas.invalid'
+        return response
+
+    def perform_api_request(logger, url, headers, stream=False, **specification):
+        if url.endswith('/login'):
+            requested['logins'] += 1
+            return respond(200, {'token': f"token-{requested['logins']}", 'expires_in': 3600})
+
+        if headers.get('Authorization') == 'Bearer token-1' and requested['pages'] == 1:
+            # the SaaS has ended the first session after the first page
+            requested['rejected'] += 1
+            response = respond(401, {'error': 'expired'})
+            raise requests.HTTPError(response=response)
+
+        page = pages[requested['pages']]
+        requested['pages'] += 1
+        return respond(200, page)
+
+    oomnitza = OfflineOomnitza()
+    connector = make_managed_connector(oomnitza, 2, saas_authorization={'type': 'session', 'behavior': {
+        'url': 'http://saas.invalid/login', 'http_method': 'POST', 'headers': [], 'params': [],
+        'result': {'headers': [{'key': 'Authorization', 'value': 'Bearer {{ response.token }}'}]},
+    }}, list_behavior={
+        'url': 'http://saas.invalid/list', 'http_method': 'GET', 'headers': [], 'params': [], 'result': '{{ list_response }}',
+    })
+    connector.perform_api_request = perform_api_request
+    connector._use_single_mode = lambda: False
+    connector.determine_processing_mode('test', {})
+
+    assert requested == {'logins': 2, 'pages': 4, 'rejected': 1}
+    uploaded = [record for kind, payload in oomnitza.events if kind == 'upload' for record in payload['records']]
+    assert len(uploaded) == 9
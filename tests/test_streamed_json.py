@@ -0,0 +1,150 @@
+import io
+import json
+
+import pytest
+import requests
+
+from offline import OfflineOomnitza, make_managed_connector
+from utils.helper_utils import StreamedArray, StreamedJSON
+
+DOCUMENT = {
+    'meta': {'total': 3, 'cursor': 'abc'},
+    'data': {'items': [{'id': 1, 'size': 1024}, {'id': 2, 'tags': ['a', '[b]']}, {'id': 3, 'price': 12.5e3}]},
+    'next': None,
+}
+
+
+def chunked(text, size):
+    return (text[i:i + size] for i in range(0, len(text), size))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 1024])
+def test_items_are_streamed_at_any_chunk_size(chunk_size):
+    closed = []
+    streamed = StreamedJSON(chunked(json.dumps(DOCUMENT, indent=1), chunk_size), ['data', 'items'], on_close=lambda: closed.append(True))
+    assert list(streamed.items()) == DOCUMENT['data']['items']
+    assert streamed.found and closed == [True]
+
+    items = streamed.document['data']['items']
+    assert isinstance(items, StreamedArray)
+    assert len(items) == 3 and items[0] == {'id': 1, 'size': 1024} and items[-1]['id'] == 3
+    # everything but the items is kept
+    assert streamed.document['meta'] == DOCUMENT['meta'] and streamed.document['next'] is None
+
+
+def test_number_split_between_chunks():
+    streamed = StreamedJSON(iter(['{"items": [12', '34, 5', '.25]}']), ['items'])
+    assert list(streamed.items()) == [1234, 5.25]
+
+
+def test_path_with_the_index():
+    document = [{'skip': [1, 2]}, {'rows': [{'id': 1}, {'id': 2}]}]
+    streamed = StreamedJSON(chunked(json.dumps(document), 5), [1, 'rows'])
+    assert list(streamed.items()) == [{'id': 1}, {'id': 2}]
+    assert streamed.document[0] == {'skip': [1, 2]}
+
+
+def test_empty_array():
+    streamed = StreamedJSON(iter(['{"items": [], "next": 2}']), ['items'])
+    assert list(streamed.items()) == []
+    assert streamed.found and len(streamed.document['items']) == 0 and streamed.document['next'] == 2
+
+
+def test_document_without_the_array_at_the_path():
+    streamed = StreamedJSON(iter(['{"error": "unauthorized", "items": null}']), ['items'])
+    assert list(streamed.items()) == []
+    assert not streamed.found
+    assert streamed.document == {'error': 'unauthorized', 'items': None}
+
+
+def test_not_json_document_is_parsed_as_usual():
+    closed = []
+    streamed = StreamedJSON(iter(['<items><item>1</item>', '</items>']), ['items'], on_close=lambda: closed.append(True))
+    assert list(streamed.items()) == []
+    assert not streamed.found and streamed.document == {'items': {'item': '1'}}
+    assert closed == [True]
+
+
+def test_truncated_document():
+    closed = []
+    streamed = StreamedJSON(iter(['{"items": [{"id": 1}, {"id"']), ['items'], on_close=lambda: closed.append(True))
+    with pytest.raises(ValueError):
+        list(streamed.items())
+    assert closed == [True]
+
+
+def test_streamed_array_keeps_only_the_ends():
+    array = StreamedArray()
+    for item in range(5):
+        array.append(item)
+    assert (len(array), array[0], array[4], array[-1]) == (5, 0, 4, 4)
+    with pytest.raises(IndexError):
+        array[2]
+    with pytest.raises(TypeError):
+        list(array)
+
+
+@pytest.mark.parametrize('result, path', [
+    ("{{ list_response['data']['items'] }}", ['data', 'items']),
+    ('{{ list_response.data["rows"][0] }}', ['data', 'rows', 0]),
+    ('{{list_response}}', []),
+    ("{{ list_response['items']|selectattr('id') }}", None),
+    ('{{ list_response.items }}', None),
+])
+def test_streamed_list_path(result, path):
+    connector = make_managed_connector(OfflineOomnitza(), 0, stream_list_responses='True', list_behavior={
+        'url': 'http://saas.invalid/list', 'http_method': 'GET', 'headers': [], 'params': [], 'result': result,
+    })
+    assert connector.get_streamed_list_path() == path
+
+
+def test_list_responses_are_not_streamed_by_default():
+    connector = make_managed_connector(OfflineOomnitza(), 0, list_behavior={
+        'url': 'http://saas.invalid/list', 'http_method': 'GET', 'headers': [], 'params': [], 'result': "{{ list_response['items'] }}",
+    })
+    assert connector.get_streamed_list_path() is None
+
+
+def test_sync_uploads_the_streamed_items():
+    pages = [{'data': {'items': [{'serial': f'serial-{i}', 'name': f'device-{i}'} for i in range(5)]}}, {'data': {'items': []}}]
+    responses = []
+
+    def perform_api_request(logger, stream=False, **specification):
+        response = requests.Response()
+        response.status_code = 200
+        response.raw = io.BytesIO(json.dumps(pages[len(responses)]).encode('utf-8'))
+        response.raw.close = lambda: responses[-1][1].append(True)
+        responses.append((stream, []))
+        return response
+
+    oomnitza = OfflineOomnitza()
+    connector = make_managed_connector(oomnitza, 2, stream_list_responses='True', list_behavior={
+        'url': 'http://saas.invalid/list', 'http_method': 'GET', 'headers': [], 'params': [], 'result': "{{ list_response['data']['items'] }}",
+    })
+    connector.perform_api_request = perform_api_request
+    connector._use_single_mode = lambda: False
+    connector.determine_processing_mode('test', {})
+
+    assert [stream for stream, _ in responses] == [True, True]
+    assert all(closed for _, closed in responses)
+    uploaded = sorted(record['serial'] for kind, payload in oomnitza.events if kind == 'upload' for record in payload['records'])
+    assert uploaded == [f'serial-{i}' for i in range(5)]
+
+
+def test_failed_streamed_request_is_closed():
+    closed = []
+
+    def perform_api_request(logger, stream=False, **specification):
+        response = requests.Response()
+        response.status_code = 500
+        response.raw = io.BytesIO(b'{"error": "internal"}')
+        response.raw.close = lambda: closed.append(stream)
+        raise requests.HTTPError('500 Server Error', response=response)
+
+    connector = make_managed_connector(OfflineOomnitza(), 0, stream_list_responses='True', list_behavior={
+        'url': 'http://saas.invalid/list', 'http_method': 'GET', 'headers': [], 'params': [], 'result': "{{ list_response['items'] }}",
+    })
+    connector.perform_api_request = perform_api_request
+    with pytest.raises(requests.HTTPError):
+        connector.make_api_request(connector.list_behavior, {}, None, None, stream_path=['items'])
+    assert closed == [True]
@@ -0,0 +1,77 @@
+import logging
+
+from jinja2 import Environment
+
+from lib.metrics import TEMPLATE_CACHE_LOOKUPS
+from lib.renderer import Renderer, TemplateCache
+from offline import OfflineOomnitza, make_managed_connector
+
+
+def test_compiled_template_is_reused():
+    env = Environment()
+    cache = TemplateCache(maxsize=2)
+    template = cache.get_template(env, '{{ a }}')
+    assert cache.get_template(env, '{{ a }}') is template
+    assert cache.info() == {'hits': 1, 'misses': 1, 'size': 1, 'maxsize': 2}
+
+
+def test_least_recently_used_template_is_evicted():
+    env = Environment()
+    cache = TemplateCache(maxsize=2)
+    first = cache.get_template(env, '{{ a }}')
+    cache.get_template(env, '{{ b }}')
+    # NOTE: the use moves the template to the end, so `b` is the least recently used one
+    cache.get_template(env, '{{ a }}')
+    cache.get_template(env, '{{ c }}')
+    assert len(cache) == 2
+    assert cache.get_template(env, '{{ a }}') is first
+    assert cache.info()['misses'] == 3
+    cache.get_template(env, '{{ b }}')
+    assert cache.info()['misses'] == 4
+
+
+def test_environments_do_not_share_templates():
+    cache = TemplateCache()
+    assert cache.get_template(Environment(), '{{ a }}') is not cache.get_template(Environment(), '{{ a }}')
+
+
+def test_zero_size_disables_the_cache():
+    env = Environment()
+    cache = TemplateCache(maxsize=0)
+    assert cache.get_template(env, '{{ a }}') is not cache.get_template(env, '{{ a }}')
+    assert len(cache) == 0
+
+
+def test_renderer_renders_through_the_cache():
+    renderer = Renderer(oomnitza_connector=object())
+    renderer.update_rendering_context(item={'id': 7})
+    assert renderer.render_to_string('id={{ item.id }}') == 'id=7'
+    assert renderer.render_to_native('{{ item.id + 1 }}') == 8
+    assert renderer.render_to_string('id={{ item.id }}') == 'id=7'
+    assert renderer.template_cache.info()['hits'] == 1
+
+
+def test_run_exports_the_template_cache_lookups(caplog):
+    pages = [{'items': [{'serial': f'serial-{page}-{i}', 'name': f'device-{i}'} for i in range(5)]} for page in range(3)] + [{'items': []}]
+
+    def make_api_request(behavior, pagination, break_early, add_if, **kwargs):
+        connector.render_to_string(behavior['url'])
+        return pages[connector.get_arg_from_rendering_context('iteration')], {}, {}
+
+    connector = make_managed_connector(OfflineOomnitza(), 0, list_behavior={
+        'url': 'http://saas.invalid/list?page={{ iteration }}', 'http_method': 'GET', 'headers': [], 'params': [], 'result': "{{ list_response['items'] }}",
+    })
+    connector.make_api_request = make_api_request
+    connector._use_single_mode = lambda: False
+    labels = connector.metric_labels
+    hits, misses = TEMPLATE_CACHE_LOOKUPS.get(result='hit', **labels), TEMPLATE_CACHE_LOOKUPS.get(result='miss', **labels)
+
+    with caplog.at_level(logging.INFO):
+        connector.determine_processing_mode('test', {})
+
+    info = connector.template_cache.info()
+    assert info['hits'] > 0
+    assert TEMPLATE_CACHE_LOOKUPS.get(result='hit', **labels) - hits == info['hits']
+    assert TEMPLATE_CACHE_LOOKUPS.get(result='miss', **labels) - misses == info['misses']
+    [message] = [_ for _ in caplog.messages if _.startswith('Template cache: ')]
+    assert message.startswith(f"Template cache: {info['hits']} hit(s), {info['misses']} miss(es), {info['size']} of {info['maxsize']} template(s) cached")
@@ -0,0 +1,86 @@
+import gevent
+import gevent.event
+import pytest
+
+from lib.connector import BaseConnector
+from lib.uploader import LatencyStats, Uploader
+
+
+def test_synchronous_upload_raises_to_the_caller():
+    def upload(payload):
+        raise ValueError(payload)
+
+    uploader = Uploader(upload)
+    with pytest.raises(ValueError):
+        uploader.submit(1)
+    assert uploader.failed == 1 and uploader.acknowledged == 0
+
+
+def test_wait_is_the_barrier_for_all_the_uploads():
+    acknowledged = []
+
+    def upload(payload):
+        gevent.sleep(0.01)
+        return payload
+
+    uploader = Uploader(upload, concurrency=3)
+    for payload in range(10):
+        uploader.submit(payload, on_success=lambda payload=payload: acknowledged.append(payload))
+    assert len(acknowledged) < 10
+    uploader.wait()
+    assert sorted(acknowledged) == list(range(10))
+    assert uploader.acknowledged == 10 and uploader.latency.count == 10
+
+
+def test_concurrency_is_bounded():
+    released = gevent.event.Event()
+    in_flight = []
+
+    def upload(payload):
+        in_flight.append(payload)
+        released.wait()
+
+    uploader = Uploader(upload, concurrency=2)
+    submitter = gevent.spawn(lambda: [uploader.submit(_) for _ in range(5)])
+    gevent.sleep(0.01)
+    assert len(in_flight) == 2 and not submitter.dead
+    released.set()
+    submitter.join()
+    uploader.wait()
+    assert uploader.acknowledged == 5
+
+
+def test_failed_upload_does_not_break_the_barrier():
+    succeeded = []
+
+    def upload(payload):
+        if payload == 2:
+            raise ConnectionError
+        return payload
+
+    uploader = Uploader(upload, concurrency=2)
+    for payload in range(4):
+        uploader.submit(payload, on_success=lambda payload=payload: succeeded.append(payload))
+    uploader.wait()
+    assert sorted(succeeded) == [0, 1, 3]
+    assert uploader.acknowledged == 3 and uploader.failed == 1
+
+
+def test_latency_percentiles():
+    stats = LatencyStats(window=100)
+    for ms in range(1, 201):
+        stats.observe(ms / 1000.)
+    summary = stats.summary()
+    assert summary['count'] == 200 and summary['max'] == 0.2
+    # only the last 100 observations are in the window
+    assert summary['p50'] == pytest.approx(0.151)
+    assert summary['p99'] == pytest.approx(0.2)
+
+
+def test_connector_uploads_with_default_workers():
+    class Connector(BaseConnector):
+        MappingName = 'test'
+        FieldMappings = {}
+
+    connector = Connector('test', {'use_server_map': 'False', '__workers__': 2})
+    assert connector.create_uploader()._pool.size == 2
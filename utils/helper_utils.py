@@ -1,20 +1,234 @@
+import functools
 import json
+from collections.abc import Sequence
+from typing import Callable, Iterable, Iterator, Optional, Union
+
 import xmltodict
 
+from lib import codec
+
 import logging
 logger = logging.getLogger(__name__)
 
 
 # noinspection PyBroadException
-def response_to_object(response_text):
+def response_to_object(response_text: Union[str, bytes]):
     """
-    Try to represent the response as the native object from the JSON- or XML-based response
+    Try to represent the response as the native object from the JSON- or XML-based response,
+    given as the text or as the raw bytes of the body, see `response_body`
     """
     try:
-        return json.loads(response_text)
+        return codec.loads(response_text)
     except:
         try:
             return xmltodict.parse(response_text)
         except:
             logger.warning(f"Failed to parse to json and xml, returning response data.")
+            if isinstance(response_text, bytes):
+                return response_text.decode('utf-8', errors='replace')
             return response_text
+
+
+def response_body(response) -> Union[str, bytes]:
+    """
+    The body of the response to be passed to `response_to_object`: the raw bytes if the body is UTF-8,
+    so the JSON is parsed without decoding it to the text first, and the decoded text otherwise
+    """
+    encoding = (response.encoding or 'utf-8').lower().replace('_', '-')
+    if encoding in ('utf-8', 'utf8'):
+        return response.content
+    return response.text
+
+
+class StreamedArray(Sequence):
+    """
+    Stands for the array of the streamed JSON document which items are yielded one by one and not kept.
+    Knows the number of the items, the first and the last of them, enough for the pagination by the count or by the cursor
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.first = None
+        self.last = None
+
+    def append(self, item):
+        if not self.count:
+            self.first = item
+        self.last = item
+        self.count += 1
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, int) and self.count:
+            if index < 0:
+                index += self.count
+            if index == 0:
+                return self.first
+            if index == self.count - 1:
+                return self.last
+        raise IndexError(f'Only the first and the last of the streamed items are kept, not {index!r}')
+
+    def __iter__(self):
+        raise TypeError('The streamed items are not kept')
+
+    def __repr__(self):
+        return f'<{self.count} streamed item(s)>'
+
+
+class StreamedJSON:
+    """
+    The JSON document read from the text chunks incrementally. The items of the array found at `path`
+    (the keys and the indexes from the root) are yielded one by one by `items()` and are not kept in memory,
+    so the peak memory does not depend on the size of the document.
+
+    `document` is built in place while the document is read, with the `StreamedArray` instead of the streamed array.
+    If the document has no array at the `path`, `found` is False and the `document` holds the whole parsed
+    document, or the XML / text document as `response_to_object` returns it
+    """
+    # the consumed part of the buffer is dropped once it is longer than this
+    COMPACT_AFTER = 64 * 1024
+
+    def __init__(self, chunks: Iterable[str], path: Sequence[Union[str, int]], on_close: Optional[Callable] = None):
+        self.path = list(path)
+        self.document = None
+        self.found = False
+        self._chunks = iter(chunks)
+        self._on_close = on_close
+        self._buffer = ''
+        self._pos = 0
+        self._decoder = json.JSONDecoder()
+
+    def _read(self, at_least: int = 1) -> bool:
+        """
+        Append at least `at_least` characters to the buffer, False if there is nothing more to read
+        """
+        if self._pos > self.COMPACT_AFTER:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+
+        chunks, size = [], 0
+        for chunk in self._chunks:
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= at_least:
+                break
+        self._buffer += ''.join(chunks)
+        return size > 0
+
+    def _peek(self) -> Optional[str]:
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in ' \t\n\r':
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._read():
+                return None
+
+    def _expect(self, char: str):
+        if self._peek() != char:
+            raise ValueError(f'Expected {char!r} at the position {self._pos} of the streamed JSON')
+        self._pos += 1
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except ValueError:
+                # the value is not complete yet, read as much again to not decode the long value over and over
+                if not self._read(len(self._buffer) - self._pos):
+                    raise
+                continue
+            # NOTE: the number at the end of the buffer can continue in the next chunk
+            if isinstance(value, (int, float)) and (end == len(self._buffer) or self._buffer[end] in '0123456789.eE+-') and self._read():
+                continue
+            self._pos = end
+            return value
+
+    def _separator(self, closing: str) -> bool:
+        """
+        True if there is the next element of the container, False if the container is closed
+        """
+        char = self._peek()
+        self._pos += 1
+        if char is None:
+            raise ValueError('The streamed JSON has ended unexpectedly')
+        if char == ',':
+            return True
+        if char == closing:
+            return False
+        raise ValueError(f'Unexpected {char!r} at the position {self._pos - 1} of the streamed JSON')
+
+    def _walk(self, path, assign):
+        char = self._peek()
+        if not path:
+            if char != '[':
+                assign(self._value())
+                return
+            self.found = True
+            array = StreamedArray()
+            assign(array)
+            self._pos += 1
+            if self._peek() == ']':
+                self._pos += 1
+                return
+            while True:
+                item = self._value()
+                array.append(item)
+                yield item
+                if not self._separator(']'):
+                    return
+
+        key = path[0]
+        if char == '{' and isinstance(key, str):
+            container = {}
+            assign(container)
+            self._pos += 1
+            if self._peek() == '}':
+                self._pos += 1
+                return
+            while True:
+                name = self._value()
+                self._expect(':')
+                if name == key and not self.found:
+                    yield from self._walk(path[1:], functools.partial(container.__setitem__, name))
+                else:
+                    container[name] = self._value()
+                if not self._separator('}'):
+                    return
+
+        elif char == '[' and isinstance(key, int):
+            container = []
+            assign(container)
+            self._pos += 1
+            if self._peek() == ']':
+                self._pos += 1
+                return
+            while True:
+                if len(container) == key and not self.found:
+                    container.append(None)
+                    yield from self._walk(path[1:], functools.partial(container.__setitem__, key))
+                else:
+                    container.append(self._value())
+                if not self._separator(']'):
+                    return
+        else:
+            assign(self._value())
+
+    def _set_document(self, value):
+        self.document = value
+
+    def items(self) -> Iterator:
+        try:
+            if self._peek() not in ('{', '['):
+                # not a JSON document, read it whole and parse as usual
+                while self._read():
+                    pass
+                self.document = response_to_object(self._buffer[self._pos:])
+                return
+            yield from self._walk(self.path, self._set_document)
+        finally:
+            if self._on_close is not None:
+                self._on_close()